@@ -480,7 +480,7 @@ you can use legacy `bsddb3 <https://pypi.org/project/bsddb3/>`__ library.
       url = 'https://www.jcea.es/programacion/pybsddb.htm',
       license = "3-clause BSD License",
 
-      packages = ['berkeleydb'],
+      packages = ['berkeleydb', 'berkeleydb.bench'],
       package_dir = {'berkeleydb': 'src/berkeleydb'},
       ext_modules = [Extension('berkeleydb._berkeleydb',
                                sources = ['src/Module/berkeleydb.c'],
@@ -94,6 +94,12 @@
 #include <Python.h>
 #include "structmember.h"
 
+#ifdef MS_WINDOWS
+#include <windows.h>    /* for QueryPerformanceCounter() */
+#else
+#include <time.h>       /* for clock_gettime() */
+#endif
+
 #define COMPILING_BERKELEYDB_C
 #include "berkeleydb.h"
 #undef COMPILING_BERKELEYDB_C
@@ -123,6 +129,231 @@ static_assert(sizeof(uint32_t) == sizeof(int),
 #define MYDB_END_BLOCK_THREADS \
                 PyGILState_Release(__savestate);
 
+/*
+** Timed versions of MYDB_BEGIN/END_ALLOW_THREADS, recording the call in
+** the latency statistics of the DB or DBEnv object, if enabled, and
+** reporting it to the slow operation hook of the environment, if set
+** and the call is slow enough.  The time spent in Berkeley DB is
+** measured with the GIL released, and the time waiting for the GIL
+** afterwards is accounted apart.  When both are disabled, the only cost
+** is a couple of pointer checks.
+*/
+#define DB_LATENCY(obj) \
+                (((obj) && (obj)->latency_enabled) ? (obj)->latency : NULL)
+#define SLOW_OP_ENV(env) \
+                (((env) && (env)->slow_op_put) ? (env) : NULL)
+
+#define MYDB_BEGIN_TIMED(stats, env) { \
+                DBLatencyStats *_lat_stats = (stats); \
+                DBEnvObject *_lat_env = SLOW_OP_ENV(env); \
+                unsigned long long _lat_t0 = 0, _lat_t1 = 0; \
+                Py_BEGIN_ALLOW_THREADS; \
+                if (_lat_stats || _lat_env) _lat_t0 = _latency_now();
+#define MYDB_END_TIMED(op, name, dbobj, keysize) \
+                if (_lat_stats || _lat_env) _lat_t1 = _latency_now(); \
+                Py_END_ALLOW_THREADS; \
+                if (_lat_stats) \
+                    _latency_record(_lat_stats, (op), _lat_t0, _lat_t1); \
+                if (_lat_env && \
+                        (_lat_t1 - _lat_t0 >= _lat_env->slow_op_threshold_ns)) \
+                    _slow_op_report(_lat_env, (name), (dbobj), (keysize), \
+                                    _lat_t1 - _lat_t0); \
+                }
+
+
+/* --------------------------------------------------------------------- */
+/* Latency statistics */
+
+static const char *latencyOpNames[DBLAT_NUM_OPS] = {
+    "get", "put", "delete", "cursor", "commit"
+};
+
+/* Monotonic clock, in nanoseconds.  Called without the GIL. */
+static unsigned long long _latency_now(void)
+{
+#ifdef MS_WINDOWS
+    static LARGE_INTEGER frequency;
+    LARGE_INTEGER now;
+
+    if (!frequency.QuadPart)
+        QueryPerformanceFrequency(&frequency);
+    QueryPerformanceCounter(&now);
+    return (unsigned long long)(now.QuadPart / frequency.QuadPart) *
+                1000000000ULL +
+           (unsigned long long)(now.QuadPart % frequency.QuadPart) *
+                1000000000ULL / frequency.QuadPart;
+#else
+    struct timespec now;
+
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return (unsigned long long)now.tv_sec * 1000000000ULL + now.tv_nsec;
+#endif
+}
+
+/* Records a call done between t0 and t1.  Called with the GIL held, so
+   the statistics don't need another lock. */
+static void _latency_record(DBLatencyStats *stats, int op,
+                            unsigned long long t0, unsigned long long t1)
+{
+    DBLatencyOp *o = &stats->ops[op];
+    unsigned long long elapsed = t1 - t0;
+    unsigned long long us = elapsed / 1000;
+    int bucket = 0;
+
+    while (us && (bucket < DBLAT_BUCKETS - 1)) {
+        us >>= 1;
+        bucket++;
+    }
+    o->count++;
+    o->total_ns += elapsed;
+    o->gil_wait_ns += _latency_now() - t1;
+    o->buckets[bucket]++;
+}
+
+/* Queues a slow call for the hook set with DBEnv.set_slow_op_hook().
+   Called with the GIL held, just after the call.  A negative key_size
+   means "no key". */
+static void
+_slow_op_report(DBEnvObject *env, const char *name, DBObject *db,
+                long key_size, unsigned long long elapsed_ns)
+{
+    PyObject *put, *dbname = NULL, *key = NULL;
+    PyObject *event = NULL, *result;
+    PyObject *exc_type, *exc_value, *exc_tb;
+    const char *filename = NULL, *subname = NULL;
+
+    if (env->slow_op_put == NULL)   /* The hook was removed meanwhile */
+        return;
+    put = env->slow_op_put;
+    Py_INCREF(put);
+    PyErr_Fetch(&exc_type, &exc_value, &exc_tb);
+
+    if (db && db->db &&
+            !db->db->get_dbname(db->db, &filename, &subname)) {
+        dbname = Py_BuildValue("(zz)", filename, subname);
+    } else {
+        Py_INCREF(Py_None);
+        dbname = Py_None;
+    }
+    if (key_size >= 0) {
+        key = PyLong_FromLong(key_size);
+    } else {
+        Py_INCREF(Py_None);
+        key = Py_None;
+    }
+
+    /* The lock waits are read by the dispatcher, in its thread */
+    if (dbname && key) {
+        event = Py_BuildValue("(sOOd)", name, dbname, key,
+                              elapsed_ns / 1000.0);
+    }
+    if (event) {
+        result = PyObject_CallFunctionObjArgs(put, event, NULL);
+        Py_XDECREF(result);
+    }
+    if (PyErr_Occurred())
+        PyErr_WriteUnraisable(put);
+
+    Py_XDECREF(event);
+    Py_XDECREF(key);
+    Py_XDECREF(dbname);
+    Py_DECREF(put);
+    PyErr_Restore(exc_type, exc_value, exc_tb);
+}
+
+/* Stops the dispatcher thread of the slow operation hook, if any */
+static void
+_slow_op_stop(DBEnvObject *env)
+{
+    PyObject *dispatcher = env->slow_op_dispatcher;
+    PyObject *result;
+
+    if (dispatcher == NULL)
+        return;
+    env->slow_op_dispatcher = NULL;
+    Py_CLEAR(env->slow_op_put);
+    result = PyObject_CallMethod(dispatcher, "stop", NULL);
+    if (result == NULL)
+        PyErr_WriteUnraisable(dispatcher);
+    Py_XDECREF(result);
+    Py_DECREF(dispatcher);
+}
+
+/* Implements set_latency_stats() for DB and DBEnv objects */
+static PyObject*
+_set_latency_stats(int *enabled, DBLatencyStats **stats, PyObject* args)
+{
+    int onoff;
+
+    if (!PyArg_ParseTuple(args, "i:set_latency_stats", &onoff))
+        return NULL;
+    if (onoff && (*stats == NULL)) {
+        *stats = PyMem_Calloc(1, sizeof(DBLatencyStats));
+        if (*stats == NULL)
+            return PyErr_NoMemory();
+    }
+    *enabled = onoff ? 1 : 0;
+    Py_RETURN_NONE;
+}
+
+/* Implements get_latency_stats() for DB and DBEnv objects, returning
+   the operations in [first, last) */
+static PyObject*
+_get_latency_stats(DBLatencyStats *stats, int first, int last,
+                   PyObject* args, PyObject* kwargs)
+{
+    int reset = 0;
+    int op, i;
+    PyObject *d, *entry, *buckets;
+    static char* kwnames[] = { "reset", NULL };
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|i:get_latency_stats",
+                                     kwnames, &reset))
+        return NULL;
+    if (stats == NULL)
+        Py_RETURN_NONE;
+
+    d = PyDict_New();
+    if (d == NULL)
+        return NULL;
+    for (op = first; op < last; op++) {
+        DBLatencyOp *o = &stats->ops[op];
+
+        buckets = PyTuple_New(DBLAT_BUCKETS);
+        if (buckets == NULL)
+            goto error;
+        for (i = 0; i < DBLAT_BUCKETS; i++) {
+            PyObject *v = PyLong_FromUnsignedLongLong(o->buckets[i]);
+            if (v == NULL) {
+                Py_DECREF(buckets);
+                goto error;
+            }
+            PyTuple_SET_ITEM(buckets, i, v);
+        }
+        entry = Py_BuildValue("{sKsKsKsN}",
+                              "count", o->count,
+                              "total_ns", o->total_ns,
+                              "gil_wait_ns", o->gil_wait_ns,
+                              "buckets", buckets);
+        if (entry == NULL)
+            goto error;
+        if (PyDict_SetItemString(d, latencyOpNames[op], entry)) {
+            Py_DECREF(entry);
+            goto error;
+        }
+        Py_DECREF(entry);
+    }
+    if (reset) {
+        for (op = first; op < last; op++)
+            memset(&stats->ops[op], 0, sizeof(DBLatencyOp));
+    }
+    return d;
+
+error:
+    Py_DECREF(d);
+    return NULL;
+}
+
 
 /* --------------------------------------------------------------------- */
 /* Exceptions */
@@ -186,6 +417,10 @@ static PyTypeObject *DBLogCursor_Type = NULL;
 #if (DBVER >= 53)
 static PyTypeObject *DBSite_Type = NULL;
 #endif
+#if (DBVER >= 62)
+static PyTypeObject *DBStream_Type = NULL;
+#endif
+static PyTypeObject *DBWriteBatch_Type = NULL;
 
 #define DBObject_CheckExact(v)           (Py_TYPE(v) == DB_Type)
 #define DBCursorObject_CheckExact(v)     (Py_TYPE(v) == DBCursor_Type)
@@ -295,6 +530,11 @@ static PyTypeObject *DBSite_Type = NULL;
          _CHECK_OBJECT_NOT_CLOSED(db_site->site, DBError, DBSite)
 #endif
 
+#if (DBVER >= 62)
+#define CHECK_STREAM_NOT_CLOSED(db_stream) \
+         _CHECK_OBJECT_NOT_CLOSED(db_stream->stream, DBError, DBStream)
+#endif
+
 #define CHECK_DBFLAG(mydb, flag)    (((mydb)->flags & (flag)) || \
                                      (((mydb)->myenvobj != NULL) && ((mydb)->myenvobj->flags & (flag))))
 
@@ -327,6 +567,63 @@ static int make_dbt(PyObject* obj, DBT* dbt)
 }
 
 
+/* The integer keys of Btree and Hash DBs, chosen with set_key_type().
+   They are stored big endian, the sign bit of int64_ordered flipped, so
+   they sort like the integers with the default comparison functions. */
+#define KEYTYPE_UINT32_BE       1
+#define KEYTYPE_UINT64_BE       2
+#define KEYTYPE_INT64_ORDERED   3
+
+static const struct {
+    const char *name;
+    u_int32_t size;
+} _key_types[] = {
+    { "uint32_be", 4 },
+    { "uint64_be", 8 },
+    { "int64_ordered", 8 },
+    { NULL, 0 },
+};
+
+#define HAS_KEY_TYPE(dbobj) ((dbobj)->keyType && \
+        ((dbobj)->dbtype == DB_BTREE || (dbobj)->dbtype == DB_HASH))
+
+static int
+_make_typed_key_dbt(DBObject* self, PyObject* keyobj, DBT* key)
+{
+    unsigned long long value;
+    long long svalue;
+    u_int32_t i, size = _key_types[self->keyType - 1].size;
+
+    if (self->keyType == KEYTYPE_INT64_ORDERED) {
+        svalue = PyLong_AsLongLong(keyobj);
+        if ((svalue == -1) && PyErr_Occurred())
+            return 0;
+        value = (unsigned long long)svalue ^ (1ULL << 63);
+    } else {
+        value = PyLong_AsUnsignedLongLong(keyobj);
+        if ((value == (unsigned long long)-1) && PyErr_Occurred())
+            return 0;
+        if ((self->keyType == KEYTYPE_UINT32_BE) && (value > 0xFFFFFFFFULL)) {
+            PyErr_SetString(PyExc_OverflowError,
+                            "Key too large for a uint32_be key");
+            return 0;
+        }
+    }
+
+    key->data = malloc(size);
+    if (key->data == NULL) {
+        PyErr_SetString(PyExc_MemoryError, "Key memory allocation failed");
+        return 0;
+    }
+    for (i = 0; i < size; i++)
+        ((unsigned char *)key->data)[i] =
+                (unsigned char)(value >> (8 * (size - 1 - i)));
+    key->size = size;
+    key->flags = DB_DBT_REALLOC;
+    return 1;
+}
+
+
 /* Recno and Queue DBs can have integer keys.  This function figures out
    what's been given, verifies that it's allowed, and then makes the DBT.
 
@@ -388,6 +685,8 @@ make_key_dbt(DBObject* self, PyObject* keyobj, DBT* key, int* pflags)
     else if (PyLong_Check(keyobj)) {
         if (dbtype == DB_UNKNOWN)
             return 0;
+        if (HAS_KEY_TYPE(self))
+            return _make_typed_key_dbt(self, keyobj, key);
         if (dbtype == DB_BTREE && pflags != NULL) {
             /* if BTREE then an Integer key is allowed with the
              * DB_SET_RECNO flag */
@@ -396,7 +695,8 @@ make_key_dbt(DBObject* self, PyObject* keyobj, DBT* key, int* pflags)
         else if (dbtype != DB_RECNO && dbtype != DB_QUEUE) {
             PyErr_SetString(
                 PyExc_TypeError,
-                "Integer keys only allowed for Recno and Queue DB's");
+                "Integer keys only allowed for Recno and Queue DB's, "
+                "or with set_key_type()");
             return 0;
         }
 
@@ -578,6 +878,42 @@ static PyObject *BuildValue_LS(long l,const void *p,int s)
   return r;
 }
 
+/* A key of a Btree or Hash DB, as an int if it has a key type.  Keys of
+ * another size, written as bytes, are returned as bytes. */
+static PyObject *
+_DB_build_key(DBObject *self, const void *p, u_int32_t size)
+{
+    unsigned long long value = 0;
+    u_int32_t i;
+
+    if (!HAS_KEY_TYPE(self) || (size != _key_types[self->keyType - 1].size))
+        return BuildValue_S(p, size);
+    for (i = 0; i < size; i++)
+        value = (value << 8) | ((const unsigned char *)p)[i];
+    if (self->keyType == KEYTYPE_INT64_ORDERED)
+        return PyLong_FromLongLong((long long)(value ^ (1ULL << 63)));
+    return PyLong_FromUnsignedLongLong(value);
+}
+
+static PyObject *
+_DB_build_key_data(DBObject *self, DBT *key, DBT *data)
+{
+    PyObject *a, *b, *r;
+
+    if (!HAS_KEY_TYPE(self))
+        return BuildValue_SS(key->data, key->size, data->data, data->size);
+    if (!(a = _DB_build_key(self, key->data, key->size)))
+        return NULL;
+    if (!(b = BuildValue_S(data->data, data->size))) {
+        Py_DECREF(a);
+        return NULL;
+    }
+    r = PyTuple_Pack(2, a, b);
+    Py_DECREF(a);
+    Py_DECREF(b);
+    return r;
+}
+
 
 
 /* make a nice exception object to raise for errors. */
@@ -692,9 +1028,9 @@ static int _DB_delete(DBObject* self, DB_TXN *txn, DBT *key, int flags)
 {
     int err;
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self), self->myenvobj);
     err = self->db->del(self->db, txn, key, 0);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_DELETE, "delete", self, key->size);
     if (makeDBError(err)) {
         return -1;
     }
@@ -708,9 +1044,9 @@ static int _DB_put(DBObject* self, DB_TXN *txn, DBT *key, DBT *data, int flags)
 {
     int err;
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self), self->myenvobj);
     err = self->db->put(self->db, txn, key, data, flags);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_PUT, "put", self, key->size);
     if (makeDBError(err)) {
         return -1;
     }
@@ -741,9 +1077,9 @@ static PyObject* _DBCursor_get(DBCursorObject* self, int extra_flags,
     if (!add_partial_dbt(&data, dlen, doff))
         return NULL;
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self->mydb), self->mydb->myenvobj);
     err = _DBC_get(self->dbc, &key, &data, flags);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_CURSOR, "cursor.get", self->mydb, key.size);
 
     if ((err == DB_NOTFOUND || err == DB_KEYEMPTY)
             && self->mydb->moduleFlags.getReturnsNone) {
@@ -767,7 +1103,7 @@ static PyObject* _DBCursor_get(DBCursorObject* self, int extra_flags,
 #if (DBVER >= 53)
         case DB_HEAP:
 #endif
-            retval = BuildValue_SS(key.data, key.size, data.data, data.size);
+            retval = _DB_build_key_data(self->mydb, &key, &data);
             break;
         default:
             retval = NULL;
@@ -778,24 +1114,30 @@ static PyObject* _DBCursor_get(DBCursorObject* self, int extra_flags,
 }
 
 
-/* add an integer to a dictionary using the given name as a key */
-static void _addIntToDict(PyObject* dict, char *name, int value)
+/* Store a stat value in 'dict' using the given name as a key.  When
+   building a snapshot (see below), 'dict' is a list and the values are
+   just appended: the field names are already known. */
+static void _setStatItem(PyObject* dict, char *name, PyObject* v)
 {
-    PyObject* v = PyLong_FromLong((long) value);
-    if (!v || PyDict_SetItemString(dict, name, v))
+    if (!v)
+        PyErr_Clear();
+    else if (PyList_CheckExact(dict) ? PyList_Append(dict, v)
+                                     : PyDict_SetItemString(dict, name, v))
         PyErr_Clear();
 
     Py_XDECREF(v);
 }
 
+/* add an integer to a dictionary using the given name as a key */
+static void _addIntToDict(PyObject* dict, char *name, int value)
+{
+    _setStatItem(dict, name, PyLong_FromLong((long) value));
+}
+
 /* add an unsigned integer to a dictionary using the given name as a key */
 static void _addUnsignedIntToDict(PyObject* dict, char *name, unsigned int value)
 {
-    PyObject* v = PyLong_FromUnsignedLong((unsigned long) value);
-    if (!v || PyDict_SetItemString(dict, name, v))
-        PyErr_Clear();
-
-    Py_XDECREF(v);
+    _setStatItem(dict, name, PyLong_FromUnsignedLong((unsigned long) value));
 }
 
 /* The same, when the value is a time_t */
@@ -811,32 +1153,333 @@ static void _addTimeTToDict(PyObject* dict, char *name, time_t value)
     {
         v = PyLong_FromLong((long) value);
     }
-    if (!v || PyDict_SetItemString(dict, name, v))
-        PyErr_Clear();
-
-    Py_XDECREF(v);
+    _setStatItem(dict, name, v);
 }
 
 /* add an db_seq_t to a dictionary using the given name as a key */
 static void _addDb_seq_tToDict(PyObject* dict, char *name, db_seq_t value)
 {
-    PyObject* v = PyLong_FromLongLong(value);
-    if (!v || PyDict_SetItemString(dict, name, v))
-        PyErr_Clear();
-
-    Py_XDECREF(v);
+    _setStatItem(dict, name, PyLong_FromLongLong(value));
 }
 
 static void _addDB_lsnToDict(PyObject* dict, char *name, DB_LSN value)
 {
-    PyObject *v = Py_BuildValue("(ll)",value.file,value.offset);
-    if (!v || PyDict_SetItemString(dict, name, v))
-        PyErr_Clear();
+    _setStatItem(dict, name, Py_BuildValue("(ll)",value.file,value.offset));
+}
 
-    Py_XDECREF(v);
+
+/* Stat snapshots.
+
+   With snapshot=True, the stat methods return instances of a struct
+   sequence type (like os.stat_result) instead of dictionaries.  There
+   is a type per kind of stat structure, built on first use from the
+   names of the fields found in the dictionary.  After that, the values
+   are collected in a list and no dictionary is built anymore. */
+
+enum {
+    STAT_HASH, STAT_BTREE, STAT_QUEUE, STAT_HEAP, STAT_MPOOL,
+    STAT_MPOOL_FILE, STAT_LOG, STAT_LOCK, STAT_MUTEX, STAT_TXN, STAT_KINDS
+};
+
+static const char *statSnapshotNames[STAT_KINDS] = {
+    PY_BERKELEYDB_BASE "HashStat",
+    PY_BERKELEYDB_BASE "BtreeStat",
+    PY_BERKELEYDB_BASE "QueueStat",
+    PY_BERKELEYDB_BASE "HeapStat",
+    PY_BERKELEYDB_BASE "MpoolStat",
+    PY_BERKELEYDB_BASE "MpoolFileStat",
+    PY_BERKELEYDB_BASE "LogStat",
+    PY_BERKELEYDB_BASE "LockStat",
+    PY_BERKELEYDB_BASE "MutexStat",
+    PY_BERKELEYDB_BASE "TxnStat",
+};
+
+static PyTypeObject *statSnapshotTypes[STAT_KINDS];
+static Py_ssize_t statSnapshotSizes[STAT_KINDS];
+
+/* Returns the container to be filled with the stat values */
+static PyObject* _newStatDict(int kind, int snapshot)
+{
+    if (snapshot && (statSnapshotTypes[kind] != NULL))
+        return PyList_New(0);
+    return PyDict_New();
+}
+
+static PyTypeObject* _makeStatSnapshotType(int kind, PyObject* dict)
+{
+    PyStructSequence_Desc desc;
+    PyStructSequence_Field *fields;
+    PyTypeObject *type;
+    PyObject *key, *value, *names;
+    Py_ssize_t pos = 0, i = 0, n = PyDict_GET_SIZE(dict);
+    const char *name;
+    char *field_name;
+
+    /* The type lives until the interpreter exits, like its fields */
+    fields = PyMem_Calloc(n + 1, sizeof(PyStructSequence_Field));
+    if (fields == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    while (PyDict_Next(dict, &pos, &key, &value)) {
+        if ((name = PyUnicode_AsUTF8(key)) == NULL)
+            return NULL;
+        if ((field_name = PyMem_Malloc(strlen(name) + 1)) == NULL) {
+            PyErr_NoMemory();
+            return NULL;
+        }
+        strcpy(field_name, name);
+        fields[i].name = field_name;
+        fields[i].doc = NULL;
+        i++;
+    }
+
+    desc.name = (char *)statSnapshotNames[kind];
+    desc.doc = NULL;
+    desc.fields = fields;
+    desc.n_in_sequence = (int)n;
+    if ((type = PyStructSequence_NewType(&desc)) == NULL)
+        return NULL;
+
+    /* Like namedtuple, "_fields" lists the field names */
+    if (((names = PySequence_Tuple(dict)) == NULL) ||
+        PyDict_SetItemString(type->tp_dict, "_fields", names)) {
+        Py_XDECREF(names);
+        Py_DECREF(type);
+        return NULL;
+    }
+    Py_DECREF(names);
+    PyType_Modified(type);
+    return type;
+}
+
+/* Turns the filled container into the value to be returned.  Steals
+   the reference to 'dict'. */
+static PyObject* _finishStatDict(int kind, int snapshot, PyObject* dict)
+{
+    PyTypeObject *type;
+    PyObject *values, *result, *v;
+    Py_ssize_t i;
+
+    if (!snapshot || (dict == NULL))
+        return dict;
+
+    if (PyDict_CheckExact(dict)) {
+        if ((type = statSnapshotTypes[kind]) == NULL) {
+            if ((type = _makeStatSnapshotType(kind, dict)) == NULL) {
+                Py_DECREF(dict);
+                return NULL;
+            }
+            statSnapshotTypes[kind] = type;
+            statSnapshotSizes[kind] = PyDict_GET_SIZE(dict);
+        }
+        values = PyDict_Values(dict);
+        Py_DECREF(dict);
+        if (values == NULL)
+            return NULL;
+    } else {
+        type = statSnapshotTypes[kind];
+        values = dict;
+    }
+
+    /* A value that could not be stored would shift the others */
+    if (PyList_GET_SIZE(values) != statSnapshotSizes[kind]) {
+        Py_DECREF(values);
+        PyErr_SetString(PyExc_SystemError, "Incomplete stat snapshot");
+        return NULL;
+    }
+    if ((result = PyStructSequence_New(type)) == NULL) {
+        Py_DECREF(values);
+        return NULL;
+    }
+    for (i = 0; i < statSnapshotSizes[kind]; i++) {
+        v = PyList_GET_ITEM(values, i);
+        Py_INCREF(v);
+        PyStructSequence_SET_ITEM(result, i, v);
+    }
+    Py_DECREF(values);
+    return result;
 }
 
 /* --------------------------------------------------------------------- */
+/* Native hash functions */
+
+/* 32 bits FNV-1a */
+static u_int32_t
+_hash_fnv1a(const void *data, u_int32_t size)
+{
+    const unsigned char *p = (const unsigned char *)data;
+    u_int32_t h = 2166136261U;
+
+    while (size--) {
+        h ^= *p++;
+        h *= 16777619U;
+    }
+    return h;
+}
+
+#define _HASH_ROTL32(x, r)  (((x) << (r)) | ((x) >> (32 - (r))))
+
+static u_int32_t
+_hash_read32(const unsigned char *p)
+{
+    return (u_int32_t)p[0] | ((u_int32_t)p[1] << 8) |
+           ((u_int32_t)p[2] << 16) | ((u_int32_t)p[3] << 24);
+}
+
+/* MurmurHash3, x86 32 bits variant, seed 0 */
+static u_int32_t
+_hash_murmur3(const void *data, u_int32_t size)
+{
+    const unsigned char *p = (const unsigned char *)data;
+    const u_int32_t c1 = 0xcc9e2d51U, c2 = 0x1b873593U;
+    u_int32_t h = 0, k, i;
+
+    for (i = 0; i < size / 4; i++, p += 4) {
+        k = _hash_read32(p) * c1;
+        k = _HASH_ROTL32(k, 15) * c2;
+        h ^= k;
+        h = _HASH_ROTL32(h, 13) * 5 + 0xe6546b64U;
+    }
+    k = 0;
+    switch (size & 3) {
+        case 3: k ^= (u_int32_t)p[2] << 16;  /* Fall through */
+        case 2: k ^= (u_int32_t)p[1] << 8;   /* Fall through */
+        case 1: k ^= p[0];
+                k *= c1;
+                k = _HASH_ROTL32(k, 15) * c2;
+                h ^= k;
+    }
+    h ^= size;
+    h ^= h >> 16;
+    h *= 0x85ebca6bU;
+    h ^= h >> 13;
+    h *= 0xc2b2ae35U;
+    h ^= h >> 16;
+    return h;
+}
+
+/* xxHash, 32 bits variant, seed 0 */
+#define _XXH_P1 2654435761U
+#define _XXH_P2 2246822519U
+#define _XXH_P3 3266489917U
+#define _XXH_P4  668265263U
+#define _XXH_P5  374761393U
+#define _XXH_ROUND(v, p) \
+    ((v) = _HASH_ROTL32((v) + _hash_read32(p) * _XXH_P2, 13) * _XXH_P1)
+
+static u_int32_t
+_hash_xxh32(const void *data, u_int32_t size)
+{
+    const unsigned char *p = (const unsigned char *)data;
+    const unsigned char *end = p + size;
+    u_int32_t h;
+
+    if (size >= 16) {
+        u_int32_t v1 = _XXH_P1 + _XXH_P2, v2 = _XXH_P2, v3 = 0;
+        u_int32_t v4 = 0U - _XXH_P1;
+
+        for (; p + 16 <= end; p += 16) {
+            _XXH_ROUND(v1, p);
+            _XXH_ROUND(v2, p + 4);
+            _XXH_ROUND(v3, p + 8);
+            _XXH_ROUND(v4, p + 12);
+        }
+        h = _HASH_ROTL32(v1, 1) + _HASH_ROTL32(v2, 7) +
+            _HASH_ROTL32(v3, 12) + _HASH_ROTL32(v4, 18);
+    } else {
+        h = _XXH_P5;
+    }
+    h += size;
+    for (; p + 4 <= end; p += 4)
+        h = _HASH_ROTL32(h + _hash_read32(p) * _XXH_P3, 17) * _XXH_P4;
+    for (; p < end; p++)
+        h = _HASH_ROTL32(h + *p * _XXH_P5, 11) * _XXH_P1;
+    h ^= h >> 15;
+    h *= _XXH_P2;
+    h ^= h >> 13;
+    h *= _XXH_P3;
+    h ^= h >> 16;
+    return h;
+}
+
+static u_int32_t
+_db_hash_fnv1a(DB *db, const void *data, u_int32_t size)
+{
+    return _hash_fnv1a(data, size);
+}
+
+static u_int32_t
+_db_hash_murmur3(DB *db, const void *data, u_int32_t size)
+{
+    return _hash_murmur3(data, size);
+}
+
+static u_int32_t
+_db_hash_xxh32(DB *db, const void *data, u_int32_t size)
+{
+    return _hash_xxh32(data, size);
+}
+
+static const struct {
+    const char *name;
+    u_int32_t (*hash)(DB *, const void *, u_int32_t);
+} _native_hashes[] = {
+    {"fnv1a",       _db_hash_fnv1a},
+    {"murmur3",     _db_hash_murmur3},
+    {"xxhash32",    _db_hash_xxh32},
+    {NULL,          NULL}
+};
+
+
+/* Database partitioning */
+
+static void
+_DB_free_partition_keys(DBObject* self)
+{
+    u_int32_t i;
+
+    if (self->partition_keys == NULL)
+        return;
+    for (i = 0; i < self->partition_parts - 1; i++)
+        PyMem_Free(self->partition_keys[i].data);
+    PyMem_Free(self->partition_keys);
+    self->partition_keys = NULL;
+}
+
+/* Native partitioner: a hash of the key */
+static u_int32_t
+_db_partitionHash(DB *db, DBT *key)
+{
+    DBObject *self = (DBObject *)db->app_private;
+
+    return _hash_fnv1a(key->data, key->size) % self->partition_parts;
+}
+
+static u_int32_t
+_db_partitionCallback(DB *db, DBT *key)
+{
+    DBObject *self = (DBObject *)db->app_private;
+    PyObject *result;
+    unsigned long part = 0;
+
+    MYDB_BEGIN_BLOCK_THREADS;
+    result = PyObject_CallFunction(self->partitionCallback, "y#",
+                                   key->data, (Py_ssize_t)key->size);
+    if (result != NULL) {
+        part = PyLong_AsUnsignedLong(result);
+        Py_DECREF(result);
+    }
+    if (PyErr_Occurred()) {
+        /* we're in a callback within the DB code, we can't raise */
+        PyErr_Print();
+        part = 0;
+    }
+    MYDB_END_BLOCK_THREADS;
+    return (u_int32_t)(part % self->partition_parts);
+}
+
+
 /* Allocators and deallocators */
 
 static DBObject*
@@ -860,9 +1503,20 @@ newDBObject(DBEnvObject* arg, int flags)
     self->associateCallback = NULL;
     self->btCompareCallback = NULL;
     self->dupCompareCallback = NULL;
+    self->hashCallback = NULL;
+    self->prefixCallback = NULL;
+    self->compressCallback = NULL;
+    self->decompressCallback = NULL;
+    self->compression = 0;
+    self->partitionCallback = NULL;
+    self->partition_parts = 0;
+    self->partition_keys = NULL;
     self->primaryDBType = DB_UNKNOWN;
+    self->keyType = 0;
     Py_INCREF(Py_None);
     self->private_obj = Py_None;
+    self->latency_enabled = 0;
+    self->latency = NULL;
     self->in_weakreflist = NULL;
 
     /* keep a reference to our python DBEnv object */
@@ -943,6 +1597,13 @@ DB_dealloc(DBObject* self)
         Py_DECREF(self->dupCompareCallback);
         self->dupCompareCallback = NULL;
     }
+    Py_CLEAR(self->hashCallback);
+    Py_CLEAR(self->prefixCallback);
+    Py_CLEAR(self->compressCallback);
+    Py_CLEAR(self->decompressCallback);
+    Py_CLEAR(self->partitionCallback);
+    _DB_free_partition_keys(self);
+    PyMem_Free(self->latency);
     Py_DECREF(self->private_obj);
     PyObject_Del(self);
 }
@@ -965,6 +1626,9 @@ newDBCursorObject(DBC* dbc, DBTxnObject *txn, DBObject* db)
         self->txn=NULL;
     }
 
+#if (DBVER >= 62)
+    self->children_streams = NULL;
+#endif
     self->in_weakreflist = NULL;
     Py_INCREF(self->mydb);
     return self;
@@ -1071,6 +1735,11 @@ newDBEnvObject(int flags)
     self->private_obj = Py_None;
     Py_INCREF(Py_None);
     self->rep_transport = Py_None;
+    self->latency_enabled = 0;
+    self->latency = NULL;
+    self->slow_op_dispatcher = NULL;
+    self->slow_op_put = NULL;
+    self->slow_op_threshold_ns = 0;
     self->in_weakreflist = NULL;
     self->event_notifyCallback = NULL;
 
@@ -1108,10 +1777,12 @@ DBEnv_dealloc(DBEnvObject* self)
 
     Py_XDECREF(self->event_notifyCallback);
     self->event_notifyCallback = NULL;
+    _slow_op_stop(self);
 
     if (self->in_weakreflist != NULL) {
         PyObject_ClearWeakRefs((PyObject *) self);
     }
+    PyMem_Free(self->latency);
     Py_DECREF(self->private_obj);
     Py_DECREF(self->rep_transport);
     PyObject_Del(self);
@@ -1364,13 +2035,112 @@ DBSite_dealloc(DBSiteObject* self)
 }
 #endif
 
-/* --------------------------------------------------------------------- */
-/* DB methods */
-
-static PyObject*
-DB_append(DBObject* self, PyObject* args, PyObject* kwargs)
+#if (DBVER >= 62)
+static DBStreamObject*
+newDBStreamObject(DB_STREAM* stream, DBCursorObject* cursor)
 {
-    PyObject* txnobj = NULL;
+    DBStreamObject* self;
+
+    self = PyObject_New(DBStreamObject, DBStream_Type);
+
+    if (self == NULL)
+        return NULL;
+
+    self->stream = stream;
+    self->cursor = cursor;
+    self->pos = 0;
+
+    INSERT_IN_DOUBLE_LINKED_LIST(self->cursor->children_streams, self);
+
+    self->in_weakreflist = NULL;
+    Py_INCREF(self->cursor);
+    return self;
+}
+
+/* Forward declaration */
+static PyObject *DBStream_close_internal(DBStreamObject* self);
+
+static void
+DBStream_dealloc(DBStreamObject* self)
+{
+    PyObject *dummy;
+
+    if (self->stream != NULL) {
+        dummy = DBStream_close_internal(self);
+        /*
+        ** Raising exceptions while doing
+        ** garbage collection is a fatal error.
+        */
+        if (dummy)
+            Py_DECREF(dummy);
+        else
+            PyErr_Clear();
+    }
+    if (self->in_weakreflist != NULL) {
+        PyObject_ClearWeakRefs((PyObject *) self);
+    }
+    Py_DECREF(self->cursor);
+    PyObject_Del(self);
+}
+#endif
+
+static DBWriteBatchObject*
+newDBWriteBatchObject(void)
+{
+    DBWriteBatchObject* self;
+
+    self = (DBWriteBatchObject *)DBWriteBatch_Type->tp_alloc(
+                                                    DBWriteBatch_Type, 0);
+    if (self == NULL)
+        return NULL;
+
+    self->ops = NULL;
+    self->size = 0;
+    self->allocated = 0;
+    self->applying = 0;
+    self->in_weakreflist = NULL;
+    return self;
+}
+
+/* Releases an operation not yet (or no longer) counted in the batch */
+static void
+_DBWriteBatch_drop_op(DBWriteBatchOp* op)
+{
+    free(op->key.data);
+    free(op->data.data);
+    Py_DECREF(op->db);
+}
+
+static void
+_DBWriteBatch_clear(DBWriteBatchObject* self)
+{
+    Py_ssize_t i;
+
+    for (i = 0; i < self->size; i++) {
+        _DBWriteBatch_drop_op(&self->ops[i]);
+    }
+    self->size = 0;
+}
+
+static void
+DBWriteBatch_dealloc(DBWriteBatchObject* self)
+{
+    _DBWriteBatch_clear(self);
+    free(self->ops);
+
+    if (self->in_weakreflist != NULL) {
+        PyObject_ClearWeakRefs((PyObject *) self);
+    }
+    PyObject_Del(self);
+}
+
+/* --------------------------------------------------------------------- */
+/* DB methods */
+
+static PyObject*
+DB_append(DBObject* self, PyObject* args, PyObject* kwargs)
+{
+    PyObject* txnobj = NULL;
     PyObject* dataobj;
     PyObject* heap_key = NULL;
     db_recno_t recno;
@@ -1702,9 +2472,9 @@ _DB_consume(DBObject* self, PyObject* args, PyObject* kwargs, int consume_flag)
         return NULL;
     }
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self), self->myenvobj);
     err = self->db->get(self->db, txn, &key, &data, flags|consume_flag);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_GET, "consume", self, key.size);
 
     if ((err == DB_NOTFOUND || err == DB_KEYEMPTY)
             && self->moduleFlags.getReturnsNone) {
@@ -1918,9 +2688,9 @@ DB_exists(DBObject* self, PyObject* args, PyObject* kwargs)
         return NULL;
     }
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self), self->myenvobj);
     err = self->db->exists(self->db, txn, &key, flags);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_GET, "exists", self, key.size);
 
     FREE_DBT(key);
 
@@ -1975,9 +2745,9 @@ DB_get(DBObject* self, PyObject* args, PyObject* kwargs)
         return NULL;
     }
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self), self->myenvobj);
     err = self->db->get(self->db, txn, &key, &data, flags);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_GET, "get", self, key.size);
 
     flags = flags & DB_OPFLAGS_MASK;
 
@@ -1994,7 +2764,7 @@ DB_get(DBObject* self, PyObject* args, PyObject* kwargs)
     }
     else if (!err) {
         if (flags == DB_SET_RECNO)
-            retval = BuildValue_SS(key.data, key.size, data.data, data.size);
+            retval = _DB_build_key_data(self, &key, &data);
         else if ((flags == DB_CONSUME) || (flags == DB_CONSUME_WAIT))
             retval = BuildValue_US(*((db_recno_t*)key.data),
                                    data.data, data.size);
@@ -2049,9 +2819,9 @@ DB_pget(DBObject* self, PyObject* args, PyObject* kwargs)
     CLEAR_DBT(pkey);
     pkey.flags = DB_DBT_MALLOC;
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self), self->myenvobj);
     err = self->db->pget(self->db, txn, &key, &pkey, &data, flags);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_GET, "pget", self, key.size);
 
     flags = flags & DB_OPFLAGS_MASK;
 
@@ -2084,7 +2854,7 @@ DB_pget(DBObject* self, PyObject* args, PyObject* kwargs)
             if (dbtype == DB_RECNO || dbtype == DB_QUEUE)
                 keyObj = PyLong_FromLong(*(int *)key.data);
             else
-                keyObj = Build_PyString(key.data, key.size);
+                keyObj = _DB_build_key(self, key.data, key.size);
             retval = PyTuple_Pack(3, keyObj, pkeyObj, dataObj);
             Py_DECREF(keyObj);
         }
@@ -2132,9 +2902,9 @@ DB_get_size(DBObject* self, PyObject* args, PyObject* kwargs)
        thus getting the record size. */
     data.flags = DB_DBT_USERMEM;
     data.ulen = 0;
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self), self->myenvobj);
     err = self->db->get(self->db, txn, &key, &data, flags);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_GET, "get_size", self, key.size);
     if ((err == DB_BUFFER_SMALL) || (err == 0)) {
         retval = PyLong_FromLong((long)data.size);
         err = 0;
@@ -2146,6 +2916,259 @@ DB_get_size(DBObject* self, PyObject* args, PyObject* kwargs)
     return retval;
 }
 
+/* Partial get straight into a writable buffer, without a bytes copy */
+static PyObject*
+DB_get_into(DBObject* self, PyObject* args, PyObject* kwargs)
+{
+    int err, flags=0;
+    unsigned int doff = 0;
+    PyObject* txnobj = NULL;
+    PyObject* keyobj;
+    PyObject* retval = NULL;
+    Py_buffer buffer;
+    DBT key, data;
+    DB_TXN *txn = NULL;
+    static char* kwnames[] = { "key", "buffer", "doff", "txn", "flags",
+                               NULL };
+
+    CHECK_DB_NOT_CLOSED(self);
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "Ow*|IOi:get_into",
+                                     kwnames, &keyobj, &buffer, &doff,
+                                     &txnobj, &flags))
+        return NULL;
+    if (buffer.len > 0xFFFFFFFFLL) {
+        PyBuffer_Release(&buffer);
+        PyErr_SetString(PyExc_OverflowError,
+                        "get_into() can't read more than 4 GB at once");
+        return NULL;
+    }
+    if (!make_key_dbt(self, keyobj, &key, &flags)) {
+        PyBuffer_Release(&buffer);
+        return NULL;
+    }
+    if (!checkTxnObj(txnobj, &txn)) {
+        FREE_DBT(key);
+        PyBuffer_Release(&buffer);
+        return NULL;
+    }
+
+    CLEAR_DBT(data);
+    data.flags = DB_DBT_USERMEM | DB_DBT_PARTIAL;
+    data.data = buffer.buf;
+    data.ulen = data.dlen = (u_int32_t)buffer.len;
+    data.doff = doff;
+
+    MYDB_BEGIN_TIMED(DB_LATENCY(self), self->myenvobj);
+    err = self->db->get(self->db, txn, &key, &data, flags);
+    MYDB_END_TIMED(DBLAT_GET, "get_into", self, key.size);
+
+    if ((err == DB_NOTFOUND || err == DB_KEYEMPTY)
+             && self->moduleFlags.getReturnsNone) {
+        err = 0;
+        Py_INCREF(Py_None);
+        retval = Py_None;
+    }
+    else if (!err) {
+        retval = PyLong_FromUnsignedLong(data.size);
+    }
+    FREE_DBT(key);
+    PyBuffer_Release(&buffer);
+
+    RETURN_IF_ERR();
+    return retval;
+}
+
+
+/* Transaction of put_stream(): the one given, or a new one if the
+ * database is DB_AUTO_COMMIT, so the record is written all or nothing */
+static int
+_DB_stream_txn(DBObject* self, DB_TXN **txn, DB_TXN **own_txn)
+{
+    int err;
+
+    *own_txn = NULL;
+    if ((*txn != NULL) || (self->myenvobj == NULL) ||
+        !(self->flags & DB_AUTO_COMMIT))
+        return 0;
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->myenvobj->db_env->txn_begin(self->myenvobj->db_env, NULL,
+                                            own_txn, 0);
+    MYDB_END_ALLOW_THREADS;
+    if (makeDBError(err))
+        return -1;
+    *txn = *own_txn;
+    return 0;
+}
+
+static PyObject*
+DB_put_stream(DBObject* self, PyObject* args, PyObject* kwargs)
+{
+    int err;
+    Py_ssize_t chunk_size = 65536;
+    unsigned long long total = 0;
+    PyObject *keyobj, *fileobj, *txnobj = NULL, *chunk;
+    Py_buffer buffer;
+    DBT key, data;
+    DB_TXN *txn = NULL, *own_txn;
+    static char* kwnames[] = { "key", "fileobj", "chunk_size", "txn",
+                               NULL };
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|nO:put_stream",
+                                     kwnames, &keyobj, &fileobj,
+                                     &chunk_size, &txnobj))
+        return NULL;
+    CHECK_DB_NOT_CLOSED(self);
+    if ((chunk_size <= 0) || (chunk_size > 0xFFFFFFFFLL)) {
+        PyErr_SetString(PyExc_ValueError, "Invalid chunk_size");
+        return NULL;
+    }
+    if (!make_key_dbt(self, keyobj, &key, NULL))
+        return NULL;
+    if (!checkTxnObj(txnobj, &txn) ||
+        (_DB_stream_txn(self, &txn, &own_txn) < 0)) {
+        FREE_DBT(key);
+        return NULL;
+    }
+
+    /* The first chunk replaces the record, the others are appended to it
+     * with partial puts, so only a chunk is in memory at a time */
+    for (;;) {
+        chunk = PyObject_CallMethod(fileobj, "read", "n", chunk_size);
+        if (chunk == NULL)
+            goto error;
+        if (PyObject_GetBuffer(chunk, &buffer, PyBUF_SIMPLE) < 0) {
+            Py_DECREF(chunk);
+            goto error;
+        }
+        if ((buffer.len == 0) && total) {
+            PyBuffer_Release(&buffer);
+            Py_DECREF(chunk);
+            break;
+        }
+        if (total + buffer.len > 0xFFFFFFFFULL) {
+            PyBuffer_Release(&buffer);
+            Py_DECREF(chunk);
+            PyErr_SetString(PyExc_OverflowError,
+                            "A record can't be larger than 4 GB");
+            goto error;
+        }
+
+        CLEAR_DBT(data);
+        data.data = buffer.buf;
+        data.size = (u_int32_t)buffer.len;
+        if (total) {
+            data.flags = DB_DBT_PARTIAL;
+            data.doff = (u_int32_t)total;
+            data.dlen = 0;
+        }
+        err = _DB_put(self, txn, &key, &data, 0);
+        total += buffer.len;
+        PyBuffer_Release(&buffer);
+        Py_DECREF(chunk);
+        if (err)
+            goto error;
+        if (data.size == 0)     /* An empty record */
+            break;
+    }
+
+    if (own_txn != NULL) {
+        MYDB_BEGIN_ALLOW_THREADS;
+        err = own_txn->commit(own_txn, 0);
+        MYDB_END_ALLOW_THREADS;
+        if (makeDBError(err)) {
+            FREE_DBT(key);
+            return NULL;
+        }
+    }
+    FREE_DBT(key);
+    return PyLong_FromUnsignedLongLong(total);
+
+error:
+    if (own_txn != NULL) {
+        MYDB_BEGIN_ALLOW_THREADS;
+        own_txn->abort(own_txn);
+        MYDB_END_ALLOW_THREADS;
+    }
+    FREE_DBT(key);
+    return NULL;
+}
+
+static PyObject*
+DB_get_stream(DBObject* self, PyObject* args, PyObject* kwargs)
+{
+    int err = 0, flags = 0;
+    Py_ssize_t chunk_size = 65536;
+    unsigned long long total = 0;
+    PyObject *keyobj, *fileobj, *txnobj = NULL, *chunk, *result;
+    DBT key, data;
+    DB_TXN *txn = NULL;
+    static char* kwnames[] = { "key", "fileobj", "chunk_size", "txn",
+                               NULL };
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|nO:get_stream",
+                                     kwnames, &keyobj, &fileobj,
+                                     &chunk_size, &txnobj))
+        return NULL;
+    CHECK_DB_NOT_CLOSED(self);
+    if ((chunk_size <= 0) || (chunk_size > 0xFFFFFFFFLL)) {
+        PyErr_SetString(PyExc_ValueError, "Invalid chunk_size");
+        return NULL;
+    }
+    if (!make_key_dbt(self, keyobj, &key, &flags))
+        return NULL;
+    if (!checkTxnObj(txnobj, &txn)) {
+        FREE_DBT(key);
+        return NULL;
+    }
+
+    for (;;) {
+        /* Every chunk is read straight into the bytes object written */
+        chunk = PyBytes_FromStringAndSize(NULL, chunk_size);
+        if (chunk == NULL)
+            goto error;
+        CLEAR_DBT(data);
+        data.flags = DB_DBT_USERMEM | DB_DBT_PARTIAL;
+        data.data = PyBytes_AS_STRING(chunk);
+        data.ulen = data.dlen = (u_int32_t)chunk_size;
+        data.doff = (u_int32_t)total;
+        MYDB_BEGIN_TIMED(DB_LATENCY(self), self->myenvobj);
+        err = self->db->get(self->db, txn, &key, &data, flags);
+        MYDB_END_TIMED(DBLAT_GET, "get_stream", self, key.size);
+        if ((err == DB_NOTFOUND || err == DB_KEYEMPTY) && !total
+                && self->moduleFlags.getReturnsNone) {
+            Py_DECREF(chunk);
+            FREE_DBT(key);
+            Py_RETURN_NONE;
+        }
+        if (makeDBError(err)) {
+            Py_DECREF(chunk);
+            goto error;
+        }
+        if (data.size == 0) {
+            Py_DECREF(chunk);
+            break;
+        }
+        if ((data.size != chunk_size) &&
+            (_PyBytes_Resize(&chunk, data.size) < 0))
+            goto error;
+        result = PyObject_CallMethod(fileobj, "write", "O", chunk);
+        Py_DECREF(chunk);
+        if (result == NULL)
+            goto error;
+        Py_DECREF(result);
+        total += data.size;
+        if (data.size < chunk_size)
+            break;
+    }
+
+    FREE_DBT(key);
+    return PyLong_FromUnsignedLongLong(total);
+
+error:
+    FREE_DBT(key);
+    return NULL;
+}
+
 
 static PyObject*
 DB_get_both(DBObject* self, PyObject* args, PyObject* kwargs)
@@ -2183,9 +3206,9 @@ DB_get_both(DBObject* self, PyObject* args, PyObject* kwargs)
         data.flags = DB_DBT_MALLOC;
     }
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self), self->myenvobj);
     err = self->db->get(self->db, txn, &key, &data, flags);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_GET, "get_both", self, key.size);
 
     if ((err == DB_NOTFOUND || err == DB_KEYEMPTY)
             && self->moduleFlags.getReturnsNone) {
@@ -2551,6 +3574,20 @@ DB_set_private(DBObject* self, PyObject* private_obj)
     Py_RETURN_NONE;
 }
 
+static PyObject*
+DB_set_latency_stats(DBObject* self, PyObject* args)
+{
+    /* Can be enabled before opening the database */
+    return _set_latency_stats(&self->latency_enabled, &self->latency, args);
+}
+
+static PyObject*
+DB_get_latency_stats(DBObject* self, PyObject* args, PyObject* kwargs)
+{
+    return _get_latency_stats(self->latency, DBLAT_GET, DBLAT_COMMIT,
+                              args, kwargs);
+}
+
 static PyObject*
 DB_set_priority(DBObject* self, PyObject* args)
 {
@@ -2931,53 +3968,329 @@ DB_set_dup_compare(DBObject* self, PyObject* comparator)
     Py_RETURN_NONE;
 }
 
-
-static PyObject*
-DB_set_cachesize(DBObject* self, PyObject* args)
+/*
+ * Bytes needed to tell that the "right" key is greater than the "left"
+ * one, with a lexical comparison. This is what Berkeley DB does with the
+ * default comparison, but it drops it when set_bt_compare() is used.
+ */
+static size_t
+_default_prefix(const DBT *left, const DBT *right)
 {
-    int err;
-    int gbytes = 0, bytes = 0, ncache = 0;
-
-    if (!PyArg_ParseTuple(args,"ii|i:set_cachesize",
-                          &gbytes,&bytes,&ncache))
-        return NULL;
-    CHECK_DB_NOT_CLOSED(self);
+    size_t cnt, len;
+    const unsigned char *p1, *p2;
 
-    MYDB_BEGIN_ALLOW_THREADS;
-    err = self->db->set_cachesize(self->db, gbytes, bytes, ncache);
-    MYDB_END_ALLOW_THREADS;
-    RETURN_IF_ERR();
-    Py_RETURN_NONE;
+    cnt = 1;
+    len = left->size > right->size ? right->size : left->size;
+    for (p1 = left->data, p2 = right->data; len--; ++p1, ++p2, ++cnt)
+        if (*p1 != *p2)
+            return cnt;
+    if (left->size < right->size)
+        return left->size + 1;
+    return right->size;
 }
 
-static PyObject*
-DB_get_cachesize(DBObject* self)
+static size_t
+_db_lexicalPrefix(DB *db, const DBT *left, const DBT *right)
 {
-    int err;
-    u_int32_t gbytes, bytes;
-    int ncache;
-
-    CHECK_DB_NOT_CLOSED(self);
-
-    MYDB_BEGIN_ALLOW_THREADS;
-    err = self->db->get_cachesize(self->db, &gbytes, &bytes, &ncache);
-    MYDB_END_ALLOW_THREADS;
-
-    RETURN_IF_ERR();
-
-    return Py_BuildValue("(iii)", gbytes, bytes, ncache);
+    return _default_prefix(left, right);
 }
 
-#if (DBVER >= 53)
-static PyObject*
-DB_set_heapsize(DBObject* self, PyObject* args)
+static size_t
+_db_prefixCallback(DB *db, const DBT *left, const DBT *right)
 {
-    int err;
-    int gbytes = 0, bytes = 0;
+    size_t res;
+    PyObject *args;
+    PyObject *result = NULL;
+    DBObject *self = (DBObject *)db->app_private;
 
-    if (!PyArg_ParseTuple(args,"ii:set_heapsize",
-                          &gbytes, &bytes))
-        return NULL;
+    MYDB_BEGIN_BLOCK_THREADS;
+
+    args = BuildValue_SS(left->data, left->size, right->data, right->size);
+    if (args != NULL) {
+        result = PyObject_CallObject(self->prefixCallback, args);
+    }
+    if (args == NULL || result == NULL) {
+        /* we're in a callback within the DB code, we can't raise */
+        PyErr_Print();
+        res = _default_prefix(left, right);
+    } else if (PyLong_Check(result)) {
+        res = PyLong_AsSize_t(result);
+        if (PyErr_Occurred() || (res > right->size)) {
+            PyErr_Clear();
+            PyErr_SetString(PyExc_ValueError, "DB_bt_prefix callback "
+                            "MUST return a size of the second key.");
+            PyErr_Print();
+            res = _default_prefix(left, right);
+        }
+    } else {
+        PyErr_SetString(PyExc_TypeError,
+                        "DB_bt_prefix callback MUST return an int.");
+        /* we're in a callback within the DB code, we can't raise */
+        PyErr_Print();
+        res = _default_prefix(left, right);
+    }
+
+    Py_XDECREF(args);
+    Py_XDECREF(result);
+
+    MYDB_END_BLOCK_THREADS;
+    return res;
+}
+
+static PyObject*
+DB_set_bt_prefix(DBObject* self, PyObject* prefix)
+{
+    int err;
+    size_t (*function)(DB *, const DBT *, const DBT *);
+
+    CHECK_DB_NOT_CLOSED(self);
+
+    if (PyUnicode_Check(prefix)) {
+        if (PyUnicode_CompareWithASCIIString(prefix, "lexical")) {
+            PyErr_Format(PyExc_ValueError, "Unknown prefix function: %R",
+                         prefix);
+            return NULL;
+        }
+        function = _db_lexicalPrefix;
+    } else if (PyCallable_Check(prefix)) {
+        function = _db_prefixCallback;
+    } else {
+        makeTypeError("Callable or str", prefix);
+        return NULL;
+    }
+
+    if (self->prefixCallback != NULL) {
+        PyErr_SetString(PyExc_RuntimeError,
+                        "set_bt_prefix() cannot be called more than once");
+        return NULL;
+    }
+
+    Py_INCREF(prefix);
+    self->prefixCallback = prefix;
+
+    err = self->db->set_bt_prefix(self->db, function);
+
+    if (err) {
+        /* restore the old state in case of error */
+        Py_CLEAR(self->prefixCallback);
+    }
+
+    RETURN_IF_ERR();
+    Py_RETURN_NONE;
+}
+
+/* Copies a callback result to a DBT given by Berkeley DB */
+static int
+_db_fill_dbt(DBT *dest, PyObject *value)
+{
+    if (!PyBytes_Check(value)) {
+        makeTypeError("bytes", value);
+        return -1;
+    }
+    dest->size = (u_int32_t)PyBytes_GET_SIZE(value);
+    if (dest->size > dest->ulen)
+        return 1;
+    memcpy(dest->data, PyBytes_AS_STRING(value), dest->size);
+    return 0;
+}
+
+static int
+_db_compressCallback(DB *db, const DBT *prevKey, const DBT *prevData,
+                     const DBT *key, const DBT *data, DBT *dest)
+{
+    int res;
+    PyObject *result;
+    DBObject *self = (DBObject *)db->app_private;
+
+    MYDB_BEGIN_BLOCK_THREADS;
+
+    result = PyObject_CallFunction(self->compressCallback, "y#y#y#y#",
+                                   prevKey->data ? prevKey->data : "",
+                                   (Py_ssize_t)prevKey->size,
+                                   prevData->data ? prevData->data : "",
+                                   (Py_ssize_t)prevData->size,
+                                   key->data ? key->data : "",
+                                   (Py_ssize_t)key->size,
+                                   data->data ? data->data : "",
+                                   (Py_ssize_t)data->size);
+    if (result == NULL) {
+        res = EINVAL;
+    } else {
+        switch (_db_fill_dbt(dest, result)) {
+            case 0: res = 0; break;
+            case 1: res = DB_BUFFER_SMALL; break;
+            default: res = EINVAL;
+        }
+        Py_DECREF(result);
+    }
+    if (res == EINVAL) {
+        /* we're in a callback within the DB code, we can't raise */
+        PyErr_Print();
+    }
+
+    MYDB_END_BLOCK_THREADS;
+    return res;
+}
+
+static int
+_db_decompressCallback(DB *db, const DBT *prevKey, const DBT *prevData,
+                       DBT *compressed, DBT *destKey, DBT *destData)
+{
+    int res = EINVAL, key_small, data_small;
+    Py_ssize_t used;
+    PyObject *result;
+    DBObject *self = (DBObject *)db->app_private;
+
+    MYDB_BEGIN_BLOCK_THREADS;
+
+    result = PyObject_CallFunction(self->decompressCallback, "y#y#y#",
+                                   prevKey->data ? prevKey->data : "",
+                                   (Py_ssize_t)prevKey->size,
+                                   prevData->data ? prevData->data : "",
+                                   (Py_ssize_t)prevData->size,
+                                   compressed->data ? compressed->data : "",
+                                   (Py_ssize_t)compressed->size);
+    if (result == NULL) {
+        goto exit;
+    }
+    if (!PyTuple_Check(result) || (PyTuple_GET_SIZE(result) != 3)) {
+        PyErr_SetString(PyExc_TypeError, "DB_bt_decompress callback MUST "
+                        "return a (key, data, size) tuple.");
+        goto exit;
+    }
+    used = PyLong_AsSsize_t(PyTuple_GET_ITEM(result, 2));
+    if (PyErr_Occurred())
+        goto exit;
+    if ((used <= 0) || (used > compressed->size)) {
+        PyErr_SetString(PyExc_ValueError, "DB_bt_decompress callback "
+                        "returned an invalid compressed size.");
+        goto exit;
+    }
+    if (((key_small = _db_fill_dbt(destKey,
+                                   PyTuple_GET_ITEM(result, 0))) < 0) ||
+        ((data_small = _db_fill_dbt(destData,
+                                    PyTuple_GET_ITEM(result, 1))) < 0))
+        goto exit;
+    /* Berkeley DB calls us again with the sizes asked for */
+    res = (key_small || data_small) ? DB_BUFFER_SMALL : 0;
+    compressed->size = (u_int32_t)used;
+
+exit:
+    if (res == EINVAL) {
+        /* we're in a callback within the DB code, we can't raise */
+        PyErr_Print();
+    }
+    Py_XDECREF(result);
+
+    MYDB_END_BLOCK_THREADS;
+    return res;
+}
+
+static PyObject*
+DB_set_bt_compress(DBObject* self, PyObject* args, PyObject* kwargs)
+{
+    int err;
+    PyObject *compress = Py_None, *decompress = Py_None;
+    static char* kwnames[] = { "compress", "decompress", NULL };
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|OO:set_bt_compress",
+                                     kwnames, &compress, &decompress))
+        return NULL;
+    CHECK_DB_NOT_CLOSED(self);
+
+    if ((compress == Py_None) != (decompress == Py_None)) {
+        PyErr_SetString(PyExc_TypeError, "set_bt_compress() needs both "
+                        "compress and decompress, or neither");
+        return NULL;
+    }
+    if (compress != Py_None) {
+        if (!PyCallable_Check(compress)) {
+            makeTypeError("Callable", compress);
+            return NULL;
+        }
+        if (!PyCallable_Check(decompress)) {
+            makeTypeError("Callable", decompress);
+            return NULL;
+        }
+    }
+
+    if (self->compression) {
+        PyErr_SetString(PyExc_RuntimeError,
+                        "set_bt_compress() cannot be called more than once");
+        return NULL;
+    }
+
+    if (compress == Py_None) {
+        /* The native prefix compression of Berkeley DB */
+        MYDB_BEGIN_ALLOW_THREADS;
+        err = self->db->set_bt_compress(self->db, NULL, NULL);
+        MYDB_END_ALLOW_THREADS;
+    } else {
+        Py_INCREF(compress);
+        self->compressCallback = compress;
+        Py_INCREF(decompress);
+        self->decompressCallback = decompress;
+        err = self->db->set_bt_compress(self->db, _db_compressCallback,
+                                        _db_decompressCallback);
+        if (err) {
+            /* restore the old state in case of error */
+            Py_CLEAR(self->compressCallback);
+            Py_CLEAR(self->decompressCallback);
+        }
+    }
+
+    RETURN_IF_ERR();
+    self->compression = 1;
+    Py_RETURN_NONE;
+}
+
+
+static PyObject*
+DB_set_cachesize(DBObject* self, PyObject* args)
+{
+    int err;
+    int gbytes = 0, bytes = 0, ncache = 0;
+
+    if (!PyArg_ParseTuple(args,"ii|i:set_cachesize",
+                          &gbytes,&bytes,&ncache))
+        return NULL;
+    CHECK_DB_NOT_CLOSED(self);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->db->set_cachesize(self->db, gbytes, bytes, ncache);
+    MYDB_END_ALLOW_THREADS;
+    RETURN_IF_ERR();
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+DB_get_cachesize(DBObject* self)
+{
+    int err;
+    u_int32_t gbytes, bytes;
+    int ncache;
+
+    CHECK_DB_NOT_CLOSED(self);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->db->get_cachesize(self->db, &gbytes, &bytes, &ncache);
+    MYDB_END_ALLOW_THREADS;
+
+    RETURN_IF_ERR();
+
+    return Py_BuildValue("(iii)", gbytes, bytes, ncache);
+}
+
+#if (DBVER >= 53)
+static PyObject*
+DB_set_heapsize(DBObject* self, PyObject* args)
+{
+    int err;
+    int gbytes = 0, bytes = 0;
+
+    if (!PyArg_ParseTuple(args,"ii:set_heapsize",
+                          &gbytes, &bytes))
+        return NULL;
 
     CHECK_DB_NOT_CLOSED(self);
 
@@ -3135,6 +4448,97 @@ DB_get_transactional(DBObject* self)
     return NULL;
 }
 
+static u_int32_t
+_db_hashCallback(DB *db, const void *data, u_int32_t size)
+{
+    u_int32_t res = 0;
+    PyObject *result;
+    DBObject *self = (DBObject *)db->app_private;
+
+    MYDB_BEGIN_BLOCK_THREADS;
+    result = PyObject_CallFunction(self->hashCallback, "y#",
+                                   data, (Py_ssize_t)size);
+    if (result == NULL) {
+        /* we're in a callback within the DB code, we can't raise */
+        PyErr_Print();
+        res = _hash_fnv1a(data, size);
+    } else if (PyLong_Check(result)) {
+        res = (u_int32_t)PyLong_AsUnsignedLongMask(result);
+    } else {
+        PyErr_SetString(PyExc_TypeError,
+                        "DB_h_hash callback MUST return an int.");
+        /* we're in a callback within the DB code, we can't raise */
+        PyErr_Print();
+        res = _hash_fnv1a(data, size);
+    }
+    Py_XDECREF(result);
+    MYDB_END_BLOCK_THREADS;
+    return res;
+}
+
+static PyObject*
+DB_set_h_hash(DBObject* self, PyObject* hash)
+{
+    int err, i;
+    const char *name;
+    u_int32_t (*function)(DB *, const void *, u_int32_t) = NULL;
+
+    CHECK_DB_NOT_CLOSED(self);
+
+    if (PyUnicode_Check(hash)) {
+        if ((name = PyUnicode_AsUTF8(hash)) == NULL)
+            return NULL;
+        for (i = 0; _native_hashes[i].name != NULL; i++) {
+            if (!strcmp(name, _native_hashes[i].name)) {
+                function = _native_hashes[i].hash;
+                break;
+            }
+        }
+        if (function == NULL) {
+            PyErr_Format(PyExc_ValueError, "Unknown hash function: %R",
+                         hash);
+            return NULL;
+        }
+    } else if (PyCallable_Check(hash)) {
+        function = _db_hashCallback;
+    } else {
+        makeTypeError("Callable or str", hash);
+        return NULL;
+    }
+
+    /* Like set_bt_compare(), the hash function can't change once the db
+     * is opened anyway */
+    if (self->hashCallback != NULL) {
+        PyErr_SetString(PyExc_RuntimeError,
+                        "set_h_hash() cannot be called more than once");
+        return NULL;
+    }
+
+    Py_INCREF(hash);
+    self->hashCallback = hash;
+
+    err = self->db->set_h_hash(self->db, function);
+
+    if (err) {
+        /* restore the old state in case of error */
+        Py_CLEAR(self->hashCallback);
+    }
+
+    RETURN_IF_ERR();
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+DB_get_h_hash(DBObject* self)
+{
+    CHECK_DB_NOT_CLOSED(self);
+
+    if (self->hashCallback == NULL)
+        Py_RETURN_NONE;
+    Py_INCREF(self->hashCallback);
+    return self->hashCallback;
+}
+
 static PyObject*
 DB_set_h_ffactor(DBObject* self, PyObject* args)
 {
@@ -3327,91 +4731,398 @@ DB_get_re_len(DBObject* self)
     return PyLong_FromLong(re_len);
 }
 
-static PyObject*
-DB_set_re_pad(DBObject* self, PyObject* args)
-{
-    int err;
-    char pad;
+static PyObject*
+DB_set_re_pad(DBObject* self, PyObject* args)
+{
+    int err;
+    char pad;
+
+    if (!PyArg_ParseTuple(args,"b:set_re_pad", &pad)) {
+        PyErr_Clear();
+        if (!PyArg_ParseTuple(args,"c:set_re_pad", &pad))
+            return NULL;
+    }
+    CHECK_DB_NOT_CLOSED(self);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->db->set_re_pad(self->db, pad);
+    MYDB_END_ALLOW_THREADS;
+    RETURN_IF_ERR();
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+DB_get_re_pad(DBObject* self)
+{
+    int err, re_pad;
+    char buf[1];
+
+    CHECK_DB_NOT_CLOSED(self);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->db->get_re_pad(self->db, &re_pad);
+    MYDB_END_ALLOW_THREADS;
+    RETURN_IF_ERR();
+    buf[0] = re_pad;
+    return PyBytes_FromStringAndSize(buf, 1);
+}
+
+static PyObject*
+DB_set_re_source(DBObject* self, PyObject* args)
+{
+    int err;
+    PyObject *sourceObj;
+    char *source;
+
+    if (!PyArg_ParseTuple(args,"O&:set_re_source",
+                PyUnicode_FSConverter, &sourceObj))
+        return NULL;
+    CHECK_DB_NOT_CLOSED(self);
+
+    source = PyBytes_AS_STRING(sourceObj);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->db->set_re_source(self->db, source);
+    MYDB_END_ALLOW_THREADS;
+    RETURN_IF_ERR();
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+DB_get_re_source(DBObject* self)
+{
+    int err;
+    const char *source;
+
+    CHECK_DB_NOT_CLOSED(self);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->db->get_re_source(self->db, &source);
+    MYDB_END_ALLOW_THREADS;
+    RETURN_IF_ERR();
+    return PyUnicode_DecodeFSDefault(source);
+}
+
+#if (DBVER >= 62)
+static PyObject*
+DB_set_ext_file_threshold(DBObject* self, PyObject* args)
+{
+    int err;
+    unsigned int bytes, flags = 0;
+
+    if (!PyArg_ParseTuple(args, "I|I:set_ext_file_threshold", &bytes, &flags))
+        return NULL;
+    CHECK_DB_NOT_CLOSED(self);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->db->set_ext_file_threshold(self->db, bytes, flags);
+    MYDB_END_ALLOW_THREADS;
+    RETURN_IF_ERR();
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+DB_get_ext_file_threshold(DBObject* self)
+{
+    int err;
+    u_int32_t bytes;
+
+    CHECK_DB_NOT_CLOSED(self);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->db->get_ext_file_threshold(self->db, &bytes);
+    MYDB_END_ALLOW_THREADS;
+    RETURN_IF_ERR();
+    return PyLong_FromUnsignedLong(bytes);
+}
+
+static PyObject*
+DB_set_ext_file_dir(DBObject* self, PyObject* args)
+{
+    int err;
+    PyObject *dirObj;
+    char *dir;
+
+    if (!PyArg_ParseTuple(args, "O&:set_ext_file_dir",
+                          PyUnicode_FSConverter, &dirObj))
+        return NULL;
+    CHECK_DB_NOT_CLOSED(self);
+    dir = PyBytes_AS_STRING(dirObj);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->db->set_ext_file_dir(self->db, dir);
+    MYDB_END_ALLOW_THREADS;
+    Py_DECREF(dirObj);
+    RETURN_IF_ERR();
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+DB_get_ext_file_dir(DBObject* self)
+{
+    int err;
+    const char *dir = NULL;
+
+    CHECK_DB_NOT_CLOSED(self);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->db->get_ext_file_dir(self->db, &dir);
+    MYDB_END_ALLOW_THREADS;
+    RETURN_IF_ERR();
+    if (dir == NULL)
+        Py_RETURN_NONE;
+    return PyUnicode_DecodeFSDefault(dir);
+}
+#endif
+
+static PyObject*
+DB_set_partition(DBObject* self, PyObject* args, PyObject* kwargs)
+{
+    int err;
+    PyObject *partsobj, *callback = Py_None, *keysobj;
+    Py_ssize_t i, nkeys;
+    unsigned long parts;
+    DBT *keys;
+    static char* kwnames[] = { "parts", "callback", NULL };
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:set_partition",
+                                     kwnames, &partsobj, &callback))
+        return NULL;
+    CHECK_DB_NOT_CLOSED(self);
+
+    /* As with set_bt_compare(), the partitioning can't change once the
+     * database is opened anyway */
+    if (self->partition_parts) {
+        PyErr_SetString(PyExc_RuntimeError,
+                        "set_partition() cannot be called more than once");
+        return NULL;
+    }
+
+    if (PyLong_Check(partsobj)) {
+        parts = PyLong_AsUnsignedLong(partsobj);
+        if (PyErr_Occurred())
+            return NULL;
+        if ((parts < 2) || (parts > 0xFFFFFFFFUL)) {
+            PyErr_SetString(PyExc_ValueError,
+                            "There must be 2 or more partitions");
+            return NULL;
+        }
+        if (callback != Py_None) {
+            if (!PyCallable_Check(callback)) {
+                makeTypeError("Callable", callback);
+                return NULL;
+            }
+            Py_INCREF(callback);
+            self->partitionCallback = callback;
+        }
+        self->partition_parts = (u_int32_t)parts;
+
+        MYDB_BEGIN_ALLOW_THREADS;
+        err = self->db->set_partition(self->db, (u_int32_t)parts, NULL,
+                                      (callback != Py_None) ?
+                                      _db_partitionCallback :
+                                      _db_partitionHash);
+        MYDB_END_ALLOW_THREADS;
+        if (err) {
+            Py_CLEAR(self->partitionCallback);
+            self->partition_parts = 0;
+        }
+        RETURN_IF_ERR();
+        Py_RETURN_NONE;
+    }
+
+    if (callback != Py_None) {
+        PyErr_SetString(PyExc_TypeError, "A partition callback needs "
+                        "the number of partitions, not keys");
+        return NULL;
+    }
+    keysobj = PySequence_Fast(partsobj, "parts must be the number of "
+                              "partitions or a sequence of keys");
+    if (keysobj == NULL)
+        return NULL;
+    nkeys = PySequence_Fast_GET_SIZE(keysobj);
+    if ((nkeys < 1) || (nkeys >= 0xFFFFFFFFL)) {
+        Py_DECREF(keysobj);
+        PyErr_SetString(PyExc_ValueError,
+                        "There must be 1 or more partition keys");
+        return NULL;
+    }
+    keys = PyMem_Calloc(nkeys, sizeof(DBT));
+    if (keys == NULL) {
+        Py_DECREF(keysobj);
+        return PyErr_NoMemory();
+    }
+    self->partition_keys = keys;
+    self->partition_parts = (u_int32_t)nkeys + 1;
+    for (i = 0; i < nkeys; i++) {
+        PyObject *key = PySequence_Fast_GET_ITEM(keysobj, i);
 
-    if (!PyArg_ParseTuple(args,"b:set_re_pad", &pad)) {
-        PyErr_Clear();
-        if (!PyArg_ParseTuple(args,"c:set_re_pad", &pad))
-            return NULL;
+        if (!PyBytes_Check(key)) {
+            makeTypeError("bytes", key);
+            goto error;
+        }
+        keys[i].size = (u_int32_t)PyBytes_GET_SIZE(key);
+        /* Not empty, so a zero-length key is not a NULL pointer */
+        keys[i].data = PyMem_Malloc(keys[i].size + 1);
+        if (keys[i].data == NULL) {
+            PyErr_NoMemory();
+            goto error;
+        }
+        memcpy(keys[i].data, PyBytes_AS_STRING(key), keys[i].size);
     }
-    CHECK_DB_NOT_CLOSED(self);
+    Py_DECREF(keysobj);
 
     MYDB_BEGIN_ALLOW_THREADS;
-    err = self->db->set_re_pad(self->db, pad);
+    err = self->db->set_partition(self->db, self->partition_parts, keys,
+                                  NULL);
     MYDB_END_ALLOW_THREADS;
+    if (err) {
+        _DB_free_partition_keys(self);
+        self->partition_parts = 0;
+    }
     RETURN_IF_ERR();
     Py_RETURN_NONE;
+
+error:
+    Py_DECREF(keysobj);
+    _DB_free_partition_keys(self);
+    self->partition_parts = 0;
+    return NULL;
 }
 
 static PyObject*
-DB_get_re_pad(DBObject* self)
+DB_get_partition(DBObject* self)
 {
-    int err, re_pad;
-    char buf[1];
+    int err;
+    u_int32_t parts = 0, i;
+    DBT *keys = NULL;
+    u_int32_t (*callback)(DB *, DBT *) = NULL;
+    PyObject *list, *key;
 
     CHECK_DB_NOT_CLOSED(self);
 
     MYDB_BEGIN_ALLOW_THREADS;
-    err = self->db->get_re_pad(self->db, &re_pad);
+    err = self->db->get_partition_keys(self->db, &parts, &keys);
+    if (!err && (keys == NULL))
+        err = self->db->get_partition_callback(self->db, &parts, &callback);
     MYDB_END_ALLOW_THREADS;
     RETURN_IF_ERR();
-    buf[0] = re_pad;
-    return PyBytes_FromStringAndSize(buf, 1);
+
+    if (keys == NULL)
+        return Py_BuildValue("(IO)", parts, Py_None);
+
+    list = PyList_New(parts - 1);
+    if (list == NULL)
+        return NULL;
+    for (i = 0; i < parts - 1; i++) {
+        key = BuildValue_S(keys[i].data, keys[i].size);
+        if (key == NULL) {
+            Py_DECREF(list);
+            return NULL;
+        }
+        PyList_SET_ITEM(list, i, key);
+    }
+    return Py_BuildValue("(IN)", parts, list);
 }
 
 static PyObject*
-DB_set_re_source(DBObject* self, PyObject* args)
+DB_set_partition_dirs(DBObject* self, PyObject* dirsobj)
 {
     int err;
-    PyObject *sourceObj;
-    char *source;
+    PyObject *seq, *item;
+    PyObject **encoded;
+    const char **dirs;
+    Py_ssize_t i, size;
 
-    if (!PyArg_ParseTuple(args,"O&:set_re_source",
-                PyUnicode_FSConverter, &sourceObj))
-        return NULL;
     CHECK_DB_NOT_CLOSED(self);
 
-    source = PyBytes_AS_STRING(sourceObj);
+    seq = PySequence_Fast(dirsobj, "set_partition_dirs() needs a "
+                          "sequence of directories");
+    if (seq == NULL)
+        return NULL;
+    size = PySequence_Fast_GET_SIZE(seq);
+    encoded = PyMem_Calloc(size + 1, sizeof(PyObject *));
+    dirs = PyMem_Calloc(size + 1, sizeof(char *));
+    if ((encoded == NULL) || (dirs == NULL)) {
+        PyErr_NoMemory();
+        goto exit;
+    }
+    for (i = 0; i < size; i++) {
+        item = PySequence_Fast_GET_ITEM(seq, i);
+        if (!PyUnicode_FSConverter(item, &encoded[i]))
+            goto exit;
+        dirs[i] = PyBytes_AS_STRING(encoded[i]);
+    }
+    dirs[size] = NULL;
 
+    /* Berkeley DB keeps its own copy */
     MYDB_BEGIN_ALLOW_THREADS;
-    err = self->db->set_re_source(self->db, source);
+    err = self->db->set_partition_dirs(self->db, dirs);
     MYDB_END_ALLOW_THREADS;
-    RETURN_IF_ERR();
+    makeDBError(err);
+
+exit:
+    if (encoded != NULL) {
+        for (i = 0; i < size; i++)
+            Py_XDECREF(encoded[i]);
+    }
+    PyMem_Free(encoded);
+    PyMem_Free(dirs);
+    Py_DECREF(seq);
+    if (PyErr_Occurred())
+        return NULL;
     Py_RETURN_NONE;
 }
 
 static PyObject*
-DB_get_re_source(DBObject* self)
+DB_get_partition_dirs(DBObject* self)
 {
     int err;
-    const char *source;
+    PyObject *tuple;
+    PyObject *item;
+    const char **dirpp = NULL;
+    int size = 0, i;
 
     CHECK_DB_NOT_CLOSED(self);
 
     MYDB_BEGIN_ALLOW_THREADS;
-    err = self->db->get_re_source(self->db, &source);
+    err = self->db->get_partition_dirs(self->db, &dirpp);
     MYDB_END_ALLOW_THREADS;
+
     RETURN_IF_ERR();
-    return PyUnicode_DecodeFSDefault(source);
+
+    if (dirpp != NULL)
+        for (size=0; *(dirpp+size) ; size++);
+
+    tuple = PyTuple_New(size);
+    if (!tuple)
+        return NULL;
+
+    for (i=0; i<size; i++) {
+        item = PyUnicode_DecodeFSDefault(*(dirpp+i));
+        if (item == NULL) {
+            Py_DECREF(tuple);
+            tuple = NULL;
+            break;
+        }
+        PyTuple_SET_ITEM(tuple, i, item);
+    }
+    return tuple;
 }
 
 static PyObject*
 DB_stat(DBObject* self, PyObject* args, PyObject* kwargs)
 {
-    int err, flags = 0;
+    int err, flags = 0, snapshot = 0, kind;
     DBTYPE dbtype;
     void* sp;
     PyObject* d;
     PyObject* txnobj = NULL;
     DB_TXN *txn = NULL;
-    static char* kwnames[] = { "flags", "txn", NULL };
+    static char* kwnames[] = { "flags", "txn", "snapshot", NULL };
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|iO:stat", kwnames,
-                                     &flags, &txnobj))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|iOi:stat", kwnames,
+                                     &flags, &txnobj, &snapshot))
         return NULL;
     if (!checkTxnObj(txnobj, &txn))
         return NULL;
@@ -3424,7 +5135,16 @@ DB_stat(DBObject* self, PyObject* args, PyObject* kwargs)
 
     /* Turn the stat structure into a dictionary */
     dbtype = self->dbtype;
-    if ((dbtype == DB_UNKNOWN) || ((d = PyDict_New()) == NULL)) {
+    switch (dbtype) {
+        case DB_HASH:   kind = STAT_HASH;   break;
+        case DB_QUEUE:  kind = STAT_QUEUE;  break;
+#if (DBVER >= 53)
+        case DB_HEAP:   kind = STAT_HEAP;   break;
+#endif
+        default:        kind = STAT_BTREE;  break;
+    }
+    if ((dbtype == DB_UNKNOWN) ||
+        ((d = _newStatDict(kind, snapshot)) == NULL)) {
         free(sp);
         return NULL;
     }
@@ -3533,7 +5253,7 @@ DB_stat(DBObject* self, PyObject* args, PyObject* kwargs)
 #undef MAKE_QUEUE_ENTRY
 
     free(sp);
-    return d;
+    return _finishStatDict(kind, snapshot, d);
 }
 
 static PyObject*
@@ -3699,6 +5419,54 @@ DB_set_get_returns_none(DBObject* self, PyObject* args)
     return PyLong_FromLong(oldValue);
 }
 
+static PyObject*
+DB_set_key_type(DBObject* self, PyObject* keytypeobj)
+{
+    int i, keyType = 0;
+    const char *name;
+
+    CHECK_DB_NOT_CLOSED(self);
+
+    if (keytypeobj != Py_None) {
+        if (!PyUnicode_Check(keytypeobj)) {
+            makeTypeError("str or None", keytypeobj);
+            return NULL;
+        }
+        if ((name = PyUnicode_AsUTF8(keytypeobj)) == NULL)
+            return NULL;
+        for (i = 0; _key_types[i].name != NULL; i++) {
+            if (!strcmp(name, _key_types[i].name)) {
+                keyType = i + 1;
+                break;
+            }
+        }
+        if (!keyType) {
+            PyErr_Format(PyExc_ValueError, "Unknown key type: %R",
+                         keytypeobj);
+            return NULL;
+        }
+        if ((self->dbtype != DB_UNKNOWN) && (self->dbtype != DB_BTREE) &&
+            (self->dbtype != DB_HASH)) {
+            PyErr_SetString(PyExc_TypeError,
+                            "Key types are only allowed for Btree and "
+                            "Hash DB's");
+            return NULL;
+        }
+    }
+    self->keyType = keyType;
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+DB_get_key_type(DBObject* self)
+{
+    CHECK_DB_NOT_CLOSED(self);
+
+    if (!self->keyType)
+        Py_RETURN_NONE;
+    return PyUnicode_FromString(_key_types[self->keyType - 1].name);
+}
+
 static PyObject*
 DB_set_encrypt(DBObject* self, PyObject* args, PyObject* kwargs)
 {
@@ -3789,9 +5557,9 @@ PyObject* DB_subscript(DBObject* self, PyObject* keyobj)
         /* Tell Berkeley DB to malloc the return value (thread safe) */
         data.flags = DB_DBT_MALLOC;
     }
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self), self->myenvobj);
     err = self->db->get(self->db, NULL, &key, &data, 0);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_GET, "get", self, key.size);
     if (err == DB_NOTFOUND || err == DB_KEYEMPTY) {
         PyErr_SetObject(PyExc_KeyError, keyobj);
         retval = NULL;
@@ -3870,9 +5638,9 @@ _DB_has_key(DBObject* self, PyObject* keyobj, PyObject* txnobj)
         return NULL;
     }
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self), self->myenvobj);
     err = self->db->exists(self->db, txn, &key, 0);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_GET, "exists", self, key.size);
 
     FREE_DBT(key);
 
@@ -3972,7 +5740,7 @@ _DB_make_list(DBObject* self, DB_TXN* txn, int type)
             case DB_BTREE:
             case DB_HASH:
             default:
-                item = Build_PyString(key.data, key.size);
+                item = _DB_build_key(self, key.data, key.size);
                 break;
             case DB_RECNO:
             case DB_QUEUE:
@@ -3990,7 +5758,7 @@ _DB_make_list(DBObject* self, DB_TXN* txn, int type)
             case DB_BTREE:
             case DB_HASH:
             default:
-                item = BuildValue_SS(key.data, key.size, data.data, data.size);
+                item = _DB_build_key_data(self, &key, &data);
                 break;
             case DB_RECNO:
             case DB_QUEUE:
@@ -4313,6 +6081,176 @@ DBSite_set_config(DBSiteObject* self, PyObject* args, PyObject* kwargs)
 #endif
 
 
+/* --------------------------------------------------------------------- */
+/* DBStream methods */
+
+
+#if (DBVER >= 62)
+static PyObject*
+DBStream_close_internal(DBStreamObject* self)
+{
+    int err = 0;
+
+    if (self->stream != NULL) {
+        EXTRACT_FROM_DOUBLE_LINKED_LIST(self);
+
+        MYDB_BEGIN_ALLOW_THREADS;
+        err = self->stream->close(self->stream, 0);
+        MYDB_END_ALLOW_THREADS;
+        self->stream = NULL;
+    }
+    RETURN_IF_ERR();
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+DBStream_close(DBStreamObject* self)
+{
+    return DBStream_close_internal(self);
+}
+
+static int
+_DBStream_size(DBStreamObject* self, db_off_t *size)
+{
+    int err;
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->stream->size(self->stream, size, 0);
+    MYDB_END_ALLOW_THREADS;
+    return makeDBError(err);
+}
+
+static PyObject*
+DBStream_size(DBStreamObject* self)
+{
+    db_off_t size;
+
+    CHECK_STREAM_NOT_CLOSED(self);
+    if (_DBStream_size(self, &size))
+        return NULL;
+    return PyLong_FromLongLong(size);
+}
+
+static PyObject*
+DBStream_read(DBStreamObject* self, PyObject* args, PyObject* kwargs)
+{
+    int err;
+    long long size = -1;
+    db_off_t total;
+    DBT data;
+    PyObject *result;
+    static char* kwnames[] = { "size", NULL };
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|L:read", kwnames,
+                                     &size))
+        return NULL;
+    CHECK_STREAM_NOT_CLOSED(self);
+
+    if (_DBStream_size(self, &total))
+        return NULL;
+    /* Like a file, read() stops at the end of the stream */
+    if ((size < 0) || (size > total - self->pos))
+        size = total > self->pos ? total - self->pos : 0;
+    if (size > 0xFFFFFFFFLL) {
+        PyErr_SetString(PyExc_OverflowError,
+                        "read() can't return more than 4 GB at once");
+        return NULL;
+    }
+    result = PyBytes_FromStringAndSize(NULL, (Py_ssize_t)size);
+    if ((result == NULL) || (size == 0))
+        return result;
+
+    CLEAR_DBT(data);
+    data.data = PyBytes_AS_STRING(result);
+    data.ulen = (u_int32_t)size;
+    data.flags = DB_DBT_USERMEM;
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->stream->read(self->stream, &data, self->pos,
+                             (u_int32_t)size, 0);
+    MYDB_END_ALLOW_THREADS;
+    if (makeDBError(err)) {
+        Py_DECREF(result);
+        return NULL;
+    }
+    self->pos += data.size;
+    if ((data.size != size) && _PyBytes_Resize(&result, data.size))
+        return NULL;
+    return result;
+}
+
+static PyObject*
+DBStream_write(DBStreamObject* self, PyObject* args, PyObject* kwargs)
+{
+    int err;
+    Py_buffer buffer;
+    DBT data;
+    static char* kwnames[] = { "data", NULL };
+
+    CHECK_STREAM_NOT_CLOSED(self);
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*:write", kwnames,
+                                     &buffer))
+        return NULL;
+    if (buffer.len > 0xFFFFFFFFLL) {
+        PyBuffer_Release(&buffer);
+        PyErr_SetString(PyExc_OverflowError,
+                        "write() can't write more than 4 GB at once");
+        return NULL;
+    }
+
+    CLEAR_DBT(data);
+    data.data = buffer.buf;
+    data.size = (u_int32_t)buffer.len;
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->stream->write(self->stream, &data, self->pos, 0);
+    MYDB_END_ALLOW_THREADS;
+    PyBuffer_Release(&buffer);
+    RETURN_IF_ERR();
+    self->pos += data.size;
+    return PyLong_FromSsize_t(buffer.len);
+}
+
+static PyObject*
+DBStream_seek(DBStreamObject* self, PyObject* args)
+{
+    long long offset;
+    int whence = 0;
+    db_off_t base = 0;
+
+    if (!PyArg_ParseTuple(args, "L|i:seek", &offset, &whence))
+        return NULL;
+    CHECK_STREAM_NOT_CLOSED(self);
+
+    switch (whence) {
+        case 0:     /* os.SEEK_SET */
+            break;
+        case 1:     /* os.SEEK_CUR */
+            base = self->pos;
+            break;
+        case 2:     /* os.SEEK_END */
+            if (_DBStream_size(self, &base))
+                return NULL;
+            break;
+        default:
+            PyErr_Format(PyExc_ValueError, "invalid whence (%d)", whence);
+            return NULL;
+    }
+    if (base + offset < 0) {
+        PyErr_SetString(PyExc_ValueError, "negative seek position");
+        return NULL;
+    }
+    self->pos = base + offset;
+    return PyLong_FromLongLong(self->pos);
+}
+
+static PyObject*
+DBStream_tell(DBStreamObject* self)
+{
+    CHECK_STREAM_NOT_CLOSED(self);
+    return PyLong_FromLongLong(self->pos);
+}
+#endif
+
+
 /* --------------------------------------------------------------------- */
 /* DBCursor methods */
 
@@ -4323,6 +6261,15 @@ DBC_close_internal(DBCursorObject* self)
     int err = 0;
 
     if (self->dbc != NULL) {
+#if (DBVER >= 62)
+        /* The streams can't outlive their cursor */
+        while (self->children_streams) {
+            PyObject *dummy;
+
+            dummy = DBStream_close_internal(self->children_streams);
+            Py_XDECREF(dummy);
+        }
+#endif
         EXTRACT_FROM_DOUBLE_LINKED_LIST(self);
         if (self->txn) {
             EXTRACT_FROM_DOUBLE_LINKED_LIST_TXN(self);
@@ -4383,9 +6330,9 @@ DBC_delete(DBCursorObject* self, PyObject* args)
 
     CHECK_CURSOR_NOT_CLOSED(self);
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self->mydb), self->mydb->myenvobj);
     err = _DBC_del(self->dbc, flags);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_CURSOR, "cursor.delete", self->mydb, -1);
     RETURN_IF_ERR();
 
     Py_RETURN_NONE;
@@ -4462,9 +6409,9 @@ DBC_get(DBCursorObject* self, PyObject* args, PyObject *kwargs)
         return NULL;
     }
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self->mydb), self->mydb->myenvobj);
     err = _DBC_get(self->dbc, &key, &data, flags);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_CURSOR, "cursor.get", self->mydb, key.size);
 
     if ((err == DB_NOTFOUND || err == DB_KEYEMPTY)
             && self->mydb->moduleFlags.getReturnsNone) {
@@ -4478,7 +6425,7 @@ DBC_get(DBCursorObject* self, PyObject* args, PyObject *kwargs)
         switch (self->mydb->dbtype) {
         case DB_BTREE:
         case DB_HASH:
-            retval = BuildValue_SS(key.data, key.size, data.data, data.size);
+            retval = _DB_build_key_data(self->mydb, &key, &data);
             break;
         case DB_RECNO:
         case DB_QUEUE:
@@ -4540,9 +6487,9 @@ DBC_pget(DBCursorObject* self, PyObject* args, PyObject *kwargs)
     CLEAR_DBT(pkey);
     pkey.flags = DB_DBT_MALLOC;
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self->mydb), self->mydb->myenvobj);
     err = _DBC_pget(self->dbc, &key, &pkey, &data, flags);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_CURSOR, "cursor.pget", self->mydb, key.size);
 
     if ((err == DB_NOTFOUND || err == DB_KEYEMPTY)
             && self->mydb->moduleFlags.getReturnsNone) {
@@ -4570,7 +6517,7 @@ DBC_pget(DBCursorObject* self, PyObject* args, PyObject *kwargs)
             if (dbtype == DB_RECNO || dbtype == DB_QUEUE)
                 keyObj = PyLong_FromLong(*(int *)key.data);
             else
-                keyObj = Build_PyString(key.data, key.size);
+                keyObj = _DB_build_key(self->mydb, key.data, key.size);
             retval = PyTuple_Pack(3, keyObj, pkeyObj, dataObj);
             Py_DECREF(keyObj);
             FREE_DBT(key);  /* 'make_key_dbt' could do a 'malloc' */
@@ -4605,9 +6552,9 @@ DBC_get_recno(DBCursorObject* self)
     CLEAR_DBT(key);
     CLEAR_DBT(data);
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self->mydb), self->mydb->myenvobj);
     err = _DBC_get(self->dbc, &key, &data, DB_GET_RECNO);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_CURSOR, "cursor.get_recno", self->mydb, -1);
     RETURN_IF_ERR();
 
     recno = *((db_recno_t*)data.data);
@@ -4662,9 +6609,9 @@ DBC_put(DBCursorObject* self, PyObject* args, PyObject* kwargs)
         return NULL;
     }
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self->mydb), self->mydb->myenvobj);
     err = _DBC_put(self->dbc, &key, &data, flags);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_CURSOR, "cursor.put", self->mydb, key.size);
     FREE_DBT(key);  /* 'make_key_dbt' could do a 'malloc' */
     RETURN_IF_ERR();
     Py_RETURN_NONE;
@@ -4696,9 +6643,9 @@ DBC_set(DBCursorObject* self, PyObject* args, PyObject *kwargs)
         return NULL;
     }
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self->mydb), self->mydb->myenvobj);
     err = _DBC_get(self->dbc, &key, &data, flags|DB_SET);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_CURSOR, "cursor.set", self->mydb, key.size);
     if ((err == DB_NOTFOUND || err == DB_KEYEMPTY)
             && self->mydb->moduleFlags.cursorSetReturnsNone) {
         Py_INCREF(Py_None);
@@ -4711,7 +6658,7 @@ DBC_set(DBCursorObject* self, PyObject* args, PyObject *kwargs)
         switch (self->mydb->dbtype) {
         case DB_BTREE:
         case DB_HASH:
-            retval = BuildValue_SS(key.data, key.size, data.data, data.size);
+            retval = _DB_build_key_data(self->mydb, &key, &data);
             break;
         case DB_RECNO:
         case DB_QUEUE:
@@ -4758,9 +6705,9 @@ DBC_set_range(DBCursorObject* self, PyObject* args, PyObject* kwargs)
         FREE_DBT(key);  /* 'make_key_dbt' could do a 'malloc' */
         return NULL;
     }
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self->mydb), self->mydb->myenvobj);
     err = _DBC_get(self->dbc, &key, &data, flags|DB_SET_RANGE);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_CURSOR, "cursor.set_range", self->mydb, key.size);
     if ((err == DB_NOTFOUND || err == DB_KEYEMPTY)
             && self->mydb->moduleFlags.cursorSetReturnsNone) {
         Py_INCREF(Py_None);
@@ -4773,7 +6720,7 @@ DBC_set_range(DBCursorObject* self, PyObject* args, PyObject* kwargs)
         switch (self->mydb->dbtype) {
         case DB_BTREE:
         case DB_HASH:
-            retval = BuildValue_SS(key.data, key.size, data.data, data.size);
+            retval = _DB_build_key_data(self->mydb, &key, &data);
             break;
         case DB_RECNO:
         case DB_QUEUE:
@@ -4811,9 +6758,9 @@ _DBC_get_set_both(DBCursorObject* self, PyObject* keyobj, PyObject* dataobj,
         return NULL;
     }
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self->mydb), self->mydb->myenvobj);
     err = _DBC_get(self->dbc, &key, &data, flags|DB_GET_BOTH);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_CURSOR, "cursor.get_both", self->mydb, key.size);
     if ((err == DB_NOTFOUND || err == DB_KEYEMPTY) && returnsNone) {
         Py_INCREF(Py_None);
         retval = Py_None;
@@ -4825,7 +6772,7 @@ _DBC_get_set_both(DBCursorObject* self, PyObject* keyobj, PyObject* dataobj,
         switch (self->mydb->dbtype) {
         case DB_BTREE:
         case DB_HASH:
-            retval = BuildValue_SS(key.data, key.size, data.data, data.size);
+            retval = _DB_build_key_data(self->mydb, &key, &data);
             break;
         case DB_RECNO:
         case DB_QUEUE:
@@ -4874,9 +6821,10 @@ DBC_get_current_size(DBCursorObject* self)
        getting the record size. */
     data.flags = DB_DBT_USERMEM;
     data.ulen = 0;
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self->mydb), self->mydb->myenvobj);
     err = _DBC_get(self->dbc, &key, &data, flags);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_CURSOR, "cursor.get_current_size", self->mydb,
+                   key.size);
     if (err == DB_BUFFER_SMALL || !err) {
         /* DB_BUFFER_SMALL means positive size, !err means zero length value */
         retval = PyLong_FromLong((long)data.size);
@@ -4884,8 +6832,31 @@ DBC_get_current_size(DBCursorObject* self)
     }
 
     RETURN_IF_ERR();
-    return retval;
+    return retval;
+}
+
+#if (DBVER >= 62)
+static PyObject*
+DBC_db_stream(DBCursorObject* self, PyObject* args, PyObject* kwargs)
+{
+    int err;
+    u_int32_t flags = DB_STREAM_READ;
+    DB_STREAM *stream;
+    static char* kwnames[] = { "flags", NULL };
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|I:db_stream", kwnames,
+                                     &flags))
+        return NULL;
+    CHECK_CURSOR_NOT_CLOSED(self);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->dbc->db_stream(self->dbc, &stream, flags);
+    MYDB_END_ALLOW_THREADS;
+    RETURN_IF_ERR();
+
+    return (PyObject *)newDBStreamObject(stream, self);
 }
+#endif
 
 static PyObject*
 DBC_set_both(DBCursorObject* self, PyObject* args)
@@ -4941,9 +6912,9 @@ DBC_set_recno(DBCursorObject* self, PyObject* args, PyObject *kwargs)
         return NULL;
     }
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self->mydb), self->mydb->myenvobj);
     err = _DBC_get(self->dbc, &key, &data, flags|DB_SET_RECNO);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_CURSOR, "cursor.set_recno", self->mydb, key.size);
     if ((err == DB_NOTFOUND || err == DB_KEYEMPTY)
             && self->mydb->moduleFlags.cursorSetReturnsNone) {
         Py_INCREF(Py_None);
@@ -4952,8 +6923,8 @@ DBC_set_recno(DBCursorObject* self, PyObject* args, PyObject *kwargs)
     else if (makeDBError(err)) {
         retval = NULL;
     }
-    else {  /* Can only be used for BTrees, so no need to return int key */
-        retval = BuildValue_SS(key.data, key.size, data.data, data.size);
+    else {  /* Can only be used for BTrees */
+        retval = _DB_build_key_data(self->mydb, &key, &data);
     }
     FREE_DBT(key);
 
@@ -5009,9 +6980,9 @@ DBC_join_item(DBCursorObject* self, PyObject* args)
     CLEAR_DBT(key);
     CLEAR_DBT(data);
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    MYDB_BEGIN_TIMED(DB_LATENCY(self->mydb), self->mydb->myenvobj);
     err = _DBC_get(self->dbc, &key, &data, flags | DB_JOIN_ITEM);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_CURSOR, "cursor.join_item", self->mydb, key.size);
     if ((err == DB_NOTFOUND || err == DB_KEYEMPTY)
             && self->mydb->moduleFlags.getReturnsNone) {
         Py_INCREF(Py_None);
@@ -5021,7 +6992,7 @@ DBC_join_item(DBCursorObject* self, PyObject* args)
         retval = NULL;
     }
     else {
-        retval = BuildValue_S(key.data, key.size);
+        retval = _DB_build_key(self->mydb, key.data, key.size);
     }
 
     return retval;
@@ -5076,6 +7047,7 @@ DBEnv_close_internal(DBEnvObject* self, int flags, int do_not_close)
     int err = 0;
 
     if (!self->closed) {      /* Don't close more than once */
+        _slow_op_stop(self);
         while(self->children_txns) {
             dummy = DBTxn_abort_discard_internal(self->children_txns, 0);
             Py_XDECREF(dummy);
@@ -5174,10 +7146,11 @@ DBEnv_memp_stat(DBEnvObject* self, PyObject* args, PyObject *kwargs)
     DB_MPOOL_FSTAT **fsp, **fsp2;
     PyObject* d = NULL, *d2, *d3, *r;
     u_int32_t flags = 0;
-    static char* kwnames[] = { "flags", NULL };
+    int snapshot = 0;
+    static char* kwnames[] = { "flags", "snapshot", NULL };
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|i:memp_stat",
-                kwnames, &flags))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|ii:memp_stat",
+                kwnames, &flags, &snapshot))
         return NULL;
 
     CHECK_ENV_NOT_CLOSED(self);
@@ -5188,7 +7161,7 @@ DBEnv_memp_stat(DBEnvObject* self, PyObject* args, PyObject *kwargs)
     RETURN_IF_ERR();
 
     /* Turn the stat structure into a dictionary */
-    d = PyDict_New();
+    d = _newStatDict(STAT_MPOOL, snapshot);
     if (d == NULL) {
         if (gsp)
             free(gsp);
@@ -5241,6 +7214,11 @@ DBEnv_memp_stat(DBEnvObject* self, PyObject* args, PyObject *kwargs)
 
 #undef MAKE_ENTRY
     free(gsp);
+    if ((d = _finishStatDict(STAT_MPOOL, snapshot, d)) == NULL) {
+        if (fsp)
+            free(fsp);
+        return NULL;
+    }
 
     d2 = PyDict_New();
     if (d2 == NULL) {
@@ -5251,7 +7229,7 @@ DBEnv_memp_stat(DBEnvObject* self, PyObject* args, PyObject *kwargs)
     }
 #define MAKE_ENTRY(name)  _addIntToDict(d3, #name, (*fsp2)->st_##name)
     for(fsp2=fsp;*fsp2; fsp2++) {
-        d3 = PyDict_New();
+        d3 = _newStatDict(STAT_MPOOL_FILE, snapshot);
         if (d3 == NULL) {
             Py_DECREF(d);
             Py_DECREF(d2);
@@ -5266,6 +7244,13 @@ DBEnv_memp_stat(DBEnvObject* self, PyObject* args, PyObject *kwargs)
         MAKE_ENTRY(page_create);
         MAKE_ENTRY(page_in);
         MAKE_ENTRY(page_out);
+        if ((d3 = _finishStatDict(STAT_MPOOL_FILE, snapshot, d3)) == NULL) {
+            Py_DECREF(d);
+            Py_DECREF(d2);
+            if (fsp)
+                free(fsp);
+            return NULL;
+        }
         if(PyDict_SetItemString(d2, (*fsp2)->file_name, d3)) {
             Py_DECREF(d);
             Py_DECREF(d2);
@@ -5928,6 +7913,78 @@ DBEnv_get_data_dirs(DBEnvObject* self)
     return tuple;
 }
 
+#if (DBVER >= 62)
+static PyObject*
+DBEnv_set_ext_file_threshold(DBEnvObject* self, PyObject* args)
+{
+    int err;
+    unsigned int bytes, flags = 0;
+
+    if (!PyArg_ParseTuple(args, "I|I:set_ext_file_threshold", &bytes, &flags))
+        return NULL;
+    CHECK_ENV_NOT_CLOSED(self);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->db_env->set_ext_file_threshold(self->db_env, bytes, flags);
+    MYDB_END_ALLOW_THREADS;
+    RETURN_IF_ERR();
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+DBEnv_get_ext_file_threshold(DBEnvObject* self)
+{
+    int err;
+    u_int32_t bytes;
+
+    CHECK_ENV_NOT_CLOSED(self);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->db_env->get_ext_file_threshold(self->db_env, &bytes);
+    MYDB_END_ALLOW_THREADS;
+    RETURN_IF_ERR();
+    return PyLong_FromUnsignedLong(bytes);
+}
+
+static PyObject*
+DBEnv_set_ext_file_dir(DBEnvObject* self, PyObject* args)
+{
+    int err;
+    PyObject *dirObj;
+    char *dir;
+
+    if (!PyArg_ParseTuple(args, "O&:set_ext_file_dir",
+                          PyUnicode_FSConverter, &dirObj))
+        return NULL;
+    CHECK_ENV_NOT_CLOSED(self);
+    dir = PyBytes_AS_STRING(dirObj);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->db_env->set_ext_file_dir(self->db_env, dir);
+    MYDB_END_ALLOW_THREADS;
+    Py_DECREF(dirObj);
+    RETURN_IF_ERR();
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+DBEnv_get_ext_file_dir(DBEnvObject* self)
+{
+    int err;
+    const char *dir = NULL;
+
+    CHECK_ENV_NOT_CLOSED(self);
+
+    MYDB_BEGIN_ALLOW_THREADS;
+    err = self->db_env->get_ext_file_dir(self->db_env, &dir);
+    MYDB_END_ALLOW_THREADS;
+    RETURN_IF_ERR();
+    if (dir == NULL)
+        Py_RETURN_NONE;
+    return PyUnicode_DecodeFSDefault(dir);
+}
+#endif
+
 static PyObject*
 DBEnv_set_lg_filemode(DBEnvObject* self, PyObject* args)
 {
@@ -6664,14 +8721,17 @@ DBEnv_stat_print(DBEnvObject* self, PyObject* args, PyObject *kwargs)
 
 
 static PyObject*
-DBEnv_log_stat(DBEnvObject* self, PyObject* args)
+DBEnv_log_stat(DBEnvObject* self, PyObject* args, PyObject *kwargs)
 {
     int err;
     DB_LOG_STAT* statp = NULL;
     PyObject* d = NULL;
     u_int32_t flags = 0;
+    int snapshot = 0;
+    static char* kwnames[] = { "flags", "snapshot", NULL };
 
-    if (!PyArg_ParseTuple(args, "|i:log_stat", &flags))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|ii:log_stat",
+                kwnames, &flags, &snapshot))
         return NULL;
     CHECK_ENV_NOT_CLOSED(self);
 
@@ -6681,7 +8741,7 @@ DBEnv_log_stat(DBEnvObject* self, PyObject* args)
     RETURN_IF_ERR();
 
     /* Turn the stat structure into a dictionary */
-    d = PyDict_New();
+    d = _newStatDict(STAT_LOG, snapshot);
     if (d == NULL) {
         if (statp)
             free(statp);
@@ -6716,7 +8776,7 @@ DBEnv_log_stat(DBEnvObject* self, PyObject* args)
 
 #undef MAKE_ENTRY
     free(statp);
-    return d;
+    return _finishStatDict(STAT_LOG, snapshot, d);
 } /* DBEnv_log_stat */
 
 
@@ -6742,14 +8802,17 @@ DBEnv_log_stat_print(DBEnvObject* self, PyObject* args, PyObject *kwargs)
 
 
 static PyObject*
-DBEnv_lock_stat(DBEnvObject* self, PyObject* args)
+DBEnv_lock_stat(DBEnvObject* self, PyObject* args, PyObject *kwargs)
 {
     int err;
     DB_LOCK_STAT* sp;
     PyObject* d = NULL;
     u_int32_t flags = 0;
+    int snapshot = 0;
+    static char* kwnames[] = { "flags", "snapshot", NULL };
 
-    if (!PyArg_ParseTuple(args, "|i:lock_stat", &flags))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|ii:lock_stat",
+                kwnames, &flags, &snapshot))
         return NULL;
     CHECK_ENV_NOT_CLOSED(self);
 
@@ -6759,7 +8822,7 @@ DBEnv_lock_stat(DBEnvObject* self, PyObject* args)
     RETURN_IF_ERR();
 
     /* Turn the stat structure into a dictionary */
-    d = PyDict_New();
+    d = _newStatDict(STAT_LOCK, snapshot);
     if (d == NULL) {
         free(sp);
         return NULL;
@@ -6794,8 +8857,6 @@ DBEnv_lock_stat(DBEnvObject* self, PyObject* args)
     MAKE_ENTRY(objs_nowait);
     MAKE_ENTRY(lockers_wait);
     MAKE_ENTRY(lockers_nowait);
-    MAKE_ENTRY(lock_wait);
-    MAKE_ENTRY(lock_nowait);
     MAKE_ENTRY(hash_len);
     MAKE_ENTRY(regsize);
     MAKE_ENTRY(region_wait);
@@ -6803,7 +8864,7 @@ DBEnv_lock_stat(DBEnvObject* self, PyObject* args)
 
 #undef MAKE_ENTRY
     free(sp);
-    return d;
+    return _finishStatDict(STAT_LOCK, snapshot, d);
 }
 
 static PyObject*
@@ -7149,14 +9210,17 @@ DBEnv_repmgr_site_by_eid(DBEnvObject* self, PyObject* args, PyObject *kwargs)
 
 
 static PyObject*
-DBEnv_mutex_stat(DBEnvObject* self, PyObject* args)
+DBEnv_mutex_stat(DBEnvObject* self, PyObject* args, PyObject *kwargs)
 {
     int err;
     DB_MUTEX_STAT* statp = NULL;
     PyObject* d = NULL;
     u_int32_t flags = 0;
+    int snapshot = 0;
+    static char* kwnames[] = { "flags", "snapshot", NULL };
 
-    if (!PyArg_ParseTuple(args, "|i:mutex_stat", &flags))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|ii:mutex_stat",
+                kwnames, &flags, &snapshot))
         return NULL;
     CHECK_ENV_NOT_CLOSED(self);
 
@@ -7166,7 +9230,7 @@ DBEnv_mutex_stat(DBEnvObject* self, PyObject* args)
     RETURN_IF_ERR();
 
     /* Turn the stat structure into a dictionary */
-    d = PyDict_New();
+    d = _newStatDict(STAT_MUTEX, snapshot);
     if (d == NULL) {
         if (statp)
             free(statp);
@@ -7187,7 +9251,7 @@ DBEnv_mutex_stat(DBEnvObject* self, PyObject* args)
 
 #undef MAKE_ENTRY
     free(statp);
-    return d;
+    return _finishStatDict(STAT_MUTEX, snapshot, d);
 }
 
 
@@ -7236,14 +9300,17 @@ DBEnv_txn_stat_print(DBEnvObject* self, PyObject* args, PyObject *kwargs)
 
 
 static PyObject*
-DBEnv_txn_stat(DBEnvObject* self, PyObject* args)
+DBEnv_txn_stat(DBEnvObject* self, PyObject* args, PyObject *kwargs)
 {
     int err;
     DB_TXN_STAT* sp;
     PyObject* d = NULL;
-    u_int32_t flags=0;
+    u_int32_t flags = 0;
+    int snapshot = 0;
+    static char* kwnames[] = { "flags", "snapshot", NULL };
 
-    if (!PyArg_ParseTuple(args, "|i:txn_stat", &flags))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|ii:txn_stat",
+                kwnames, &flags, &snapshot))
         return NULL;
     CHECK_ENV_NOT_CLOSED(self);
 
@@ -7253,7 +9320,7 @@ DBEnv_txn_stat(DBEnvObject* self, PyObject* args)
     RETURN_IF_ERR();
 
     /* Turn the stat structure into a dictionary */
-    d = PyDict_New();
+    d = _newStatDict(STAT_TXN, snapshot);
     if (d == NULL) {
         free(sp);
         return NULL;
@@ -7283,7 +9350,7 @@ DBEnv_txn_stat(DBEnvObject* self, PyObject* args)
 #undef MAKE_ENTRY
 #undef MAKE_TIME_T_ENTRY
     free(sp);
-    return d;
+    return _finishStatDict(STAT_TXN, snapshot, d);
 }
 
 
@@ -7324,6 +9391,61 @@ DBEnv_set_private(DBEnvObject* self, PyObject* private_obj)
     Py_RETURN_NONE;
 }
 
+static PyObject*
+DBEnv_set_latency_stats(DBEnvObject* self, PyObject* args)
+{
+    return _set_latency_stats(&self->latency_enabled, &self->latency, args);
+}
+
+static PyObject*
+DBEnv_get_latency_stats(DBEnvObject* self, PyObject* args, PyObject* kwargs)
+{
+    return _get_latency_stats(self->latency, DBLAT_COMMIT, DBLAT_NUM_OPS,
+                              args, kwargs);
+}
+
+static PyObject*
+DBEnv_set_slow_op_hook(DBEnvObject* self, PyObject* args)
+{
+    long threshold;
+    PyObject *callback, *module, *dispatcher = NULL, *put = NULL;
+
+    if (!PyArg_ParseTuple(args, "lO:set_slow_op_hook", &threshold, &callback))
+        return NULL;
+    if (threshold < 0) {
+        PyErr_SetString(PyExc_ValueError, "threshold_us must be >= 0");
+        return NULL;
+    }
+
+    if (callback != Py_None) {
+        if (!PyCallable_Check(callback)) {
+            makeTypeError("Callable", callback);
+            return NULL;
+        }
+        /* The callback runs in the thread of a dispatcher, written in
+           Python.  Slow calls are queued with its put() method. */
+        module = PyImport_ImportModule("berkeleydb.dbutils");
+        if (module == NULL)
+            return NULL;
+        dispatcher = PyObject_CallMethod(module, "SlowOpDispatcher", "OO",
+                                         callback, self);
+        Py_DECREF(module);
+        if (dispatcher == NULL)
+            return NULL;
+        put = PyObject_GetAttrString(dispatcher, "put");
+        if (put == NULL) {
+            Py_DECREF(dispatcher);
+            return NULL;
+        }
+    }
+
+    _slow_op_stop(self);
+    self->slow_op_threshold_ns = (unsigned long long)threshold * 1000;
+    self->slow_op_dispatcher = dispatcher;
+    self->slow_op_put = put;
+    Py_RETURN_NONE;
+}
+
 static PyObject*
 DBEnv_set_intermediate_dir_mode(DBEnvObject* self, PyObject* args)
 {
@@ -8331,11 +10453,21 @@ static void _promote_transaction_dbs_and_sequences(DBTxnObject *txn)
 }
 
 
+/* Nested transactions only know their parent */
+static DBEnvObject*
+_DBTxn_env(DBTxnObject* self)
+{
+    while ((self->env == NULL) && (self->parent_txn != NULL))
+        self = self->parent_txn;
+    return self->env;
+}
+
 static PyObject*
 DBTxn_commit(DBTxnObject* self, PyObject* args)
 {
     int flags=0, err;
     DB_TXN *txn;
+    DBEnvObject *env;
 
     if (!PyArg_ParseTuple(args, "|i:commit", &flags))
         return NULL;
@@ -8358,9 +10490,10 @@ DBTxn_commit(DBTxnObject* self, PyObject* args)
 
     EXTRACT_FROM_DOUBLE_LINKED_LIST(self);
 
-    MYDB_BEGIN_ALLOW_THREADS;
+    env = _DBTxn_env(self);
+    MYDB_BEGIN_TIMED(DB_LATENCY(env), env);
     err = txn->commit(txn, flags);
-    MYDB_END_ALLOW_THREADS;
+    MYDB_END_TIMED(DBLAT_COMMIT, "commit", NULL, -1);
 
     _promote_transaction_dbs_and_sequences(self);
 
@@ -8961,8 +11094,309 @@ DBSequence_stat(DBSequenceObject* self, PyObject* args, PyObject* kwargs)
 #undef MAKE_UNSIGNED_INT_ENTRY
 #undef MAKE_LONG_LONG_ENTRY
 
-    free(sp);
-    return dict_stat;
+    free(sp);
+    return dict_stat;
+}
+
+
+/* --------------------------------------------------------------------- */
+/* WriteBatch methods */
+
+static int
+_DBWriteBatch_check_not_applying(DBWriteBatchObject* self)
+{
+    if (self->applying) {
+        PyObject *t = Py_BuildValue("(is)", 0,
+                                    "WriteBatch is being applied");
+        if (t) {
+            PyErr_SetObject(DBError, t);
+            Py_DECREF(t);
+        }
+        return 0;
+    }
+    return 1;
+}
+
+/* Reserves a new operation at the end of the batch.  The caller fills
+   its key and data, then counts it in self->size, or drops it. */
+static DBWriteBatchOp*
+_DBWriteBatch_new_op(DBWriteBatchObject* self, PyObject* dbobj, int op,
+                     int flags)
+{
+    DBWriteBatchOp *ops;
+    Py_ssize_t allocated;
+
+    if (!_DBWriteBatch_check_not_applying(self))
+        return NULL;
+    if (!DBObject_CheckExact(dbobj)) {
+        makeTypeError("DB", dbobj);
+        return NULL;
+    }
+    CHECK_DB_NOT_CLOSED(((DBObject *)dbobj));
+
+    if (self->size == self->allocated) {
+        allocated = self->allocated ? self->allocated * 2 : 16;
+        ops = realloc(self->ops, allocated * sizeof(DBWriteBatchOp));
+        if (ops == NULL) {
+            PyErr_NoMemory();
+            return NULL;
+        }
+        self->ops = ops;
+        self->allocated = allocated;
+    }
+
+    ops = &self->ops[self->size];
+    memset(ops, 0, sizeof(DBWriteBatchOp));
+    Py_INCREF(dbobj);
+    ops->db = (DBObject *)dbobj;
+    ops->op = op;
+    ops->flags = flags;
+    return ops;
+}
+
+/* Like make_dbt(), but the DBT gets its own copy of the data */
+static int
+_DBWriteBatch_copy_dbt(PyObject* obj, DBT* dbt)
+{
+    DBT tmp;
+
+    if (!make_dbt(obj, &tmp))
+        return 0;
+    CLEAR_DBT(*dbt);
+    dbt->data = malloc(tmp.size ? tmp.size : 1);
+    if (dbt->data == NULL) {
+        PyErr_NoMemory();
+        return 0;
+    }
+    if (tmp.size)
+        memcpy(dbt->data, tmp.data, tmp.size);
+    dbt->size = tmp.size;
+    return 1;
+}
+
+static PyObject*
+DBWriteBatch_put(DBWriteBatchObject* self, PyObject* args, PyObject* kwargs)
+{
+    PyObject *dbobj, *keyobj, *dataobj;
+    int flags = 0;
+    DBWriteBatchOp *op;
+    static char* kwnames[] = { "db", "key", "data", "flags", NULL };
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOO|i:put", kwnames,
+                                     &dbobj, &keyobj, &dataobj, &flags))
+        return NULL;
+    if (flags & DB_APPEND) {
+        PyErr_SetString(PyExc_ValueError,
+                        "Use WriteBatch.append() to append records");
+        return NULL;
+    }
+
+    if ((op = _DBWriteBatch_new_op(self, dbobj, DBWB_PUT, flags)) == NULL)
+        return NULL;
+    if (!make_key_dbt(op->db, keyobj, &op->key, NULL) ||
+        !_DBWriteBatch_copy_dbt(dataobj, &op->data)) {
+        _DBWriteBatch_drop_op(op);
+        return NULL;
+    }
+    self->size++;
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+DBWriteBatch_delete(DBWriteBatchObject* self, PyObject* args,
+                    PyObject* kwargs)
+{
+    PyObject *dbobj, *keyobj;
+    DBWriteBatchOp *op;
+    static char* kwnames[] = { "db", "key", NULL };
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO:delete", kwnames,
+                                     &dbobj, &keyobj))
+        return NULL;
+
+    if ((op = _DBWriteBatch_new_op(self, dbobj, DBWB_DELETE, 0)) == NULL)
+        return NULL;
+    if (!make_key_dbt(op->db, keyobj, &op->key, NULL)) {
+        _DBWriteBatch_drop_op(op);
+        return NULL;
+    }
+    self->size++;
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+DBWriteBatch_append(DBWriteBatchObject* self, PyObject* args,
+                    PyObject* kwargs)
+{
+    PyObject *dbobj, *dataobj;
+    DBWriteBatchOp *op;
+    u_int32_t size = sizeof(db_recno_t);
+    static char* kwnames[] = { "db", "data", NULL };
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO:append", kwnames,
+                                     &dbobj, &dataobj))
+        return NULL;
+
+    if ((op = _DBWriteBatch_new_op(self, dbobj, DBWB_APPEND, 0)) == NULL)
+        return NULL;
+#if (DBVER >= 53)
+    if (op->db->dbtype == DB_HEAP)
+        size = DB_HEAP_RID_SZ;
+#endif
+    /* Room for the record number (or heap RID) assigned by the append */
+    if ((op->key.data = calloc(1, size)) == NULL) {
+        PyErr_NoMemory();
+        _DBWriteBatch_drop_op(op);
+        return NULL;
+    }
+    op->key.size = op->key.ulen = size;
+    op->key.flags = DB_DBT_USERMEM;
+    if (!_DBWriteBatch_copy_dbt(dataobj, &op->data)) {
+        _DBWriteBatch_drop_op(op);
+        return NULL;
+    }
+    self->size++;
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+DBWriteBatch_clear(DBWriteBatchObject* self)
+{
+    if (!_DBWriteBatch_check_not_applying(self))
+        return NULL;
+    _DBWriteBatch_clear(self);
+    Py_RETURN_NONE;
+}
+
+/* Sort order used by apply(sort=True): operations are grouped by
+   database, then ordered by key bytes.  Operations with the same key
+   keep their relative order, and so do all the operations on Recno,
+   Queue and Heap databases, where the order can change the outcome. */
+static int
+_DBWriteBatch_cmp_ops(const void *a, const void *b)
+{
+    const DBWriteBatchOp *x = *(DBWriteBatchOp * const *)a;
+    const DBWriteBatchOp *y = *(DBWriteBatchOp * const *)b;
+    u_int32_t size;
+    int r;
+
+    if (x->db != y->db)
+        return ((uintptr_t)x->db < (uintptr_t)y->db) ? -1 : 1;
+    if ((x->db->dbtype == DB_BTREE) || (x->db->dbtype == DB_HASH)) {
+        size = (x->key.size < y->key.size) ? x->key.size : y->key.size;
+        if (size && (r = memcmp(x->key.data, y->key.data, size)))
+            return r;
+        if (x->key.size != y->key.size)
+            return (x->key.size < y->key.size) ? -1 : 1;
+    }
+    /* The ops array is contiguous: this is the insertion order */
+    return (x < y) ? -1 : (x > y);
+}
+
+static PyObject*
+DBWriteBatch_apply(DBWriteBatchObject* self, PyObject* args,
+                   PyObject* kwargs)
+{
+    int err = 0;
+    int sort = 0;
+    PyObject* txnobj = NULL;
+    PyObject* retval = NULL;
+    PyObject* status;
+    DB_TXN *txn = NULL;
+    DBWriteBatchOp **order = NULL;
+    DBWriteBatchOp *op;
+    DB *db;
+    int *errs = NULL;
+    Py_ssize_t i, done;
+    static char* kwnames[] = { "txn", "sort", NULL };
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|Oi:apply", kwnames,
+                                     &txnobj, &sort))
+        return NULL;
+    if (!checkTxnObj(txnobj, &txn) ||
+        !_DBWriteBatch_check_not_applying(self))
+        return NULL;
+    for (i = 0; i < self->size; i++) {
+        CHECK_DB_NOT_CLOSED(self->ops[i].db);
+    }
+
+    order = malloc((self->size + 1) * sizeof(DBWriteBatchOp *));
+    errs = malloc((self->size + 1) * sizeof(int));
+    if ((order == NULL) || (errs == NULL)) {
+        PyErr_NoMemory();
+        goto exit;
+    }
+    for (i = 0; i < self->size; i++) {
+        order[i] = &self->ops[i];
+        errs[i] = 0;
+    }
+
+    /* All the operations run without the GIL, in a single go */
+    self->applying = 1;
+    MYDB_BEGIN_ALLOW_THREADS;
+    if (sort)
+        qsort(order, self->size, sizeof(DBWriteBatchOp *),
+              _DBWriteBatch_cmp_ops);
+    for (done = 0; done < self->size; done++) {
+        op = order[done];
+        db = op->db->db;
+        switch (op->op) {
+            case DBWB_PUT:
+                err = db->put(db, txn, &op->key, &op->data, op->flags);
+                break;
+            case DBWB_DELETE:
+                err = db->del(db, txn, &op->key, op->flags);
+                break;
+            default:  /* DBWB_APPEND */
+                err = db->put(db, txn, &op->key, &op->data, DB_APPEND);
+                break;
+        }
+        errs[op - self->ops] = err;
+        /* Missing or existing keys are reported, anything else aborts */
+        if (err && (err != DB_NOTFOUND) && (err != DB_KEYEMPTY) &&
+            (err != DB_KEYEXIST))
+            break;
+    }
+    MYDB_END_ALLOW_THREADS;
+    self->applying = 0;
+
+    if (done < self->size) {
+        makeDBError(err);
+        goto exit;
+    }
+
+    if ((retval = PyList_New(self->size)) == NULL)
+        goto exit;
+    for (i = 0; i < self->size; i++) {
+        op = &self->ops[i];
+        if (errs[i] || (op->op != DBWB_APPEND)) {
+            status = PyLong_FromLong(errs[i]);
+        }
+#if (DBVER >= 53)
+        else if (op->db->dbtype == DB_HEAP) {
+            status = PyBytes_FromStringAndSize(op->key.data, op->key.size);
+        }
+#endif
+        else {
+            status = PyLong_FromLong(*((db_recno_t*)op->key.data));
+        }
+        if (status == NULL) {
+            Py_CLEAR(retval);
+            goto exit;
+        }
+        PyList_SET_ITEM(retval, i, status);
+    }
+
+exit:
+    free(order);
+    free(errs);
+    return retval;
+}
+
+static Py_ssize_t
+DBWriteBatch_length(PyObject* _self)
+{
+    return ((DBWriteBatchObject*)_self)->size;
 }
 
 
@@ -8985,6 +11419,10 @@ static PyMethodDef DB_methods[] = {
     {"pget",            (PyCFunction)DB_pget,           METH_VARARGS|METH_KEYWORDS},
     {"get_both",        (PyCFunction)DB_get_both,       METH_VARARGS|METH_KEYWORDS},
     {"get_byteswapped", (PyCFunction)DB_get_byteswapped,METH_NOARGS},
+    {"get_into",        (PyCFunction)DB_get_into,
+        METH_VARARGS|METH_KEYWORDS},
+    {"get_stream",      (PyCFunction)DB_get_stream,
+        METH_VARARGS|METH_KEYWORDS},
     {"get_size",        (PyCFunction)DB_get_size,       METH_VARARGS|METH_KEYWORDS},
     {"get_type",        (PyCFunction)DB_get_type,       METH_NOARGS},
     {"join",            (PyCFunction)DB_join,           METH_VARARGS},
@@ -8993,6 +11431,8 @@ static PyMethodDef DB_methods[] = {
     {"items",           (PyCFunction)DB_items,          METH_VARARGS},
     {"keys",            (PyCFunction)DB_keys,           METH_VARARGS},
     {"open",            (PyCFunction)DB_open,           METH_VARARGS|METH_KEYWORDS},
+    {"put_stream",      (PyCFunction)DB_put_stream,
+        METH_VARARGS|METH_KEYWORDS},
     {"put",             (PyCFunction)DB_put,            METH_VARARGS|METH_KEYWORDS},
     {"remove",          (PyCFunction)DB_remove,         METH_VARARGS|METH_KEYWORDS},
     {"rename",          (PyCFunction)DB_rename,         METH_VARARGS},
@@ -9002,11 +11442,16 @@ static PyMethodDef DB_methods[] = {
     {"set_cachesize",   (PyCFunction)DB_set_cachesize,  METH_VARARGS},
     {"get_cachesize",   (PyCFunction)DB_get_cachesize,  METH_NOARGS},
     {"set_dup_compare", (PyCFunction)DB_set_dup_compare, METH_O},
+    {"set_bt_prefix",   (PyCFunction)DB_set_bt_prefix,  METH_O},
+    {"set_bt_compress", (PyCFunction)DB_set_bt_compress,
+        METH_VARARGS|METH_KEYWORDS},
     {"set_encrypt",     (PyCFunction)DB_set_encrypt,    METH_VARARGS|METH_KEYWORDS},
     {"get_encrypt_flags", (PyCFunction)DB_get_encrypt_flags, METH_NOARGS},
     {"set_flags",       (PyCFunction)DB_set_flags,      METH_VARARGS},
     {"get_flags",       (PyCFunction)DB_get_flags,      METH_NOARGS},
     {"get_transactional", (PyCFunction)DB_get_transactional, METH_NOARGS},
+    {"set_h_hash",      (PyCFunction)DB_set_h_hash,     METH_O},
+    {"get_h_hash",      (PyCFunction)DB_get_h_hash,     METH_NOARGS},
     {"set_h_ffactor",   (PyCFunction)DB_set_h_ffactor,  METH_VARARGS},
     {"get_h_ffactor",   (PyCFunction)DB_get_h_ffactor,  METH_NOARGS},
     {"set_h_nelem",     (PyCFunction)DB_set_h_nelem,    METH_VARARGS},
@@ -9022,11 +11467,27 @@ static PyMethodDef DB_methods[] = {
     {"set_re_pad",      (PyCFunction)DB_set_re_pad,     METH_VARARGS},
     {"get_re_pad",      (PyCFunction)DB_get_re_pad,     METH_NOARGS},
     {"set_re_source",   (PyCFunction)DB_set_re_source,  METH_VARARGS},
+    {"set_partition",   (PyCFunction)DB_set_partition,
+        METH_VARARGS|METH_KEYWORDS},
+    {"get_partition",   (PyCFunction)DB_get_partition,  METH_NOARGS},
+    {"set_partition_dirs", (PyCFunction)DB_set_partition_dirs, METH_O},
+    {"get_partition_dirs", (PyCFunction)DB_get_partition_dirs, METH_NOARGS},
+#if (DBVER >= 62)
+    {"set_ext_file_threshold", (PyCFunction)DB_set_ext_file_threshold,
+        METH_VARARGS},
+    {"get_ext_file_threshold", (PyCFunction)DB_get_ext_file_threshold,
+        METH_NOARGS},
+    {"set_ext_file_dir", (PyCFunction)DB_set_ext_file_dir, METH_VARARGS},
+    {"get_ext_file_dir", (PyCFunction)DB_get_ext_file_dir, METH_NOARGS},
+#endif
     {"get_re_source",   (PyCFunction)DB_get_re_source,  METH_NOARGS},
     {"set_q_extentsize",(PyCFunction)DB_set_q_extentsize, METH_VARARGS},
     {"get_q_extentsize",(PyCFunction)DB_get_q_extentsize, METH_NOARGS},
     {"set_private",     (PyCFunction)DB_set_private,    METH_O},
     {"get_private",     (PyCFunction)DB_get_private,    METH_NOARGS},
+    {"set_latency_stats", (PyCFunction)DB_set_latency_stats, METH_VARARGS},
+    {"get_latency_stats", (PyCFunction)DB_get_latency_stats,
+        METH_VARARGS|METH_KEYWORDS},
     {"set_priority",    (PyCFunction)DB_set_priority,   METH_VARARGS},
     {"get_priority",    (PyCFunction)DB_get_priority,   METH_NOARGS},
     {"get_dbname",      (PyCFunction)DB_get_dbname,     METH_NOARGS},
@@ -9048,6 +11509,8 @@ static PyMethodDef DB_methods[] = {
     {"values",          (PyCFunction)DB_values,         METH_VARARGS},
     {"verify",          (PyCFunction)DB_verify,         METH_VARARGS|METH_KEYWORDS},
     {"set_get_returns_none",(PyCFunction)DB_set_get_returns_none,      METH_VARARGS},
+    {"set_key_type",    (PyCFunction)DB_set_key_type,   METH_O},
+    {"get_key_type",    (PyCFunction)DB_get_key_type,   METH_NOARGS},
     {NULL,      NULL}       /* sentinel */
 };
 
@@ -9070,6 +11533,10 @@ static PyMethodDef DBCursor_methods[] = {
     {"set_range",       (PyCFunction)DBC_set_range,     METH_VARARGS|METH_KEYWORDS},
     {"get_both",        (PyCFunction)DBC_get_both,      METH_VARARGS},
     {"get_current_size",(PyCFunction)DBC_get_current_size, METH_NOARGS},
+#if (DBVER >= 62)
+    {"db_stream",       (PyCFunction)DBC_db_stream,
+        METH_VARARGS|METH_KEYWORDS},
+#endif
     {"set_both",        (PyCFunction)DBC_set_both,      METH_VARARGS},
     {"set_recno",       (PyCFunction)DBC_set_recno,     METH_VARARGS|METH_KEYWORDS},
     {"consume",         (PyCFunction)DBC_consume,       METH_VARARGS|METH_KEYWORDS},
@@ -9097,6 +11564,20 @@ static PyMethodDef DBLogCursor_methods[] = {
     {NULL,      NULL}       /* sentinel */
 };
 
+#if (DBVER >= 62)
+static PyMethodDef DBStream_methods[] = {
+    {"read",        (PyCFunction)DBStream_read,
+        METH_VARARGS | METH_KEYWORDS},
+    {"write",       (PyCFunction)DBStream_write,
+        METH_VARARGS | METH_KEYWORDS},
+    {"seek",        (PyCFunction)DBStream_seek,     METH_VARARGS},
+    {"tell",        (PyCFunction)DBStream_tell,     METH_NOARGS},
+    {"size",        (PyCFunction)DBStream_size,     METH_NOARGS},
+    {"close",       (PyCFunction)DBStream_close,    METH_NOARGS},
+    {NULL,      NULL}       /* sentinel */
+};
+#endif
+
 #if (DBVER >= 53)
 static PyMethodDef DBSite_methods[] = {
     {"get_config",  (PyCFunction)DBSite_get_config,
@@ -9148,11 +11629,19 @@ static PyMethodDef DBEnv_methods[] = {
         METH_VARARGS},
     {"mutex_get_tas_spins", (PyCFunction)DBEnv_mutex_get_tas_spins,
         METH_NOARGS},
-    {"mutex_stat",      (PyCFunction)DBEnv_mutex_stat,      METH_VARARGS},
+    {"mutex_stat",      (PyCFunction)DBEnv_mutex_stat,      METH_VARARGS|METH_KEYWORDS},
     {"mutex_stat_print", (PyCFunction)DBEnv_mutex_stat_print,
                                          METH_VARARGS|METH_KEYWORDS},
     {"set_data_dir",    (PyCFunction)DBEnv_set_data_dir,    METH_VARARGS},
     {"get_data_dirs",   (PyCFunction)DBEnv_get_data_dirs,   METH_NOARGS},
+#if (DBVER >= 62)
+    {"set_ext_file_threshold", (PyCFunction)DBEnv_set_ext_file_threshold,
+        METH_VARARGS},
+    {"get_ext_file_threshold", (PyCFunction)DBEnv_get_ext_file_threshold,
+        METH_NOARGS},
+    {"set_ext_file_dir", (PyCFunction)DBEnv_set_ext_file_dir, METH_VARARGS},
+    {"get_ext_file_dir", (PyCFunction)DBEnv_get_ext_file_dir, METH_NOARGS},
+#endif
     {"get_flags",       (PyCFunction)DBEnv_get_flags,       METH_NOARGS},
     {"set_flags",       (PyCFunction)DBEnv_set_flags,       METH_VARARGS},
     {"log_set_config",  (PyCFunction)DBEnv_log_set_config,  METH_VARARGS},
@@ -9186,7 +11675,7 @@ static PyMethodDef DBEnv_methods[] = {
     {"cdsgroup_begin",  (PyCFunction)DBEnv_cdsgroup_begin,  METH_NOARGS},
     {"txn_begin",       (PyCFunction)DBEnv_txn_begin,       METH_VARARGS|METH_KEYWORDS},
     {"txn_checkpoint",  (PyCFunction)DBEnv_txn_checkpoint,  METH_VARARGS},
-    {"txn_stat",        (PyCFunction)DBEnv_txn_stat,        METH_VARARGS},
+    {"txn_stat",        (PyCFunction)DBEnv_txn_stat,        METH_VARARGS|METH_KEYWORDS},
     {"txn_stat_print",  (PyCFunction)DBEnv_txn_stat_print,
         METH_VARARGS|METH_KEYWORDS},
     {"get_tx_max",      (PyCFunction)DBEnv_get_tx_max,      METH_NOARGS},
@@ -9198,7 +11687,7 @@ static PyMethodDef DBEnv_methods[] = {
     {"lock_id",         (PyCFunction)DBEnv_lock_id,         METH_NOARGS},
     {"lock_id_free",    (PyCFunction)DBEnv_lock_id_free,    METH_VARARGS},
     {"lock_put",        (PyCFunction)DBEnv_lock_put,        METH_VARARGS},
-    {"lock_stat",       (PyCFunction)DBEnv_lock_stat,       METH_VARARGS},
+    {"lock_stat",       (PyCFunction)DBEnv_lock_stat,       METH_VARARGS|METH_KEYWORDS},
     {"lock_stat_print", (PyCFunction)DBEnv_lock_stat_print,
         METH_VARARGS|METH_KEYWORDS},
     {"log_cursor",      (PyCFunction)DBEnv_log_cursor,      METH_NOARGS},
@@ -9207,7 +11696,7 @@ static PyMethodDef DBEnv_methods[] = {
         METH_VARARGS|METH_KEYWORDS},
     {"log_archive",     (PyCFunction)DBEnv_log_archive,     METH_VARARGS},
     {"log_flush",       (PyCFunction)DBEnv_log_flush,       METH_VARARGS},
-    {"log_stat",        (PyCFunction)DBEnv_log_stat,        METH_VARARGS},
+    {"log_stat",        (PyCFunction)DBEnv_log_stat,        METH_VARARGS|METH_KEYWORDS},
     {"log_stat_print",  (PyCFunction)DBEnv_log_stat_print,
         METH_VARARGS|METH_KEYWORDS},
     {"fileid_reset",    (PyCFunction)DBEnv_fileid_reset,    METH_VARARGS|METH_KEYWORDS},
@@ -9222,6 +11711,10 @@ static PyMethodDef DBEnv_methods[] = {
     {"get_verbose",     (PyCFunction)DBEnv_get_verbose,     METH_VARARGS},
     {"set_private",     (PyCFunction)DBEnv_set_private,     METH_O},
     {"get_private",     (PyCFunction)DBEnv_get_private,     METH_NOARGS},
+    {"set_latency_stats", (PyCFunction)DBEnv_set_latency_stats, METH_VARARGS},
+    {"set_slow_op_hook", (PyCFunction)DBEnv_set_slow_op_hook, METH_VARARGS},
+    {"get_latency_stats", (PyCFunction)DBEnv_get_latency_stats,
+        METH_VARARGS|METH_KEYWORDS},
     {"get_open_flags",  (PyCFunction)DBEnv_get_open_flags,  METH_NOARGS},
     {"set_intermediate_dir_mode", (PyCFunction)DBEnv_set_intermediate_dir_mode,
         METH_VARARGS},
@@ -9327,6 +11820,20 @@ static PyMethodDef DBSequence_methods[] = {
 };
 
 
+static PyMethodDef DBWriteBatch_methods[] = {
+    {"append",          (PyCFunction)DBWriteBatch_append,
+        METH_VARARGS|METH_KEYWORDS},
+    {"apply",           (PyCFunction)DBWriteBatch_apply,
+        METH_VARARGS|METH_KEYWORDS},
+    {"clear",           (PyCFunction)DBWriteBatch_clear,        METH_NOARGS},
+    {"delete",          (PyCFunction)DBWriteBatch_delete,
+        METH_VARARGS|METH_KEYWORDS},
+    {"put",             (PyCFunction)DBWriteBatch_put,
+        METH_VARARGS|METH_KEYWORDS},
+    {NULL,      NULL}       /* sentinel */
+};
+
+
 static PyObject*
 DBEnv_db_home_get(DBEnvObject* self)
 {
@@ -9399,6 +11906,16 @@ DBSequence_construct(PyTypeObject *type, PyObject* args, PyObject* kwargs)
     return (PyObject* )newDBSequenceObject((DBObject*)dbobj, flags);
 }
 
+static PyObject*
+DBWriteBatch_construct(PyTypeObject *type, PyObject* args, PyObject* kwargs)
+{
+    static char* kwnames[] = { NULL };
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, ":WriteBatch", kwnames))
+        return NULL;
+    return (PyObject* )newDBWriteBatchObject();
+}
+
 
 static PyMemberDef DB_Type_members[] = {
 #if (PY_VERSION_HEX >= 0x03090000)
@@ -9499,6 +12016,31 @@ static PyType_Spec DBSite_Type_spec = {
 };
 #endif
 
+#if (DBVER >= 62)
+static PyMemberDef DBStream_Type_members[] = {
+#if (PY_VERSION_HEX >= 0x03090000)
+    {"__weaklistoffset__", T_PYSSIZET,
+        offsetof(DBStreamObject, in_weakreflist), READONLY},
+#endif
+    {NULL},
+};
+
+static PyType_Slot DBStream_Type_slots[] = {
+    {Py_tp_dealloc, DBStream_dealloc},
+    {Py_tp_methods, DBStream_methods},
+    {Py_tp_members, DBStream_Type_members},
+    {0, NULL},
+};
+
+static PyType_Spec DBStream_Type_spec = {
+    .name = PY_BERKELEYDB_BASE "DBStream",
+    .basicsize = sizeof(DBStreamObject),
+    .itemsize = 0,
+    .flags = Py_TPFLAGS_DEFAULT,
+    .slots = DBStream_Type_slots,
+};
+#endif
+
 static PyMemberDef DBEnv_Type_members[] = {
 #if (PY_VERSION_HEX >= 0x03090000)
     {"__weaklistoffset__", T_PYSSIZET,
@@ -9593,6 +12135,31 @@ static PyType_Spec DBSequence_Type_spec = {
     .slots = DBSequence_Type_slots,
 };
 
+static PyMemberDef DBWriteBatch_Type_members[] = {
+#if (PY_VERSION_HEX >= 0x03090000)
+    {"__weaklistoffset__", T_PYSSIZET,
+        offsetof(DBWriteBatchObject, in_weakreflist), READONLY},
+#endif
+    {NULL},
+};
+
+static PyType_Slot DBWriteBatch_Type_slots[] = {
+    {Py_tp_dealloc, DBWriteBatch_dealloc},
+    {Py_tp_methods, DBWriteBatch_methods},
+    {Py_tp_members, DBWriteBatch_Type_members},
+    {Py_tp_new, DBWriteBatch_construct},
+    {Py_mp_length, DBWriteBatch_length},
+    {0, NULL},
+};
+
+static PyType_Spec DBWriteBatch_Type_spec = {
+    .name = PY_BERKELEYDB_BASE "WriteBatch",
+    .basicsize = sizeof(DBWriteBatchObject),
+    .itemsize = 0,
+    .flags = Py_TPFLAGS_DEFAULT,
+    .slots = DBWriteBatch_Type_slots,
+};
+
 static char berkeleydb_version_doc[] =
 "Returns a tuple of major, minor, and patch release numbers of the\n\
 underlying DB library.";
@@ -9622,6 +12189,507 @@ berkeleydb_version_full(PyObject* self)
 #endif
 
 
+/* --------------------------------------------------------------------- */
+/* Order preserving encoding of tuples, for berkeleydb.keys
+ *
+ * The layout is the one of the FoundationDB tuple layer, so the packed
+ * keys sort under memcmp(), the default Btree comparison, like the tuples
+ * sort in Python (with None < bytes < str < tuples < ints < floats <
+ * bools between types).
+ */
+
+#define KEYS_NULL       0x00
+#define KEYS_BYTES      0x01
+#define KEYS_STRING     0x02
+#define KEYS_NESTED     0x05
+#define KEYS_NEG_BIG    0x0b
+#define KEYS_INT_ZERO   0x14
+#define KEYS_POS_BIG    0x1d
+#define KEYS_DOUBLE     0x21
+#define KEYS_FALSE      0x26
+#define KEYS_TRUE       0x27
+#define KEYS_ESCAPE     0xff
+
+typedef struct {
+    unsigned char *data;
+    Py_ssize_t len;
+    Py_ssize_t size;
+} _keys_buffer;
+
+static int
+_keys_reserve(_keys_buffer *buf, Py_ssize_t n)
+{
+    unsigned char *data;
+    Py_ssize_t size;
+
+    if (buf->len + n <= buf->size)
+        return 0;
+    size = buf->size ? buf->size : 64;
+    while (size < buf->len + n) {
+        if (size > PY_SSIZE_T_MAX / 2) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        size *= 2;
+    }
+    data = PyMem_Realloc(buf->data, size);
+    if (data == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    buf->data = data;
+    buf->size = size;
+    return 0;
+}
+
+static int
+_keys_put_byte(_keys_buffer *buf, unsigned char c)
+{
+    if (_keys_reserve(buf, 1) < 0)
+        return -1;
+    buf->data[buf->len++] = c;
+    return 0;
+}
+
+/* Bytes and strings: nul bytes escaped as \x00\xff, and a nul ending */
+static int
+_keys_put_escaped(_keys_buffer *buf, unsigned char code,
+                  const unsigned char *p, Py_ssize_t n)
+{
+    Py_ssize_t i, nuls = 0;
+
+    for (i = 0; i < n; i++)
+        nuls += (p[i] == 0);
+    if (_keys_reserve(buf, n + nuls + 2) < 0)
+        return -1;
+    buf->data[buf->len++] = code;
+    for (i = 0; i < n; i++) {
+        buf->data[buf->len++] = p[i];
+        if (p[i] == 0)
+            buf->data[buf->len++] = KEYS_ESCAPE;
+    }
+    buf->data[buf->len++] = 0;
+    return 0;
+}
+
+/* An integer from the big endian bytes of its magnitude, without leading
+ * zeros. Negative integers have their bytes complemented, and a smaller
+ * type code for a longer magnitude, so they sort before. */
+static int
+_keys_put_magnitude(_keys_buffer *buf, int negative,
+                    const unsigned char *p, Py_ssize_t n)
+{
+    Py_ssize_t i;
+
+    if (n > 255) {
+        PyErr_SetString(PyExc_OverflowError,
+                        "integer too large to be packed");
+        return -1;
+    }
+    if (_keys_reserve(buf, n + 2) < 0)
+        return -1;
+    if (n <= 8) {
+        buf->data[buf->len++] = (unsigned char)(negative ?
+                KEYS_INT_ZERO - n : KEYS_INT_ZERO + n);
+    } else {
+        buf->data[buf->len++] = negative ? KEYS_NEG_BIG : KEYS_POS_BIG;
+        buf->data[buf->len++] = (unsigned char)(negative ? n ^ 0xff : n);
+    }
+    for (i = 0; i < n; i++)
+        buf->data[buf->len++] = negative ? p[i] ^ 0xff : p[i];
+    return 0;
+}
+
+static int
+_keys_put_int(_keys_buffer *buf, PyObject *obj)
+{
+    int overflow, n, negative, result = -1;
+    long long value;
+    unsigned long long mag;
+    unsigned char bytes[8];
+    PyObject *absolute = NULL, *bits = NULL, *big = NULL;
+    Py_ssize_t nbytes;
+
+    value = PyLong_AsLongLongAndOverflow(obj, &overflow);
+    if ((value == -1) && PyErr_Occurred())
+        return -1;
+    if (!overflow) {
+        negative = value < 0;
+        mag = negative ? (unsigned long long)(-(value + 1)) + 1 :
+                         (unsigned long long)value;
+        for (n = 0; n < 8 && (mag >> (8 * n)); n++);
+        for (int i = 0; i < n; i++)
+            bytes[i] = (unsigned char)(mag >> (8 * (n - 1 - i)));
+        return _keys_put_magnitude(buf, negative, bytes, n);
+    }
+
+    /* Beyond 64 bits, through int.to_bytes() */
+    if (!(absolute = PyNumber_Absolute(obj)))
+        goto exit;
+    if (!(bits = PyObject_CallMethod(absolute, "bit_length", NULL)))
+        goto exit;
+    nbytes = (PyLong_AsSsize_t(bits) + 7) / 8;
+    if ((nbytes == -1) && PyErr_Occurred())
+        goto exit;
+    if (!(big = PyObject_CallMethod(absolute, "to_bytes", "ns",
+                                    nbytes, "big")))
+        goto exit;
+    result = _keys_put_magnitude(buf, overflow < 0,
+                                 (unsigned char *)PyBytes_AS_STRING(big),
+                                 PyBytes_GET_SIZE(big));
+exit:
+    Py_XDECREF(absolute);
+    Py_XDECREF(bits);
+    Py_XDECREF(big);
+    return result;
+}
+
+/* IEEE 754 bits, big endian, with the sign bit flipped for positive
+ * numbers and every bit flipped for negative ones */
+static int
+_keys_put_double(_keys_buffer *buf, double value)
+{
+    unsigned long long bits;
+    int i;
+
+    memcpy(&bits, &value, sizeof(bits));
+    if (bits >> 63)
+        bits = ~bits;
+    else
+        bits |= 1ULL << 63;
+    if (_keys_reserve(buf, 9) < 0)
+        return -1;
+    buf->data[buf->len++] = KEYS_DOUBLE;
+    for (i = 7; i >= 0; i--)
+        buf->data[buf->len++] = (unsigned char)(bits >> (8 * i));
+    return 0;
+}
+
+static int _keys_put_tuple(_keys_buffer *buf, PyObject *tuple, int nested);
+
+static int
+_keys_put(_keys_buffer *buf, PyObject *obj, int nested)
+{
+    const char *s;
+    Py_ssize_t n;
+    int result;
+
+    if (obj == Py_None) {
+        if (_keys_put_byte(buf, KEYS_NULL) < 0)
+            return -1;
+        return nested ? _keys_put_byte(buf, KEYS_ESCAPE) : 0;
+    }
+    if (PyBool_Check(obj))
+        return _keys_put_byte(buf, obj == Py_True ? KEYS_TRUE : KEYS_FALSE);
+    if (PyLong_Check(obj))
+        return _keys_put_int(buf, obj);
+    if (PyFloat_Check(obj))
+        return _keys_put_double(buf, PyFloat_AS_DOUBLE(obj));
+    if (PyBytes_Check(obj))
+        return _keys_put_escaped(buf, KEYS_BYTES,
+                                 (unsigned char *)PyBytes_AS_STRING(obj),
+                                 PyBytes_GET_SIZE(obj));
+    if (PyUnicode_Check(obj)) {
+        if (!(s = PyUnicode_AsUTF8AndSize(obj, &n)))
+            return -1;
+        return _keys_put_escaped(buf, KEYS_STRING, (unsigned char *)s, n);
+    }
+    if (PyTuple_Check(obj)) {
+        if (Py_EnterRecursiveCall(" while packing a key"))
+            return -1;
+        result = _keys_put_tuple(buf, obj, 1);
+        Py_LeaveRecursiveCall();
+        return result;
+    }
+    makeTypeError("None, bool, int, float, bytes, str or tuple", obj);
+    return -1;
+}
+
+static int
+_keys_put_tuple(_keys_buffer *buf, PyObject *tuple, int nested)
+{
+    Py_ssize_t i;
+
+    if (nested && (_keys_put_byte(buf, KEYS_NESTED) < 0))
+        return -1;
+    for (i = 0; i < PyTuple_GET_SIZE(tuple); i++) {
+        if (_keys_put(buf, PyTuple_GET_ITEM(tuple, i), nested) < 0)
+            return -1;
+    }
+    if (nested && (_keys_put_byte(buf, KEYS_NULL) < 0))
+        return -1;
+    return 0;
+}
+
+static PyObject*
+berkeleydb_keys_pack(PyObject* self, PyObject* tuple)
+{
+    _keys_buffer buf = { NULL, 0, 0 };
+    PyObject *result = NULL;
+
+    if (!PyTuple_Check(tuple)) {
+        makeTypeError("tuple", tuple);
+        return NULL;
+    }
+    if (_keys_put_tuple(&buf, tuple, 0) == 0)
+        result = PyBytes_FromStringAndSize((char *)buf.data, buf.len);
+    PyMem_Free(buf.data);
+    return result;
+}
+
+
+static PyObject*
+_keys_invalid(void)
+{
+    PyErr_SetString(PyExc_ValueError, "Invalid packed key");
+    return NULL;
+}
+
+/* The unescaped content of a bytes or string, up to its nul ending */
+static PyObject*
+_keys_get_escaped(const unsigned char *p, Py_ssize_t len, Py_ssize_t *pos,
+                  int string)
+{
+    Py_ssize_t i, n = 0, end;
+    unsigned char *q;
+    PyObject *bytes, *result;
+
+    for (i = *pos; i < len; i++, n++) {
+        if (p[i] == 0) {
+            if ((i + 1 < len) && (p[i + 1] == KEYS_ESCAPE))
+                i++;
+            else
+                break;
+        }
+    }
+    if (i >= len)
+        return _keys_invalid();
+    end = i;
+
+    if (!(bytes = PyBytes_FromStringAndSize(NULL, n)))
+        return NULL;
+    q = (unsigned char *)PyBytes_AS_STRING(bytes);
+    for (i = *pos; i < end; i++) {
+        *q++ = p[i];
+        if (p[i] == 0)
+            i++;
+    }
+    *pos = end + 1;
+    if (!string)
+        return bytes;
+    result = PyUnicode_DecodeUTF8(PyBytes_AS_STRING(bytes), n, NULL);
+    Py_DECREF(bytes);
+    return result;
+}
+
+static PyObject*
+_keys_get_int(const unsigned char *p, Py_ssize_t len, Py_ssize_t *pos,
+              unsigned char code)
+{
+    int negative = code < KEYS_INT_ZERO;
+    Py_ssize_t i, n;
+    unsigned long long mag = 0;
+    unsigned char *q;
+    PyObject *bytes, *result, *negated;
+
+    if ((code == KEYS_POS_BIG) || (code == KEYS_NEG_BIG)) {
+        if (*pos >= len)
+            return _keys_invalid();
+        n = negative ? p[*pos] ^ 0xff : p[*pos];
+        (*pos)++;
+    } else {
+        n = negative ? KEYS_INT_ZERO - code : code - KEYS_INT_ZERO;
+    }
+    if (*pos + n > len)
+        return _keys_invalid();
+
+    if (n <= 8) {
+        for (i = 0; i < n; i++)
+            mag = (mag << 8) | (negative ? p[*pos + i] ^ 0xff : p[*pos + i]);
+        *pos += n;
+        if (!negative)
+            return PyLong_FromUnsignedLongLong(mag);
+        if (mag <= (unsigned long long)PY_LLONG_MAX)
+            return PyLong_FromLongLong(-(long long)mag);
+        result = PyLong_FromUnsignedLongLong(mag);
+    } else {
+        if (!(bytes = PyBytes_FromStringAndSize(NULL, n)))
+            return NULL;
+        q = (unsigned char *)PyBytes_AS_STRING(bytes);
+        for (i = 0; i < n; i++)
+            q[i] = negative ? p[*pos + i] ^ 0xff : p[*pos + i];
+        *pos += n;
+        result = PyObject_CallMethod((PyObject *)&PyLong_Type, "from_bytes",
+                                     "Os", bytes, "big");
+        Py_DECREF(bytes);
+        if (!negative)
+            return result;
+    }
+    if (result == NULL)
+        return NULL;
+    negated = PyNumber_Negative(result);
+    Py_DECREF(result);
+    return negated;
+}
+
+static PyObject*
+_keys_get_double(const unsigned char *p, Py_ssize_t len, Py_ssize_t *pos)
+{
+    unsigned long long bits = 0;
+    double value;
+    int i;
+
+    if (*pos + 8 > len)
+        return _keys_invalid();
+    for (i = 0; i < 8; i++)
+        bits = (bits << 8) | p[(*pos)++];
+    if (bits >> 63)
+        bits &= ~(1ULL << 63);
+    else
+        bits = ~bits;
+    memcpy(&value, &bits, sizeof(value));
+    return PyFloat_FromDouble(value);
+}
+
+static PyObject*
+_keys_get_tuple(const unsigned char *p, Py_ssize_t len, Py_ssize_t *pos,
+                int nested)
+{
+    PyObject *list, *item, *result;
+    unsigned char code;
+
+    if (!(list = PyList_New(0)))
+        return NULL;
+    for (;;) {
+        if (*pos >= len) {
+            if (!nested)
+                break;
+            Py_DECREF(list);
+            return _keys_invalid();
+        }
+        code = p[(*pos)++];
+        if (code == KEYS_NULL) {
+            if (!nested) {
+                item = Py_None;
+                Py_INCREF(item);
+            } else if ((*pos < len) && (p[*pos] == KEYS_ESCAPE)) {
+                (*pos)++;
+                item = Py_None;
+                Py_INCREF(item);
+            } else {
+                break;  /* The end of a nested tuple */
+            }
+        } else if ((code == KEYS_BYTES) || (code == KEYS_STRING)) {
+            item = _keys_get_escaped(p, len, pos, code == KEYS_STRING);
+        } else if (code == KEYS_NESTED) {
+            if (Py_EnterRecursiveCall(" while unpacking a key")) {
+                Py_DECREF(list);
+                return NULL;
+            }
+            item = _keys_get_tuple(p, len, pos, 1);
+            Py_LeaveRecursiveCall();
+        } else if ((code >= KEYS_NEG_BIG) && (code <= KEYS_POS_BIG)) {
+            item = _keys_get_int(p, len, pos, code);
+        } else if (code == KEYS_DOUBLE) {
+            item = _keys_get_double(p, len, pos);
+        } else if ((code == KEYS_FALSE) || (code == KEYS_TRUE)) {
+            item = code == KEYS_TRUE ? Py_True : Py_False;
+            Py_INCREF(item);
+        } else {
+            item = _keys_invalid();
+        }
+        if ((item == NULL) || (PyList_Append(list, item) < 0)) {
+            Py_XDECREF(item);
+            Py_DECREF(list);
+            return NULL;
+        }
+        Py_DECREF(item);
+    }
+    result = PyList_AsTuple(list);
+    Py_DECREF(list);
+    return result;
+}
+
+static PyObject*
+berkeleydb_keys_unpack(PyObject* self, PyObject* key)
+{
+    Py_buffer view;
+    Py_ssize_t pos = 0;
+    PyObject *result;
+
+    if (PyObject_GetBuffer(key, &view, PyBUF_SIMPLE) < 0)
+        return NULL;
+    result = _keys_get_tuple(view.buf, view.len, &pos, 0);
+    PyBuffer_Release(&view);
+    return result;
+}
+
+/* --------------------------------------------------------------------- */
+/* Bloom filter probes, for berkeleydb.bloom
+ *
+ * The 'k' bits of a key are h1 + i * h2 modulo the number of bits of the
+ * filter (Kirsch and Mitzenmacher), from its MurmurHash3 and xxHash. */
+
+static int
+_bloom_parse(PyObject *args, const char *format, Py_buffer *bits,
+             Py_buffer *key, int *k)
+{
+    if (!PyArg_ParseTuple(args, format, bits, key, k))
+        return -1;
+    if ((bits->len == 0) || (*k < 1) || (key->len > 0xFFFFFFFFLL)) {
+        PyBuffer_Release(bits);
+        PyBuffer_Release(key);
+        PyErr_SetString(PyExc_ValueError, "Invalid bloom filter arguments");
+        return -1;
+    }
+    return 0;
+}
+
+static PyObject*
+_bloom_probe(PyObject *args, const char *format, int add)
+{
+    Py_buffer bits, key;
+    int i, k, found = 1;
+    unsigned long long h1, h2, nbits, bit;
+    u_int32_t m, x;
+    unsigned char *p;
+
+    if (_bloom_parse(args, format, &bits, &key, &k) < 0)
+        return NULL;
+    m = _hash_murmur3(key.buf, (u_int32_t)key.len);
+    x = _hash_xxh32(key.buf, (u_int32_t)key.len);
+    h1 = ((unsigned long long)m << 32) | x;
+    h2 = ((unsigned long long)x << 32) | m | 1;
+    nbits = (unsigned long long)bits.len * 8;
+    p = bits.buf;
+    for (i = 0; i < k; i++) {
+        bit = (h1 + i * h2) % nbits;
+        if (!(p[bit >> 3] & (1 << (bit & 7)))) {
+            found = 0;
+            if (!add)
+                break;
+            p[bit >> 3] |= 1 << (bit & 7);
+        }
+    }
+    PyBuffer_Release(&bits);
+    PyBuffer_Release(&key);
+    return PyBool_FromLong(found);
+}
+
+/* Sets the bits of the key, returns whether they were all set already */
+static PyObject*
+berkeleydb_bloom_add(PyObject* self, PyObject* args)
+{
+    return _bloom_probe(args, "w*y*i:_bloom_add", 1);
+}
+
+/* Returns whether the key can be in the filter */
+static PyObject*
+berkeleydb_bloom_check(PyObject* self, PyObject* args)
+{
+    return _bloom_probe(args, "y*y*i:_bloom_check", 0);
+}
+
 /* List of functions defined in the module */
 static PyMethodDef berkeleydb_methods[] = {
     {"version",     (PyCFunction)berkeleydb_version,         METH_NOARGS,
@@ -9629,6 +12697,10 @@ static PyMethodDef berkeleydb_methods[] = {
 #if (DBVER >= 53)
     {"full_version", (PyCFunction)berkeleydb_version_full, METH_NOARGS},
 #endif
+    {"_keys_pack",  (PyCFunction)berkeleydb_keys_pack,       METH_O},
+    {"_keys_unpack", (PyCFunction)berkeleydb_keys_unpack,    METH_O},
+    {"_bloom_add",  (PyCFunction)berkeleydb_bloom_add,       METH_VARARGS},
+    {"_bloom_check", (PyCFunction)berkeleydb_bloom_check,    METH_VARARGS},
     {NULL,      NULL}       /* sentinel */
 };
 
@@ -9752,6 +12824,20 @@ PyMODINIT_FUNC  PyInit__berkeleydb(void)    /* Note the two underscores */
     DBSite_Type = type;
 #endif
 
+#if (DBVER >= 62)
+    type = (PyTypeObject *)PyType_FromSpec(&DBStream_Type_spec);
+    if (type == NULL)
+        return NULL;
+    type->tp_new = NULL;
+    DBStream_Type = type;
+#endif
+
+    type = (PyTypeObject *)PyType_FromSpec(&DBWriteBatch_Type_spec);
+    if (type == NULL)
+        return NULL;
+    /* tp_new is used in this type */
+    DBWriteBatch_Type = type;
+
     /* Create the module and add the functions */
     m=PyModule_Create(&berkeleydbmodule);
     if (m == NULL) {
@@ -10355,6 +13441,16 @@ PyMODINIT_FUNC  PyInit__berkeleydb(void)    /* Note the two underscores */
         goto error;
     }
 
+    Py_INCREF(DBWriteBatch_Type);
+    if (PyModule_AddObject(m, "WriteBatch", (PyObject *)DBWriteBatch_Type) < 0)
+    {
+        Py_DECREF(DBEnv_Type);
+        Py_DECREF(DB_Type);
+        Py_DECREF(DBSequence_Type);
+        Py_DECREF(DBWriteBatch_Type);
+        goto error;
+    }
+
 error:
     /* Check for errors */
     if (PyErr_Occurred()) {
@@ -108,6 +108,31 @@
 
 /* Python object definitions */
 
+/* Operations timed when the latency statistics are enabled */
+#define DBLAT_GET       0
+#define DBLAT_PUT       1
+#define DBLAT_DELETE    2
+#define DBLAT_CURSOR    3
+#define DBLAT_COMMIT    4
+#define DBLAT_NUM_OPS   5
+
+/* Bucket 0 counts the calls under 1 microsecond, bucket N (N>0) those
+   between 2**(N-1) and 2**N microseconds.  The last one has no upper
+   limit. */
+#define DBLAT_BUCKETS   32
+
+typedef struct {
+    unsigned long long count;
+    unsigned long long total_ns;     /* In Berkeley DB, GIL released */
+    unsigned long long gil_wait_ns;  /* Reacquiring the GIL after it */
+    unsigned long long buckets[DBLAT_BUCKETS];
+} DBLatencyOp;
+
+typedef struct {
+    DBLatencyOp     ops[DBLAT_NUM_OPS];
+} DBLatencyStats;
+
+
 struct behaviourFlags {
     /* What is the default behaviour when DB->get or DBCursor->get returns a
        DB_NOTFOUND || DB_KEYEMPTY error?  Return None or raise an exception? */
@@ -127,6 +152,9 @@ struct DBSequenceObject;  /* Forward declaration */
 #if (DBVER >= 53)
 struct DBSiteObject;      /* Forward declaration */
 #endif
+#if (DBVER >= 62)
+struct DBStreamObject;    /* Forward declaration */
+#endif
 
 typedef struct {
     PyObject_HEAD
@@ -144,6 +172,13 @@ typedef struct {
     PyObject        *private_obj;
     PyObject        *rep_transport;
     PyObject        *in_weakreflist; /* List of weak references */
+    /* Added in 18.1.6.  New fields go at the end, so the offsets of the
+       older ones, used by other extensions, don't change. */
+    int             latency_enabled;
+    DBLatencyStats  *latency;  /* Kept, once allocated, until dealloc */
+    PyObject        *slow_op_dispatcher;   /* NULL if there is no hook */
+    PyObject        *slow_op_put;          /* Queues slow operations */
+    unsigned long long slow_op_threshold_ns;
 } DBEnvObject;
 
 typedef struct DBObject {
@@ -167,6 +202,19 @@ typedef struct DBObject {
     DBTYPE          dbtype;
     PyObject        *private_obj;
     PyObject        *in_weakreflist; /* List of weak references */
+    /* Added in 18.1.6.  New fields go at the end, so the offsets of the
+       older ones, used by other extensions, don't change. */
+    PyObject*       hashCallback;     /* Or the name of a native hash */
+    PyObject*       prefixCallback;   /* Or the name of a native prefix */
+    PyObject*       compressCallback;
+    PyObject*       decompressCallback;
+    int             compression;
+    PyObject*       partitionCallback;
+    u_int32_t       partition_parts;
+    DBT             *partition_keys;  /* Boundaries given to set_partition */
+    int             keyType;   /* Set by set_key_type(), 0 for bytes keys */
+    int             latency_enabled;
+    DBLatencyStats  *latency;  /* Kept, once allocated, until dealloc */
 } DBObject;
 
 
@@ -180,6 +228,10 @@ typedef struct DBCursorObject {
     DBObject*       mydb;
     struct DBTxnObject *txn;
     PyObject        *in_weakreflist; /* List of weak references */
+    /* Added in 18.1.6 */
+#if (DBVER >= 62)
+    struct DBStreamObject *children_streams;
+#endif
 } DBCursorObject;
 
 
@@ -219,6 +271,18 @@ typedef struct DBSiteObject {
 } DBSiteObject;
 #endif
 
+#if (DBVER >= 62)
+typedef struct DBStreamObject {
+    PyObject_HEAD
+    DB_STREAM       *stream;
+    DBCursorObject  *cursor;
+    struct DBStreamObject **sibling_prev_p;
+    struct DBStreamObject *sibling_next;
+    db_off_t        pos;       /* Offset of the next read() or write() */
+    PyObject        *in_weakreflist; /* List of weak references */
+} DBStreamObject;
+#endif
+
 typedef struct {
     PyObject_HEAD
     DB_LOCK         lock;
@@ -240,6 +304,29 @@ typedef struct DBSequenceObject {
 } DBSequenceObject;
 
 
+/* Operations recorded in a WriteBatch */
+#define DBWB_PUT        1
+#define DBWB_DELETE     2
+#define DBWB_APPEND     3
+
+typedef struct {
+    struct DBObject *db;        /* Strong reference */
+    int             op;
+    u_int32_t       flags;
+    DBT             key;        /* Private copies of the key and data */
+    DBT             data;
+} DBWriteBatchOp;
+
+typedef struct {
+    PyObject_HEAD
+    DBWriteBatchOp  *ops;
+    Py_ssize_t      size;
+    Py_ssize_t      allocated;
+    int             applying;   /* ops can't change while being applied */
+    PyObject        *in_weakreflist; /* List of weak references */
+} DBWriteBatchObject;
+
+
 /* API structure for use by C code */
 
 /* To access the structure from an external module, use code like the
@@ -0,0 +1,227 @@
+#-------------------------------------------------------------------------
+#  asyncio front-end for DB, DBCursor, DBTxn and DBEnv objects.
+#
+#  Blocking Berkeley DB calls run in a bounded thread pool.  The C
+#  extension releases the GIL around them, so several calls can
+#  progress in parallel while the event loop keeps running.
+#-------------------------------------------------------------------------
+
+"""asyncio wrappers for berkeleydb objects.
+
+    env = AsyncEnv(db.DBEnv())
+    await env.open(home, db.DB_CREATE | db.DB_INIT_TXN | ...)
+    d = AsyncDB(db.DB(env.cobj))
+    await d.open('test.db', dbtype=db.DB_BTREE, flags=db.DB_CREATE)
+
+    async with await env.txn_begin() as txn:
+        await d.put(b'key', b'data', txn=txn)
+
+    async with d.cursor() as c:
+        async for key, data in c:
+            ...
+
+Wrapped objects can be passed wherever the C objects are expected, for
+instance txn=AsyncTxn.  Blocking calls run in the executor given to the
+wrapper or, by default, in a module wide pool of DEFAULT_MAX_WORKERS
+threads.  Calls waiting for long (consume_wait(), for instance) hold a
+thread of the pool meanwhile, so size it accordingly.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_MAX_WORKERS = 8
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def get_default_executor():
+    """Returns the executor used when a wrapper is not given one."""
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = ThreadPoolExecutor(
+                    max_workers=DEFAULT_MAX_WORKERS,
+                    thread_name_prefix='berkeleydb-aio')
+        return _default_executor
+
+
+def _unwrap(obj):
+    if isinstance(obj, _AsyncWrapper):
+        return obj._cobj
+    return obj
+
+
+def _blocking(name, wrap=None):
+    # Builds a coroutine method running the C method in the executor
+    async def method(self, *args, **kwargs):
+        result = await self._run(getattr(self._cobj, name), *args, **kwargs)
+        if wrap is not None:
+            result = wrap(result, self._executor)
+        return result
+    method.__name__ = name
+    method.__doc__ = 'Coroutine version of %s().' % name
+    return method
+
+
+class _AsyncWrapper:
+    def __init__(self, cobj, executor=None):
+        self._cobj = cobj
+        self._executor = executor
+
+    @property
+    def cobj(self):
+        """The wrapped berkeleydb object."""
+        return self._cobj
+
+    def __getattr__(self, name):
+        # Non blocking methods and attributes (set_*, get_type...)
+        return getattr(self._cobj, name)
+
+    def _run(self, function, *args, **kwargs):
+        args = [_unwrap(i) for i in args]
+        for k, v in kwargs.items():
+            kwargs[k] = _unwrap(v)
+        executor = self._executor
+        if executor is None:
+            executor = get_default_executor()
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(executor,
+                                    functools.partial(function, *args,
+                                                      **kwargs))
+
+
+class AsyncTxn(_AsyncWrapper):
+    """asyncio wrapper of a DBTxn.  As an async context manager, it commits
+    the transaction on exit, or aborts it if an exception was raised.
+    """
+    commit = _blocking('commit')
+    abort = _blocking('abort')
+    discard = _blocking('discard')
+    prepare = _blocking('prepare')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.commit()
+        else:
+            await self.abort()
+        return False
+
+
+class AsyncCursor(_AsyncWrapper):
+    """asyncio wrapper of a DBCursor.  Iterating over it asynchronously
+    scans the database from the record after the current position (from
+    the first record for a new cursor), fetching 'batch_size' records per
+    executor call.
+    """
+    batch_size = 100
+
+    close = _blocking('close')
+    count = _blocking('count')
+    current = _blocking('current')
+    delete = _blocking('delete')
+    dup = _blocking('dup', lambda c, e: AsyncCursor(c, e))
+    first = _blocking('first')
+    get = _blocking('get')
+    get_both = _blocking('get_both')
+    last = _blocking('last')
+    next = _blocking('next')
+    next_dup = _blocking('next_dup')
+    next_nodup = _blocking('next_nodup')
+    pget = _blocking('pget')
+    prev = _blocking('prev')
+    prev_dup = _blocking('prev_dup')
+    prev_nodup = _blocking('prev_nodup')
+    put = _blocking('put')
+    set = _blocking('set')
+    set_both = _blocking('set_both')
+    set_range = _blocking('set_range')
+    set_recno = _blocking('set_recno')
+
+    def _fetch(self, count):
+        # Runs in the executor.  next() of an unpositioned cursor returns
+        # the first record.
+        records = []
+        c = self._cobj
+        for i in range(count):
+            rec = c.next()
+            if rec is None:
+                break
+            records.append(rec)
+        return records
+
+    async def batches(self, batch_size=None):
+        """Yields lists of up to batch_size records."""
+        if batch_size is None:
+            batch_size = self.batch_size
+        while True:
+            records = await self._run(self._fetch, batch_size)
+            if not records:
+                return
+            yield records
+            if len(records) < batch_size:
+                return
+
+    async def __aiter__(self):
+        async for records in self.batches():
+            for rec in records:
+                yield rec
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+        return False
+
+
+class AsyncDB(_AsyncWrapper):
+    """asyncio wrapper of a DB."""
+    append = _blocking('append')
+    associate = _blocking('associate')
+    close = _blocking('close')
+    compact = _blocking('compact')
+    consume = _blocking('consume')
+    consume_wait = _blocking('consume_wait')
+    delete = _blocking('delete')
+    exists = _blocking('exists')
+    get = _blocking('get')
+    get_both = _blocking('get_both')
+    get_size = _blocking('get_size')
+    items = _blocking('items')
+    key_range = _blocking('key_range')
+    keys = _blocking('keys')
+    open = _blocking('open')
+    pget = _blocking('pget')
+    put = _blocking('put')
+    stat = _blocking('stat')
+    sync = _blocking('sync')
+    truncate = _blocking('truncate')
+    values = _blocking('values')
+
+    def cursor(self, txn=None, flags=0):
+        """Returns an AsyncCursor.  Creating a cursor doesn't block."""
+        return AsyncCursor(self._cobj.cursor(_unwrap(txn), flags),
+                           self._executor)
+
+
+class AsyncEnv(_AsyncWrapper):
+    """asyncio wrapper of a DBEnv."""
+    close = _blocking('close')
+    dbremove = _blocking('dbremove')
+    dbrename = _blocking('dbrename')
+    lock_detect = _blocking('lock_detect')
+    log_flush = _blocking('log_flush')
+    memp_sync = _blocking('memp_sync')
+    memp_trickle = _blocking('memp_trickle')
+    open = _blocking('open')
+    txn_begin = _blocking('txn_begin', lambda t, e: AsyncTxn(t, e))
+    txn_checkpoint = _blocking('txn_checkpoint')
+    checkpoint = txn_checkpoint
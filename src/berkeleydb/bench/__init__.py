@@ -0,0 +1,312 @@
+#-------------------------------------------------------------------------
+#  Benchmarks of the berkeleydb API, to catch performance regressions.
+#-------------------------------------------------------------------------
+
+"""Benchmarks of the berkeleydb API.
+
+    python -m berkeleydb.bench                  # Everything, default sizes
+    python -m berkeleydb.bench -b get,put -m btree,hash -t 1,4 \\
+            -e plain,txn -o results.json
+    python -m berkeleydb.bench --compare old.json results.json
+
+Every benchmark runs in a new environment, in a temporary directory, for
+each combination of access method, environment, thread count and key
+and value size asked for.  The records needed are loaded first, then the
+operations are timed, split among the threads.  The results are a list
+of dictionaries, written as JSON with the versions of Python, Berkeley
+DB and berkeleydb, so they can be compared later with compare().
+
+The environments are:
+
+    plain:  DB_INIT_MPOOL only.  The benchmarks writing to the database
+            only run with one thread here, as there is no locking.
+    txn:    DB_INIT_TXN (and locking and logging), with DB_AUTO_COMMIT
+            databases and DB_TXN_WRITE_NOSYNC, so the log is written but
+            not flushed to the disk on commit.
+    mvcc:   Like txn, with DB_MULTIVERSION databases and DB_TXN_SNAPSHOT
+            for every transaction and cursor.
+    cdb:    DB_INIT_CDB (Concurrent Data Store).
+
+The benchmarks are registered in BENCHMARKS by the benchmark() decorator,
+see berkeleydb.bench.micro.
+"""
+
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+from time import perf_counter as _clock
+
+from .. import db
+
+
+METHODS = {
+    'btree': db.DB_BTREE,
+    'hash': db.DB_HASH,
+    'recno': db.DB_RECNO,
+    'queue': db.DB_QUEUE,
+}
+if hasattr(db, 'DB_HEAP'):      # Berkeley DB 5.3 and up
+    METHODS['heap'] = db.DB_HEAP
+
+ENVIRONMENTS = {
+    'plain': db.DB_INIT_MPOOL,
+    'txn': (db.DB_INIT_MPOOL | db.DB_INIT_LOCK | db.DB_INIT_LOG |
+            db.DB_INIT_TXN),
+    'mvcc': (db.DB_INIT_MPOOL | db.DB_INIT_LOCK | db.DB_INIT_LOG |
+             db.DB_INIT_TXN),
+    'cdb': db.DB_INIT_MPOOL | db.DB_INIT_CDB,
+}
+
+TRANSACTIONAL = ('txn', 'mvcc')
+
+BENCHMARKS = {}
+
+
+class Benchmark:
+    def __init__(self, name, function, methods, envs, load, writes, setup):
+        self.name = name
+        self.function = function
+        self.methods = methods
+        self.envs = envs
+        self.load = load
+        self.writes = writes
+        self.setup = setup
+
+    def supports(self, method, env, threads):
+        if method not in self.methods or env not in self.envs:
+            return False
+        # Without locking, only one thread can write
+        return not (self.writes and env == 'plain' and threads > 1)
+
+
+def benchmark(name, methods=tuple(METHODS), envs=tuple(ENVIRONMENTS),
+              load=True, writes=False, setup=None):
+    """Registers function(ctx, items) as a benchmark.  'items' is the
+    slice of record indexes given to a thread, in random order, and the
+    function does an operation per item, unless it returns the number of
+    operations done.  If 'load' is true, the records are in the database
+    before the benchmark starts, and 'setup(ctx)' is called before
+    loading them.  'writes' marks the benchmarks changing the database.
+    """
+    def register(function):
+        BENCHMARKS[name] = Benchmark(name, function, tuple(methods),
+                                     tuple(envs), load, writes, setup)
+        return function
+    return register
+
+
+class Context:
+    """The environment and database a benchmark runs against.
+
+    'keys' are the keys of the records, by index: bytes for Btree and
+    Hash, record numbers for Recno and Queue and, for Heap, the record
+    ids returned by append() when the records are loaded.  value(i) is
+    the data of the record i.
+    """
+    def __init__(self, method, env, records, key_size=16, value_size=100,
+                 cachesize=64 * 1024 * 1024, pagesize=0):
+        if method in ('btree', 'hash') and len(str(records - 1)) > key_size:
+            raise ValueError("key_size too small for %d records" % records)
+        self.method = method
+        self.env_name = env
+        self.records = records
+        self.key_size = key_size
+        self.value_size = value_size
+        self.transactional = env in TRANSACTIONAL
+        self.dbs = []   # Databases, sequences... closed by close()
+        self.home = tempfile.mkdtemp(prefix='berkeleydb-bench-')
+
+        self.env = db.DBEnv()
+        self.env.set_cachesize(0, cachesize)
+        if self.transactional:
+            self.env.set_flags(db.DB_TXN_WRITE_NOSYNC, 1)
+            self.env.set_lk_detect(db.DB_LOCK_DEFAULT)
+        if env == 'mvcc':
+            self.env.set_flags(db.DB_TXN_SNAPSHOT, 1)
+        self.env.open(self.home, ENVIRONMENTS[env] | db.DB_CREATE |
+                      db.DB_PRIVATE | db.DB_THREAD)
+        self.db = self.open_db('bench.db', METHODS[method], pagesize=pagesize,
+                               re_len=value_size)
+        if method in ('btree', 'hash'):
+            self.keys = [(b'%0*d' % (key_size, i))[-key_size:]
+                         for i in range(records)]
+        elif method in ('recno', 'queue'):
+            self.keys = list(range(1, records + 1))
+        else:
+            self.keys = []
+
+    def open_db(self, filename, dbtype, flags=0, setflags=0, pagesize=0,
+                re_len=0):
+        """Opens a database of the environment, to be closed by close()."""
+        d = db.DB(self.env)
+        if setflags:
+            d.set_flags(setflags)
+        if pagesize:
+            d.set_pagesize(pagesize)
+        if dbtype == db.DB_QUEUE:
+            d.set_re_len(re_len)
+        flags |= db.DB_CREATE | db.DB_THREAD
+        if self.transactional:
+            flags |= db.DB_AUTO_COMMIT
+        if self.env_name == 'mvcc':
+            flags |= db.DB_MULTIVERSION
+        d.open(filename, dbtype=dbtype, flags=flags)
+        self.dbs.append(d)
+        return d
+
+    def value(self, i):
+        return (b'%0*d' % (self.value_size, i))[-self.value_size:]
+
+    def in_txn(self, function, *args, **kwargs):
+        """Calls function(*args, txn=..., **kwargs), in a transaction if
+        the environment is transactional."""
+        if not self.transactional:
+            return function(*args, **kwargs)
+        txn = self.env.txn_begin()
+        try:
+            result = function(*args, txn=txn, **kwargs)
+        except:
+            txn.abort()
+            raise
+        txn.commit()
+        return result
+
+    def load(self):
+        d = self.db
+        if self.method == 'heap':
+            self.keys = [d.append(self.value(i))
+                         for i in range(self.records)]
+            return
+        for i, key in enumerate(self.keys):
+            d.put(key, self.value(i))
+
+    def close(self):
+        for d in reversed(self.dbs):
+            d.close()
+        self.env.close()
+        shutil.rmtree(self.home, ignore_errors=True)
+
+
+def run_one(name, method, env, threads=1, records=10000, key_size=16,
+            value_size=100, seed=0, **kwargs):
+    """Runs a benchmark once, and returns its result, or None if the
+    benchmark doesn't support the access method, environment or thread
+    count."""
+    bench = BENCHMARKS[name]
+    if not bench.supports(method, env, threads):
+        return None
+    ctx = Context(method, env, records, key_size, value_size, **kwargs)
+    try:
+        if bench.setup is not None:
+            bench.setup(ctx)
+        if bench.load:
+            ctx.load()
+        items = list(range(records))
+        random.Random(seed).shuffle(items)
+        slices = [items[i::threads] for i in range(threads)]
+        done = [0] * threads
+        errors = []
+        barrier = threading.Barrier(threads + 1)
+
+        def worker(index):
+            barrier.wait()
+            try:
+                ops = bench.function(ctx, slices[index])
+                done[index] = len(slices[index]) if ops is None else ops
+            except BaseException as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=worker, args=(i,))
+                   for i in range(threads)]
+        for w in workers:
+            w.start()
+        barrier.wait()
+        start = _clock()
+        for w in workers:
+            w.join()
+        seconds = _clock() - start
+        if errors:
+            raise errors[0]
+    finally:
+        ctx.close()
+
+    ops = sum(done)
+    return {
+        'benchmark': name,
+        'method': method,
+        'env': env,
+        'threads': threads,
+        'records': records,
+        'key_size': key_size,
+        'value_size': value_size,
+        'ops': ops,
+        'seconds': seconds,
+        'ops_per_sec': ops / seconds if seconds > 0 else 0.0,
+    }
+
+
+def run(benchmarks=None, methods=None, envs=None, threads=(1,),
+        key_sizes=(16,), value_sizes=(100,), records=10000, progress=None,
+        **kwargs):
+    """Runs every supported combination of the parameters given (all the
+    benchmarks, access methods and environments by default), and returns
+    the list of results.  'progress', if given, is called with every
+    result."""
+    results = []
+    for name in benchmarks or sorted(BENCHMARKS):
+        for method in methods or METHODS:
+            for env in envs or ENVIRONMENTS:
+                for n in threads:
+                    for key_size in key_sizes:
+                        for value_size in value_sizes:
+                            r = run_one(name, method, env, n, records,
+                                        key_size, value_size, **kwargs)
+                            if r is None:
+                                continue
+                            results.append(r)
+                            if progress is not None:
+                                progress(r)
+    return results
+
+
+def system_info():
+    return {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'berkeleydb': db.__version__,
+        'berkeley_db': '%d.%d.%d' % db.version(),
+    }
+
+
+_KEY = ('benchmark', 'method', 'env', 'threads', 'records', 'key_size',
+        'value_size')
+
+
+def compare(old, new, tolerance=0.1):
+    """Compares two lists of results, matching them by benchmark and
+    parameters.  Returns a list of (key, old ops/s, new ops/s, ratio,
+    regression) tuples, where 'regression' is true if the new throughput
+    is lower than the old one by more than 'tolerance' (a fraction).
+    """
+    previous = {tuple(r[k] for k in _KEY): r for r in old}
+    comparison = []
+    for r in new:
+        key = tuple(r[k] for k in _KEY)
+        if key not in previous:
+            continue
+        before = previous[key]['ops_per_sec']
+        after = r['ops_per_sec']
+        ratio = after / before if before else float('inf')
+        comparison.append((key, before, after, ratio,
+                           ratio < 1.0 - tolerance))
+    return comparison
+
+
+from . import micro     # Registers the benchmarks
@@ -0,0 +1,110 @@
+"""Command line interface of berkeleydb.bench:
+
+    python -m berkeleydb.bench --help
+"""
+
+import argparse
+import json
+import sys
+
+from . import (BENCHMARKS, METHODS, ENVIRONMENTS, run, compare,
+               system_info)
+
+
+def _names(valid):
+    def parse(text):
+        names = [name.strip() for name in text.split(',') if name.strip()]
+        for name in names:
+            if name not in valid:
+                raise argparse.ArgumentTypeError(
+                        "%r is not one of %s" % (name, ', '.join(valid)))
+        return names
+    return parse
+
+
+def _ints(text):
+    return [int(i) for i in text.split(',')]
+
+
+def _print_result(r):
+    print('%-18s %-6s %-6s %3d thr  k=%-4d v=%-6d %12.0f ops/s' %
+          (r['benchmark'], r['method'], r['env'], r['threads'],
+           r['key_size'], r['value_size'], r['ops_per_sec']))
+    sys.stdout.flush()
+
+
+def _compare(old_file, new_file, tolerance):
+    with open(old_file) as f:
+        old = json.load(f)['results']
+    with open(new_file) as f:
+        new = json.load(f)['results']
+    regressions = 0
+    for key, before, after, ratio, regression in compare(old, new,
+                                                         tolerance):
+        name, method, env, threads = key[:4]
+        print('%-18s %-6s %-6s %3d thr %12.0f -> %12.0f ops/s %+7.1f%%%s' %
+              (name, method, env, threads, before, after,
+               (ratio - 1.0) * 100, '  REGRESSION' if regression else ''))
+        regressions += regression
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m berkeleydb.bench',
+                                     description='Benchmarks of the '
+                                     'berkeleydb API.')
+    parser.add_argument('-b', '--benchmarks', type=_names(sorted(BENCHMARKS)),
+                        help='comma separated benchmarks to run '
+                        '(default: all): %s' % ', '.join(sorted(BENCHMARKS)))
+    parser.add_argument('-m', '--methods', type=_names(list(METHODS)),
+                        help='access methods (default: all): %s' %
+                        ', '.join(METHODS))
+    parser.add_argument('-e', '--envs', type=_names(list(ENVIRONMENTS)),
+                        help='environments (default: all): %s' %
+                        ', '.join(ENVIRONMENTS))
+    parser.add_argument('-t', '--threads', type=_ints, default=[1],
+                        help='comma separated thread counts (default: 1)')
+    parser.add_argument('-k', '--key-sizes', type=_ints, default=[16],
+                        help='key sizes of Btree and Hash databases '
+                        '(default: 16)')
+    parser.add_argument('-v', '--value-sizes', type=_ints, default=[100],
+                        help='value sizes (default: 100)')
+    parser.add_argument('-n', '--records', type=int, default=10000,
+                        help='records, and operations, per run '
+                        '(default: 10000)')
+    parser.add_argument('--cachesize', type=int, default=64,
+                        help='cache size, in megabytes (default: 64)')
+    parser.add_argument('--pagesize', type=int, default=0,
+                        help='page size (default: Berkeley DB default)')
+    parser.add_argument('-o', '--output',
+                        help='write the results to this JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two JSON result files, instead of '
+                        'running the benchmarks.  Exit status is 1 if '
+                        'there are regressions.')
+    parser.add_argument('--tolerance', type=float, default=10.0,
+                        help='throughput loss, in percent, considered a '
+                        'regression by --compare (default: 10)')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return _compare(args.compare[0], args.compare[1],
+                        args.tolerance / 100.0)
+
+    config = {
+        'benchmarks': args.benchmarks, 'methods': args.methods,
+        'envs': args.envs, 'threads': args.threads,
+        'key_sizes': args.key_sizes, 'value_sizes': args.value_sizes,
+        'records': args.records, 'cachesize': args.cachesize * 1024 * 1024,
+        'pagesize': args.pagesize,
+    }
+    results = run(progress=_print_result, **config)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'system': system_info(), 'config': config,
+                       'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
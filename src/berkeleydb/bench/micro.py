@@ -0,0 +1,182 @@
+#-------------------------------------------------------------------------
+#  The benchmarks of berkeleydb.bench, one operation of the API each.
+#-------------------------------------------------------------------------
+
+"""The benchmarks run by berkeleydb.bench.
+
+Each one times an operation of the API; see benchmark() for the
+meaning of the arguments.
+"""
+
+from .. import db, dbpool
+from . import benchmark, TRANSACTIONAL
+
+
+@benchmark('get')
+def get(ctx, items):
+    d, keys = ctx.db, ctx.keys
+    for i in items:
+        d.get(keys[i])
+
+
+@benchmark('put', methods=('btree', 'hash', 'recno', 'queue'), load=False,
+           writes=True)
+def put(ctx, items):
+    d, keys, value = ctx.db, ctx.keys, ctx.value
+    for i in items:
+        d.put(keys[i], value(i))
+
+
+@benchmark('update', writes=True)
+def update(ctx, items):
+    d, keys, value = ctx.db, ctx.keys, ctx.value
+    for i in items:
+        d.put(keys[i], value(i + 1))
+
+
+@benchmark('delete', writes=True)
+def delete(ctx, items):
+    d, keys = ctx.db, ctx.keys
+    for i in items:
+        d.delete(keys[i])
+
+
+@benchmark('cursor_scan')
+def cursor_scan(ctx, items):
+    # Every thread scans the whole database: an operation per record
+    c = ctx.db.cursor()
+    ops = 0
+    try:
+        rec = c.first()
+        while rec is not None:
+            ops += 1
+            rec = c.next()
+    finally:
+        c.close()
+    return ops
+
+
+@benchmark('cursor_set_range', methods=('btree',))
+def cursor_set_range(ctx, items):
+    c = ctx.db.cursor()
+    keys = ctx.keys
+    try:
+        for i in items:
+            c.set_range(keys[i])
+    finally:
+        c.close()
+
+
+def _setup_pool(ctx):
+    ctx.pool = dbpool.DBPool(ctx.env, 'bench.db', flags=db.DB_THREAD)
+    ctx.dbs.append(ctx.pool)
+
+
+@benchmark('pool_new_cursor', methods=('btree', 'hash', 'recno', 'queue'),
+           setup=_setup_pool)
+def pool_new_cursor(ctx, items):
+    # A new cursor per lookup, to compare with pool_cursor
+    pool, keys = ctx.pool, ctx.keys
+    for i in items:
+        with pool.handle() as d:
+            c = d.cursor()
+            try:
+                c.set(keys[i])
+            finally:
+                c.close()
+
+
+@benchmark('pool_cursor', methods=('btree', 'hash', 'recno', 'queue'),
+           setup=_setup_pool)
+def pool_cursor(ctx, items):
+    pool, keys = ctx.pool, ctx.keys
+    for i in items:
+        with pool.cursor() as c:
+            c.set(keys[i])
+
+
+def _setup_secondary(ctx):
+    # The secondary key is the primary data, unique for every record
+    ctx.secondary = ctx.open_db('secondary.db', db.DB_BTREE)
+    ctx.in_txn(ctx.db.associate, ctx.secondary, lambda key, data: data)
+
+
+@benchmark('pget', methods=('btree', 'hash'), setup=_setup_secondary)
+def pget(ctx, items):
+    s, value = ctx.secondary, ctx.value
+    for i in items:
+        s.pget(value(i))
+
+
+def _setup_join(ctx):
+    # Two secondary indexes with duplicates, on the last 2 and last
+    # digit of the primary data, so a join matches about 10 records.
+    ctx.secondaries = []
+    for digits in (2, 1):
+        s = ctx.open_db('join%d.db' % digits, db.DB_BTREE,
+                        setflags=db.DB_DUP | db.DB_DUPSORT)
+        ctx.in_txn(ctx.db.associate, s,
+                   lambda key, data, digits=digits: data[-digits:])
+        ctx.secondaries.append(s)
+
+
+@benchmark('join', methods=('btree', 'hash'), setup=_setup_join)
+def join(ctx, items):
+    s1, s2 = ctx.secondaries
+    for i in items:
+        c1 = s1.cursor()
+        c2 = s2.cursor()
+        try:
+            c1.set(b'%02d' % (i % 100))
+            c2.set(b'%d' % (i % 10))
+            j = ctx.db.join([c1, c2])
+            try:
+                while j.get(0) is not None:
+                    pass
+            finally:
+                j.close()
+        finally:
+            c2.close()
+            c1.close()
+
+
+@benchmark('consume', methods=('queue',), writes=True)
+def consume(ctx, items):
+    d = ctx.db
+    for i in items:
+        d.consume()
+
+
+@benchmark('append', methods=('recno', 'queue', 'heap'), load=False,
+           writes=True)
+def append(ctx, items):
+    d, value = ctx.db, ctx.value
+    for i in items:
+        d.append(value(i))
+
+
+def _setup_sequence(ctx):
+    ctx.sequence = db.DBSequence(ctx.db)
+    # With a cache, the sequence can be used out of a transaction
+    ctx.sequence.set_cachesize(1000)
+    ctx.in_txn(ctx.sequence.open, b'sequence',
+               flags=db.DB_CREATE | db.DB_THREAD)
+    ctx.dbs.append(ctx.sequence)
+
+
+@benchmark('sequence_get', methods=('btree',), load=False, writes=True,
+           setup=_setup_sequence)
+def sequence_get(ctx, items):
+    s = ctx.sequence
+    for i in items:
+        s.get()
+
+
+@benchmark('txn_commit', methods=('btree', 'hash', 'recno', 'queue'),
+           envs=TRANSACTIONAL, load=False, writes=True)
+def txn_commit(ctx, items):
+    env, d, keys, value = ctx.env, ctx.db, ctx.keys, ctx.value
+    for i in items:
+        txn = env.txn_begin()
+        d.put(keys[i], value(i), txn=txn)
+        txn.commit()
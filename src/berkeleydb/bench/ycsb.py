@@ -0,0 +1,632 @@
+#-------------------------------------------------------------------------
+#  YCSB style workloads, to compare environment tunings under skew.
+#-------------------------------------------------------------------------
+
+"""YCSB style workload driver.
+
+    python -m berkeleydb.bench.ycsb -w A -n 100000 --operations 1000000 \\
+            --threads 8 --processes 2 --cachesize 256 --env mvcc
+
+The core workloads of the Yahoo! Cloud Serving Benchmark are defined in
+WORKLOADS:
+
+    A:  50% reads, 50% updates, zipfian.
+    B:  95% reads, 5% updates, zipfian.
+    C:  100% reads, zipfian.
+    D:  95% reads, 5% inserts, latest (the recent records are hotter).
+    E:  95% scans of up to 100 records, 5% inserts, zipfian.  Btree only.
+    F:  50% reads, 50% read-modify-writes, zipfian.
+
+Records are 'field_count' fields of 'field_length' bytes, stored as a
+single value.  An update writes a single field, with a partial put.
+Keys are "user" and a hash of the record number, so the hot records are
+spread over the database.
+
+The database is loaded first, then the clients (threads, in one or more
+processes) run the operations, and a report with the throughput and the
+latency percentiles of every kind of operation is returned.  Deadlocked
+operations are retried, and counted; their latency includes the failed
+attempts.  Clients only read the loaded records and the ones inserted
+by their process, up to the last one before which every insert is
+done, as YCSB does.  With more than one process, the
+environment is not private: its region files are in 'home', and it must
+be transactional or CDB.
+"""
+
+import math
+import multiprocessing
+import random
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from time import perf_counter as _clock
+from time import perf_counter_ns as _clock_ns
+
+from .. import db
+from . import ENVIRONMENTS, TRANSACTIONAL
+
+
+WORKLOADS = {
+    'A': {'read': 0.5, 'update': 0.5, 'distribution': 'zipfian'},
+    'B': {'read': 0.95, 'update': 0.05, 'distribution': 'zipfian'},
+    'C': {'read': 1.0, 'distribution': 'zipfian'},
+    'D': {'read': 0.95, 'insert': 0.05, 'distribution': 'latest'},
+    'E': {'scan': 0.95, 'insert': 0.05, 'distribution': 'zipfian'},
+    'F': {'read': 0.5, 'rmw': 0.5, 'distribution': 'zipfian'},
+}
+
+OPERATIONS = ('read', 'update', 'insert', 'scan', 'rmw')
+
+DURABILITY = {
+    'sync': 0,
+    'write-nosync': db.DB_TXN_WRITE_NOSYNC,
+    'nosync': db.DB_TXN_NOSYNC,
+}
+
+
+_FNV_OFFSET = 0xCBF29CE484222325
+_FNV_PRIME = 1099511628211
+_MASK = (1 << 64) - 1
+
+
+def fnv_hash(value):
+    """64 bits FNV-1a hash of an integer, as used by YCSB."""
+    h = _FNV_OFFSET
+    for _ in range(8):
+        h = ((h ^ (value & 0xff)) * _FNV_PRIME) & _MASK
+        value >>= 8
+    return h
+
+
+def make_key(keynum):
+    return b'user%d' % fnv_hash(keynum)
+
+
+class UniformGenerator:
+    def __init__(self, items, rng):
+        self.items = items
+        self.rng = rng
+
+    def next(self, items=None):
+        return self.rng.randrange(items or self.items)
+
+
+class ZipfianGenerator:
+    """Zipfian distribution over [0, items), the smaller values being
+    the more popular (Gray et al., "Quickly generating billion-record
+    synthetic databases").  The number of items can grow; the zeta
+    constant is updated incrementally.
+    """
+    _zeta_cache = {}    # (items, theta) -> zeta, shared by the clients
+
+    def __init__(self, items, rng, theta=0.99):
+        self.rng = rng
+        self.theta = theta
+        self.alpha = 1.0 / (1.0 - theta)
+        self.zeta2 = self._zeta(0, 2, 0.0)
+        self.items = 0
+        self.zetan = 0.0
+        self._grow(items)
+
+    def _zeta(self, start, end, initial):
+        theta = self.theta
+        return initial + sum(1.0 / (i + 1) ** theta
+                             for i in range(start, end))
+
+    def _grow(self, items):
+        if self.items == 0:
+            key = (items, self.theta)
+            if key not in self._zeta_cache:
+                self._zeta_cache[key] = self._zeta(0, items, 0.0)
+            self.zetan = self._zeta_cache[key]
+        else:
+            self.zetan = self._zeta(self.items, items, self.zetan)
+        self.items = items
+        if items <= 2:
+            # next() never gets to use it
+            self.eta = 0.0
+        else:
+            self.eta = ((1 - (2.0 / items) ** (1 - self.theta)) /
+                        (1 - self.zeta2 / self.zetan))
+
+    def next(self, items=None):
+        if items is not None and items > self.items:
+            self._grow(items)
+        u = self.rng.random()
+        uz = u * self.zetan
+        if uz < 1.0:
+            return 0
+        if uz < 1.0 + 0.5 ** self.theta:
+            return 1
+        n = self.items if items is None else items
+        return min(n - 1,
+                   int(n * (self.eta * u - self.eta + 1) ** self.alpha))
+
+
+class ScrambledZipfianGenerator(ZipfianGenerator):
+    """Zipfian popularity, with the popular items spread over the whole
+    range instead of being the first ones."""
+    def next(self, items=None):
+        n = self.items if items is None else items
+        return fnv_hash(ZipfianGenerator.next(self)) % n
+
+
+class LatestGenerator(ZipfianGenerator):
+    """The most recently inserted items are the most popular."""
+    def next(self, items=None):
+        n = self.items if items is None else items
+        return n - 1 - ZipfianGenerator.next(self, n)
+
+
+DISTRIBUTIONS = {
+    'uniform': UniformGenerator,
+    'zipfian': ScrambledZipfianGenerator,
+    'latest': LatestGenerator,
+}
+
+
+# Latency histograms: 16 buckets per power of two, about 4% wide
+_SUB_BUCKETS = 16
+
+
+def _bucket(ns):
+    return int(math.log2(ns) * _SUB_BUCKETS) if ns > 1 else 0
+
+
+def _bucket_ns(bucket):
+    """Upper bound of a bucket, in nanoseconds."""
+    return 2.0 ** ((bucket + 1) / _SUB_BUCKETS)
+
+
+def percentile(histogram, fraction):
+    """Latency, in microseconds, under which 'fraction' of the operations
+    of a histogram (a Counter mapping buckets to operations) were done."""
+    total = sum(histogram.values())
+    if not total:
+        return 0.0
+    limit = fraction * total
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= limit:
+            return _bucket_ns(bucket) / 1000.0
+    return _bucket_ns(max(histogram)) / 1000.0
+
+
+class Config:
+    """Parameters of a run.  See the command line help for their meaning.
+    """
+    def __init__(self, workload='A', records=10000, operations=100000,
+                 threads=1, processes=1, method='btree', env='txn',
+                 distribution=None, field_count=10, field_length=100,
+                 max_scan=100, cachesize=64 * 1024 * 1024, pagesize=0,
+                 lk_partitions=0, durability='write-nosync', home=None,
+                 load=True, seed=None):
+        if workload not in WORKLOADS:
+            raise ValueError("Unknown workload %r" % workload)
+        if workload == 'E' and method != 'btree':
+            raise ValueError("Workload E (scans) needs a btree")
+        mix = WORKLOADS[workload]
+        writes = any(mix.get(op) for op in ('update', 'insert', 'rmw'))
+        if env == 'plain' and (processes > 1 or (writes and threads > 1)):
+            raise ValueError("Concurrent clients need locking: use the "
+                             "txn, mvcc or cdb environments")
+        self.workload = workload
+        self.records = records
+        self.operations = operations
+        self.threads = threads
+        self.processes = processes
+        self.method = method
+        self.env = env
+        self.distribution = distribution or mix['distribution']
+        self.field_count = field_count
+        self.field_length = field_length
+        self.max_scan = max_scan
+        self.cachesize = cachesize
+        self.pagesize = pagesize
+        self.lk_partitions = lk_partitions
+        self.durability = durability
+        self.home = home
+        self.load = load
+        self.seed = random.randrange(1 << 32) if seed is None else seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def _open(config, home, create):
+    env = db.DBEnv()
+    env.set_cachesize(0, config.cachesize)
+    if config.lk_partitions:
+        env.set_lk_partitions(config.lk_partitions)
+    transactional = config.env in TRANSACTIONAL
+    if transactional:
+        env.set_lk_detect(db.DB_LOCK_DEFAULT)
+        if DURABILITY[config.durability]:
+            env.set_flags(DURABILITY[config.durability], 1)
+    if config.env == 'mvcc':
+        env.set_flags(db.DB_TXN_SNAPSHOT, 1)
+    flags = ENVIRONMENTS[config.env] | db.DB_CREATE | db.DB_THREAD
+    if config.processes == 1:
+        flags |= db.DB_PRIVATE
+    env.open(home, flags)
+
+    d = db.DB(env)
+    if create and config.pagesize:
+        d.set_pagesize(config.pagesize)
+    flags = db.DB_CREATE | db.DB_THREAD
+    if transactional:
+        flags |= db.DB_AUTO_COMMIT
+    if config.env == 'mvcc':
+        flags |= db.DB_MULTIVERSION
+    dbtype = db.DB_BTREE if config.method == 'btree' else db.DB_HASH
+    d.open('usertable.db', dbtype=dbtype, flags=flags)
+    return env, d
+
+
+class _Client:
+    """Runs operations against the database, from a single thread."""
+    def __init__(self, config, env, d, index, inserts):
+        self.config = config
+        self.env = env
+        self.db = d
+        self.transactional = config.env in TRANSACTIONAL
+        self.rng = random.Random(config.seed * 1000 + index)
+        self.chooser = DISTRIBUTIONS[config.distribution](config.records,
+                                                          self.rng)
+        self.inserts = inserts
+        self.record_size = config.field_count * config.field_length
+        self.data = bytes(self.rng.getrandbits(8)
+                          for _ in range(2 * self.record_size))
+        mix = WORKLOADS[config.workload]
+        self.mix = []
+        total = 0.0
+        for op in OPERATIONS:
+            if mix.get(op):
+                total += mix[op]
+                self.mix.append((total, getattr(self, op), op))
+        self.histograms = {op: Counter() for op in OPERATIONS}
+        self.retries = 0
+        self._insert_index = None   # Of an insert being retried
+
+    def _value(self):
+        start = self.rng.randrange(self.record_size)
+        return self.data[start:start + self.record_size]
+
+    def _key(self):
+        inserts = self.inserts
+        return make_key(inserts.keynum(self.chooser.next(inserts.count())))
+
+    def read(self):
+        self.db.get(self._key())
+
+    def update(self):
+        length = self.config.field_length
+        field = self.rng.randrange(self.config.field_count)
+        self.db.put(self._key(), self._value()[:length],
+                    dlen=length, doff=field * length)
+
+    def insert(self):
+        # A retried insert keeps its record number, or the inserts after
+        # it would never be acknowledged
+        if self._insert_index is None:
+            self._insert_index = self.inserts.next()
+        index = self._insert_index
+        self.db.put(make_key(self.inserts.keynum(index)), self._value())
+        self._insert_index = None
+        self.inserts.done(index)
+
+    def scan(self):
+        c = self.db.cursor()
+        try:
+            rec = c.set_range(self._key())
+            for _ in range(self.rng.randint(1, self.config.max_scan) - 1):
+                if rec is None:
+                    break
+                rec = c.next()
+        finally:
+            c.close()
+
+    def rmw(self):
+        key = self._key()
+        length = self.config.field_length
+        field = self.rng.randrange(self.config.field_count)
+        if not self.transactional:
+            self.db.get(key)
+            self.db.put(key, self._value()[:length],
+                        dlen=length, doff=field * length)
+            return
+        txn = self.env.txn_begin()
+        try:
+            self.db.get(key, txn=txn, flags=db.DB_RMW)
+            self.db.put(key, self._value()[:length], txn=txn,
+                        dlen=length, doff=field * length)
+        except:
+            txn.abort()
+            raise
+        txn.commit()
+
+    def run(self, operations):
+        rng, mix, histograms = self.rng, self.mix, self.histograms
+        for _ in range(operations):
+            u = rng.random()
+            for limit, operation, name in mix:
+                if u < limit:
+                    break
+            start = _clock_ns()
+            while True:
+                try:
+                    operation()
+                except (db.DBLockDeadlockError, db.DBLockNotGrantedError):
+                    self.retries += 1
+                    continue
+                histograms[name][_bucket(_clock_ns() - start)] += 1
+                break
+
+
+class _Inserts:
+    """The records a process can read: the loaded ones, then the ones it
+    inserted, by index.  The processes insert interleaved record numbers,
+    after the loaded ones.  Like the acknowledged counter of YCSB, count()
+    only goes up to the last insert before which every insert is done,
+    so a record still being inserted is never read."""
+    def __init__(self, records, process, processes):
+        self._lock = threading.Lock()
+        self._records = records
+        self._process = process
+        self._step = processes
+        self._next = records
+        self._count = records
+        self._done = set()      # Indexes done, above count()
+
+    def keynum(self, index):
+        """The record number of the readable record 'index'."""
+        if index < self._records:
+            return index
+        return (self._records + self._process +
+                (index - self._records) * self._step)
+
+    def next(self):
+        """The index of a new insert."""
+        with self._lock:
+            index = self._next
+            self._next += 1
+            return index
+
+    def done(self, index):
+        with self._lock:
+            self._done.add(index)
+            while self._count in self._done:
+                self._done.remove(self._count)
+                self._count += 1
+
+    def count(self):
+        return self._count
+
+
+def _run_clients(config, home, process, start):
+    """Runs the threads of a client process; 'start' is called when they
+    are ready.  Returns the operations done, the histograms, the retries
+    and the seconds taken."""
+    env, d = _open(config, home, create=False)
+    try:
+        inserts = _Inserts(config.records, process, config.processes)
+        clients_count = config.threads * config.processes
+        clients = [_Client(config, env, d, process * config.threads + i,
+                           inserts) for i in range(config.threads)]
+        share = [config.operations // clients_count] * config.threads
+        if process == 0:
+            share[0] += config.operations % clients_count
+        barrier = threading.Barrier(config.threads + 1)
+        errors = []
+
+        def worker(client, operations):
+            barrier.wait()
+            try:
+                client.run(operations)
+            except BaseException as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=worker, args=(c, n))
+                   for c, n in zip(clients, share)]
+        for w in workers:
+            w.start()
+        start()
+        barrier.wait()
+        t0 = _clock()
+        for w in workers:
+            w.join()
+        seconds = _clock() - t0
+        if errors:
+            raise errors[0]
+    finally:
+        d.close()
+        env.close()
+
+    histograms = {op: Counter() for op in OPERATIONS}
+    for c in clients:
+        for op, h in c.histograms.items():
+            histograms[op].update(h)
+    return {'operations': sum(share), 'seconds': seconds,
+            'histograms': histograms,
+            'retries': sum(c.retries for c in clients)}
+
+
+def _client_process(config, home, process, barrier, results):
+    try:
+        result = _run_clients(config, home, process, barrier.wait)
+    except BaseException as e:
+        barrier.abort()
+        result = {'error': repr(e)}
+    results.put(result)
+
+
+def load(config, home):
+    """Loads the initial records."""
+    env, d = _open(config, home, create=True)
+    try:
+        rng = random.Random(config.seed)
+        size = config.field_count * config.field_length
+        data = bytes(rng.getrandbits(8) for _ in range(2 * size))
+        for keynum in range(config.records):
+            start = rng.randrange(size)
+            d.put(make_key(keynum), data[start:start + size])
+    finally:
+        d.close()
+        env.close()
+
+
+def run(config):
+    """Loads the database, if asked for, runs the workload and returns
+    the report."""
+    home = config.home
+    temporary = home is None
+    if temporary:
+        home = tempfile.mkdtemp(prefix='berkeleydb-ycsb-')
+    try:
+        if config.load:
+            t0 = _clock()
+            load(config, home)
+            load_seconds = _clock() - t0
+        else:
+            load_seconds = 0.0
+
+        if config.processes == 1:
+            parts = [_run_clients(config, home, 0, lambda: None)]
+        else:
+            # Forking a process with an open environment is not safe,
+            # so the clients start from scratch.
+            mp = multiprocessing.get_context('spawn')
+            barrier = mp.Barrier(config.processes)
+            results = mp.Queue()
+            processes = [mp.Process(target=_client_process,
+                                    args=(config, home, i, barrier, results))
+                         for i in range(config.processes)]
+            for p in processes:
+                p.start()
+            parts = [results.get() for p in processes]
+            for p in processes:
+                p.join()
+            for part in parts:
+                if 'error' in part:
+                    raise RuntimeError("Client process failed: %s" %
+                                       part['error'])
+    finally:
+        if temporary:
+            shutil.rmtree(home, ignore_errors=True)
+
+    return report(config, parts, load_seconds)
+
+
+def report(config, parts, load_seconds=0.0):
+    """Merges the results of the client processes."""
+    operations = sum(p['operations'] for p in parts)
+    seconds = max(p['seconds'] for p in parts)
+    histograms = {op: Counter() for op in OPERATIONS}
+    for p in parts:
+        for op, h in p['histograms'].items():
+            histograms[op].update(h)
+    ops = {}
+    for op, h in histograms.items():
+        count = sum(h.values())
+        if not count:
+            continue
+        ops[op] = {
+            'count': count,
+            'p50_us': percentile(h, 0.5),
+            'p95_us': percentile(h, 0.95),
+            'p99_us': percentile(h, 0.99),
+            'p999_us': percentile(h, 0.999),
+            'max_us': _bucket_ns(max(h)) / 1000.0,
+        }
+    return {
+        'config': config.as_dict(),
+        'load_seconds': load_seconds,
+        'operations': operations,
+        'seconds': seconds,
+        'throughput': operations / seconds if seconds > 0 else 0.0,
+        'retries': sum(p['retries'] for p in parts),
+        'latency': ops,
+    }
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog='python -m berkeleydb.bench.ycsb',
+                                     description='YCSB style workloads.')
+    parser.add_argument('-w', '--workload', default='A',
+                        choices=sorted(WORKLOADS))
+    parser.add_argument('-n', '--records', type=int, default=10000,
+                        help='records loaded (default: 10000)')
+    parser.add_argument('--operations', type=int, default=100000,
+                        help='operations run (default: 100000)')
+    parser.add_argument('-t', '--threads', type=int, default=1,
+                        help='client threads per process (default: 1)')
+    parser.add_argument('-p', '--processes', type=int, default=1,
+                        help='client processes (default: 1)')
+    parser.add_argument('-m', '--method', default='btree',
+                        choices=['btree', 'hash'])
+    parser.add_argument('-e', '--env', default='txn',
+                        choices=list(ENVIRONMENTS))
+    parser.add_argument('-d', '--distribution', choices=list(DISTRIBUTIONS),
+                        help='key distribution (default: the workload one)')
+    parser.add_argument('--field-count', type=int, default=10)
+    parser.add_argument('--field-length', type=int, default=100)
+    parser.add_argument('--max-scan', type=int, default=100,
+                        help='maximum records per scan (default: 100)')
+    parser.add_argument('--cachesize', type=int, default=64,
+                        help='cache size, in megabytes (default: 64)')
+    parser.add_argument('--pagesize', type=int, default=0)
+    parser.add_argument('--lk-partitions', type=int, default=0,
+                        help='DBEnv.set_lk_partitions() '
+                        '(default: Berkeley DB default)')
+    parser.add_argument('--durability', default='write-nosync',
+                        choices=list(DURABILITY),
+                        help='commit durability (default: write-nosync)')
+    parser.add_argument('--home',
+                        help='environment directory (default: temporary)')
+    parser.add_argument('--no-load', action='store_true',
+                        help="don't load the records, use those in --home")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('-o', '--output',
+                        help='write the report to this JSON file')
+    args = parser.parse_args(argv)
+    if args.no_load and not args.home:
+        parser.error('--no-load needs --home')
+
+    config = Config(workload=args.workload, records=args.records,
+                    operations=args.operations, threads=args.threads,
+                    processes=args.processes, method=args.method,
+                    env=args.env, distribution=args.distribution,
+                    field_count=args.field_count,
+                    field_length=args.field_length, max_scan=args.max_scan,
+                    cachesize=args.cachesize * 1024 * 1024,
+                    pagesize=args.pagesize, lk_partitions=args.lk_partitions,
+                    durability=args.durability, home=args.home,
+                    load=not args.no_load, seed=args.seed)
+    result = run(config)
+
+    print('Workload %s, %s, %s environment, %d x %d clients' %
+          (config.workload, config.method, config.env, config.processes,
+           config.threads))
+    print('%d operations in %.2f s: %.0f ops/s, %d deadlock retries' %
+          (result['operations'], result['seconds'], result['throughput'],
+           result['retries']))
+    print('%-8s %10s %10s %10s %10s %10s %10s' %
+          ('', 'count', 'p50 us', 'p95 us', 'p99 us', 'p99.9 us', 'max us'))
+    for op, s in result['latency'].items():
+        print('%-8s %10d %10.1f %10.1f %10.1f %10.1f %10.1f' %
+              (op, s['count'], s['p50_us'], s['p95_us'], s['p99_us'],
+               s['p999_us'], s['max_us']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
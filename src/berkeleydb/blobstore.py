@@ -0,0 +1,287 @@
+#-------------------------------------------------------------------------
+#  Large objects stored as fixed size chunks of a Btree database.
+#-------------------------------------------------------------------------
+
+"""Store of large objects, split in chunks, in a DB.
+
+    store = BlobStore(d, chunk_size=256 * 1024, env=env, threads=4)
+    store.put(b'video', data)
+    with open('movie.mkv', 'rb') as f:
+        store.upload(b'movie', f)         # In one transaction
+    head = store.get(b'movie', 0, 1024)   # A ranged read
+    with open('copy.mkv', 'wb') as f:
+        store.download(b'movie', f)
+    store.delete(b'video')
+    store.close()
+
+An object is stored as a manifest record, b'M' + oid, with the size of
+the object, its chunk size and its generation, and as chunks of
+chunk_size bytes (the last one can be shorter), under the keys b'C' +
+length of the oid + oid + generation + chunk number, so the chunks of an
+object are contiguous and in order in a Btree database.
+
+Every put() or upload() writes the chunks of a new generation, next to
+the ones of the current version, then switches the manifest to it and
+deletes the previous generation.  Readers look the manifest up first, so
+they never mix the bytes of two versions, and an interrupted put()
+leaves the previous version in place.  get() starts again if the object
+is replaced while it reads it; download() raises DBError then.  Puts of
+the same object must not run concurrently, unless in transactions.
+
+Without a transaction, the chunks of put() and get() are written and
+read by 'threads' threads in parallel; the database must have been opened
+with DB_THREAD then.  A transaction can't be used by several threads at
+once, so the chunks are handled in turn in a transaction.  upload() and
+download() stream the object from and to file objects, a chunk at a time,
+so memory use is bounded by the chunk size.
+"""
+
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import db
+
+
+_MANIFEST = struct.Struct('>QIQ')   # Size, chunk size, generation
+_CHUNK = struct.Struct('>QQ')       # Generation, chunk number
+
+
+def _manifest_key(oid):
+    return b'M' + oid
+
+
+def _chunk_prefix(oid):
+    return b'C' + struct.pack('>H', len(oid)) + oid
+
+
+class BlobStore:
+    def __init__(self, d, chunk_size=256 * 1024, env=None, threads=4):
+        """'d' is an opened Btree database.  If the environment 'env' is
+        given and transactional, upload() runs in its own transaction
+        when none is given.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be >= 1")
+        self.db = d
+        self.chunk_size = chunk_size
+        self.env = env
+        self.threads = threads
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _map(self, function, items, txn):
+        # In parallel, unless there is a transaction
+        if txn is not None or self.threads <= 1 or len(items) <= 1:
+            return [function(item) for item in items]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                        self.threads, thread_name_prefix='berkeleydb-blobs')
+            executor = self._executor
+        return list(executor.map(function, items))
+
+    def _chunk_key(self, oid, generation, n):
+        return _chunk_prefix(oid) + _CHUNK.pack(generation, n)
+
+    def _manifest(self, oid, txn):
+        # (size, chunk size, generation), or None
+        manifest = self.db.get(_manifest_key(oid), txn=txn)
+        if manifest is None:
+            return None
+        return _MANIFEST.unpack(manifest)
+
+    def stat(self, oid, txn=None):
+        """Returns (size, chunk size) of the object, or None if it is not
+        in the store."""
+        manifest = self._manifest(oid, txn)
+        if manifest is None:
+            return None
+        return manifest[:2]
+
+    def size(self, oid, txn=None):
+        stat = self.stat(oid, txn=txn)
+        if stat is None:
+            raise KeyError(oid)
+        return stat[0]
+
+    def __contains__(self, oid):
+        return self.stat(oid) is not None
+
+    def oids(self, txn=None):
+        """Returns the list of object ids in the store."""
+        result = []
+        c = self.db.cursor(txn=txn)
+        try:
+            rec = c.set_range(b'M')
+            while rec is not None and rec[0][:1] == b'M':
+                result.append(rec[0][1:])
+                rec = c.next()
+        finally:
+            c.close()
+        return result
+
+    def _delete_generation(self, oid, generation, txn):
+        prefix = _chunk_prefix(oid) + struct.pack('>Q', generation)
+        c = self.db.cursor(txn=txn)
+        try:
+            rec = c.set_range(prefix, dlen=0, doff=0)
+            while rec is not None and rec[0].startswith(prefix):
+                c.delete()
+                rec = c.next(dlen=0, doff=0)
+        finally:
+            c.close()
+
+    def _start(self, oid, txn):
+        # Returns the previous manifest and the new generation, cleared
+        # of the chunks of an interrupted put()
+        previous = self._manifest(oid, txn)
+        generation = 0 if previous is None else previous[2] + 1
+        self._delete_generation(oid, generation, txn)
+        return previous, generation
+
+    def _finish(self, oid, previous, generation, size, chunk_size, txn):
+        # The manifest makes the new version visible, then the chunks of
+        # the previous one are dropped.
+        self.db.put(_manifest_key(oid),
+                    _MANIFEST.pack(size, chunk_size, generation), txn=txn)
+        if previous is not None:
+            self._delete_generation(oid, previous[2], txn)
+
+    def put(self, oid, data, txn=None):
+        """Stores the bytes-like 'data' as the object 'oid', replacing it
+        if it exists."""
+        view = memoryview(data).cast('B')
+        cs = self.chunk_size
+        d = self.db
+        previous, generation = self._start(oid, txn)
+
+        def put_chunk(n):
+            # DB.put() only takes bytes
+            d.put(self._chunk_key(oid, generation, n),
+                  bytes(view[n * cs:(n + 1) * cs]), txn=txn)
+
+        self._map(put_chunk, range(-(-len(view) // cs)), txn)
+        self._finish(oid, previous, generation, len(view), cs, txn)
+
+    def upload(self, oid, fileobj, txn=None):
+        """Stores the content of the binary file object 'fileobj', read a
+        chunk at a time, as the object 'oid'.  Returns its size."""
+        if txn is None and self.env is not None and \
+                self.env.get_open_flags() & db.DB_INIT_TXN:
+            txn = self.env.txn_begin()
+            try:
+                size = self.upload(oid, fileobj, txn)
+            except BaseException:
+                txn.abort()
+                raise
+            txn.commit()
+            return size
+
+        cs = self.chunk_size
+        buf = bytearray(cs)
+        view = memoryview(buf)
+        size = n = 0
+        previous, generation = self._start(oid, txn)
+        while True:
+            got = 0
+            # Fill the chunk, as reads can be short
+            while got < cs:
+                r = fileobj.readinto(view[got:])
+                if not r:
+                    break
+                got += r
+            if not got:
+                break
+            self.db.put(self._chunk_key(oid, generation, n),
+                        bytes(view[:got]), txn=txn)
+            size += got
+            n += 1
+            if got < cs:
+                break
+        self._finish(oid, previous, generation, size, cs, txn)
+        return size
+
+    def _ranges(self, oid, offset, size, txn):
+        manifest = self._manifest(oid, txn)
+        if manifest is None:
+            raise KeyError(oid)
+        total, cs, generation = manifest
+        if offset < 0:
+            raise ValueError("negative offset")
+        end = total if size is None or size < 0 else min(total,
+                                                         offset + size)
+        # (chunk number, offset in the chunk, length, offset in the result)
+        ranges = []
+        pos = offset
+        while pos < end:
+            n, start = divmod(pos, cs)
+            length = min(cs - start, end - pos)
+            ranges.append((n, start, length, pos - offset))
+            pos += length
+        return ranges, max(end - offset, 0), cs, generation
+
+    def get(self, oid, offset=0, size=None, txn=None):
+        """Returns 'size' bytes (up to the end by default) of the object
+        'oid', from 'offset'.  Only the chunks of the range are read,
+        straight into the result.  Raises KeyError if there is no such
+        object."""
+        while True:
+            ranges, total, cs, generation = self._ranges(oid, offset, size,
+                                                         txn)
+            result = bytearray(total)
+            view = memoryview(result)
+            d = self.db
+
+            def get_chunk(r):
+                n, start, length, pos = r
+                got = d.get_into(self._chunk_key(oid, generation, n),
+                                 view[pos:pos + length], doff=start, txn=txn)
+                return n if got != length else None
+
+            missing = [n for n in self._map(get_chunk, ranges, txn)
+                       if n is not None]
+            if not missing:
+                return bytes(result)
+            # Unless the object was replaced meanwhile
+            manifest = self._manifest(oid, txn)
+            if manifest is None:
+                raise KeyError(oid)
+            if manifest[2] == generation:
+                raise db.DBError("chunk %d of %r is missing" %
+                                 (missing[0], oid))
+
+    def download(self, oid, fileobj, offset=0, size=None, txn=None):
+        """Writes the object 'oid', or a range of it, to the binary file
+        object 'fileobj', a chunk at a time.  Returns the number of bytes
+        written."""
+        ranges, total, cs, generation = self._ranges(oid, offset, size, txn)
+        buf = memoryview(bytearray(cs))
+        for n, start, length, pos in ranges:
+            got = self.db.get_into(self._chunk_key(oid, generation, n),
+                                   buf[:length], doff=start, txn=txn)
+            if got != length:
+                raise db.DBError("chunk %d of %r is missing" % (n, oid))
+            fileobj.write(buf[:length])
+        return total
+
+    def delete(self, oid, txn=None):
+        """Deletes the object 'oid'.  Raises KeyError if there is no such
+        object."""
+        manifest = self._manifest(oid, txn)
+        if manifest is None:
+            raise KeyError(oid)
+        self.db.delete(_manifest_key(oid), txn=txn)
+        self._delete_generation(oid, manifest[2], txn)
@@ -0,0 +1,298 @@
+#-------------------------------------------------------------------------
+#  A persistent Bloom filter in front of a DB, for fast negative lookups.
+#-------------------------------------------------------------------------
+
+"""Bloom filter sidecar of a DB.
+
+    d = BloomDB(db, 'users.bloom', error_rate=0.01)
+    d.put(b'key', b'data')          # Adds the key to the filter
+    d.get(b'missing')               # None, without a DB lookup (mostly)
+    d.exists(b'key')
+    d.rebuild()                     # Drops the keys deleted since
+    d.close()                       # Saves the filter
+
+Lookups of keys which aren't in the filter return without a DB->get(), so
+misses don't walk the Btree and pull its pages into the cache.  A key
+which is in the filter is looked up in the database; 'error_rate' is the
+proportion of misses doing so while the database holds no more than
+'capacity' keys.
+
+The filter is saved to its file by save() and close().  The file is
+marked as dirty on the first put() after that, so a filter which wasn't
+saved, after a crash, is rebuilt with a scan of the database when it is
+opened again, like a missing one.  Every put must go through the BloomDB
+then, or the filter would miss keys.  Deleted keys stay in the filter
+until rebuild().  After close(), the BloomDB methods using the filter
+raise DBError.
+
+The bits of a key are computed in the extension, from its MurmurHash3
+and xxHash (see DB.set_h_hash()).
+"""
+
+import math
+import os
+import struct
+import threading
+
+from . import db
+from ._berkeleydb import _bloom_add, _bloom_check
+
+
+# Magic, version, clean, k, capacity, error rate, count, size of the bits
+_HEADER = struct.Struct('>4sBBBxQdQQ')
+_MAGIC = b'BDBF'
+_VERSION = 1
+_CLEAN_OFFSET = 5
+
+
+# The encodings of DB.set_key_type(), so the int keys returned by a scan
+# and the bytes given to put() have the same bits
+_KEY_TYPES = {
+    'uint32_be': struct.Struct('>I').pack,
+    'uint64_be': struct.Struct('>Q').pack,
+    'int64_ordered': lambda key: struct.pack('>Q', key + (1 << 63)),
+}
+
+
+def _key_bytes(key):
+    # Recno and Queue keys are ints
+    if isinstance(key, int):
+        return key.to_bytes(9, 'big', signed=True)
+    return key
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        """A filter of 'capacity' keys, with 'error_rate' false
+        positives."""
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        nbits = -capacity * math.log(error_rate) / math.log(2) ** 2
+        nbytes = max(int(math.ceil(nbits / 8)), 1)
+        self.k = max(int(round(nbytes * 8 / capacity * math.log(2))), 1)
+        self.bits = bytearray(nbytes)
+        self.count = 0
+
+    @classmethod
+    def _from_state(cls, capacity, error_rate, k, bits, count):
+        bf = cls.__new__(cls)
+        bf.capacity, bf.error_rate = capacity, error_rate
+        bf.k, bf.bits, bf.count = k, bits, count
+        return bf
+
+    def add(self, key):
+        """Adds 'key', returns whether it was (maybe) in the filter."""
+        found = _bloom_add(self.bits, _key_bytes(key), self.k)
+        if not found:
+            self.count += 1
+        return found
+
+    def __contains__(self, key):
+        return _bloom_check(self.bits, _key_bytes(key), self.k)
+
+    def __len__(self):
+        """The number of keys added, approximately."""
+        return self.count
+
+    def false_positive_rate(self):
+        """The expected false positive rate, with the keys added."""
+        return (1 - math.exp(-self.k * self.count / (len(self.bits) * 8))) \
+            ** self.k
+
+    def clear(self):
+        self.bits[:] = bytes(len(self.bits))
+        self.count = 0
+
+
+class BloomDB:
+    def __init__(self, d, path, capacity=None, error_rate=0.01, txn=None):
+        """'d' is an opened DB, and 'path' the file of its filter.  The
+        filter is rebuilt (in 'txn') if the file is missing, dirty, or
+        made for another capacity or error rate.  By default, the
+        capacity is the one of the file, or twice the number of keys of
+        the database when the filter is rebuilt (with a minimum of 1024).
+        """
+        self.db = d
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.filter = None
+        self._dirty = True
+        self._pending = None   # The keys put during a rebuild()
+        self._lock = threading.Lock()
+        self._closed = False
+        key_type = getattr(d, 'get_key_type', lambda: None)()
+        self._encode = _KEY_TYPES.get(key_type, _key_bytes)
+        if not self._load():
+            self.rebuild(txn=txn)
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return False
+                (magic, version, clean, k, capacity, error_rate, count,
+                 nbytes) = _HEADER.unpack(header)
+                if magic != _MAGIC or version != _VERSION or not clean:
+                    return False
+                if (self.capacity not in (None, capacity) or
+                        error_rate != self.error_rate):
+                    return False
+                bits = f.read(nbytes)
+        except FileNotFoundError:
+            return False
+        if len(bits) != nbytes:
+            return False
+        self.filter = BloomFilter._from_state(capacity, error_rate, k,
+                                              bytearray(bits), count)
+        self.capacity = capacity
+        self._dirty = False
+        return True
+
+    def _set_clean(self, clean):
+        try:
+            with open(self.path, 'r+b') as f:
+                f.seek(_CLEAN_OFFSET)
+                f.write(bytes([clean]))
+                f.flush()
+                os.fsync(f.fileno())
+        except FileNotFoundError:
+            pass
+
+    def _save(self):
+        bf = self.filter
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, 1, bf.k, bf.capacity,
+                                 bf.error_rate, bf.count, len(bf.bits)))
+            f.write(bf.bits)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    def _check_open(self):
+        # Returns the filter
+        if self._closed:
+            raise db.DBError(0, "BloomDB object has been closed")
+        return self.filter
+
+    def save(self):
+        """Writes the filter to its file, atomically."""
+        with self._lock:
+            self._check_open()
+            self._save()
+
+    def _add(self, key):
+        # Under the lock of save(), so a key can't miss in a clean file
+        key = self._key(key)
+        with self._lock:
+            bf = self._check_open()
+            if not self._dirty:
+                self._set_clean(0)
+                self._dirty = True
+            bf.add(key)
+            if self._pending is not None:
+                self._pending.append(key)
+
+    def _scan(self, txn):
+        # Only the keys, not the data
+        c = self.db.cursor(txn=txn)
+        try:
+            rec = c.first(dlen=0, doff=0)
+            while rec is not None:
+                yield self._key(rec[0])
+                rec = c.next_nodup(dlen=0, doff=0)
+        except db.DBNotFoundError:
+            pass
+        finally:
+            c.close()
+
+    def rebuild(self, txn=None):
+        """Makes a new filter from a scan of the keys of the database, and
+        saves it.  The keys put meanwhile are added to it too."""
+        with self._lock:
+            self._check_open()
+            self._pending = []
+        try:
+            capacity = self.capacity
+            if capacity is None:
+                capacity = max(2 * sum(1 for key in self._scan(txn)), 1024)
+            bf = BloomFilter(capacity, self.error_rate)
+            for key in self._scan(txn):
+                bf.add(key)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self._check_open()
+            for key in pending:
+                bf.add(key)
+            self.filter = bf
+            self._save()
+
+    def close(self):
+        with self._lock:
+            if self.filter is not None and self._dirty:
+                self._save()
+            self.filter = None
+            self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _key(self, key):
+        return self._encode(key) if isinstance(key, int) else key
+
+    def put(self, key, data, txn=None, flags=0, dlen=-1, doff=-1):
+        self._check_open()
+        if flags & db.DB_APPEND:
+            # The record number is only known once the record is put
+            recno = self.db.put(key, data, txn=txn, flags=flags)
+            self._add(recno)
+            return recno
+        # In the filter first, so readers don't miss the key
+        self._add(key)
+        return self.db.put(key, data, txn=txn, flags=flags, dlen=dlen,
+                           doff=doff)
+
+    def get(self, key, default=None, txn=None, flags=0, dlen=-1, doff=-1):
+        """Like DB.get(), but 'default' is returned for the keys which
+        aren't in the filter, even if set_get_returns_none(0) was
+        called."""
+        if self._key(key) not in self._check_open():
+            return default
+        return self.db.get(key, default, txn=txn, flags=flags, dlen=dlen,
+                           doff=doff)
+
+    def exists(self, key, txn=None, flags=0):
+        if self._key(key) not in self._check_open():
+            return False
+        return self.db.exists(key, txn=txn, flags=flags)
+
+    def delete(self, key, txn=None, flags=0):
+        return self.db.delete(key, txn=txn, flags=flags)
+
+    def __contains__(self, key):
+        return self.exists(key)
+
+    def __getitem__(self, key):
+        if self._key(key) not in self._check_open():
+            raise KeyError(key)
+        return self.db[key]
+
+    def __setitem__(self, key, data):
+        self.put(key, data)
+
+    def __delitem__(self, key):
+        del self.db[key]
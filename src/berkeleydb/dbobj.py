@@ -24,6 +24,7 @@
 import sys
 from collections.abc import MutableMapping
 from . import db
+from . import dbutils
 
 class DBEnv:
     def __init__(self, *args, **kwargs):
@@ -69,6 +70,10 @@ class DBEnv:
         return self._cobj.txn_checkpoint(*args, **kwargs)
     def txn_stat(self, *args, **kwargs):
         return self._cobj.txn_stat(*args, **kwargs)
+    def run_in_txn(self, *args, **kwargs):
+        return dbutils.run_in_txn(self, *args, **kwargs)
+    def run_in_txn_async(self, *args, **kwargs):
+        return dbutils.run_in_txn_async(self, *args, **kwargs)
     def set_tx_max(self, *args, **kwargs):
         return self._cobj.set_tx_max(*args, **kwargs)
     def set_tx_timestamp(self, *args, **kwargs):
@@ -0,0 +1,169 @@
+#-------------------------------------------------------------------------
+#  Pool of DB handles, and of their cursors, shared by worker threads.
+#-------------------------------------------------------------------------
+
+"""Thread-safe pool of opened DB handles of a DBEnv database.
+
+    pool = DBPool(env, 'data.db', dbtype=db.DB_BTREE,
+                  flags=db.DB_CREATE | db.DB_THREAD, max_handles=8)
+
+    with pool.handle() as d:
+        d.put(b'key', b'data')
+
+    with pool.cursor() as c:
+        rec = c.set_range(b'k')
+
+    pool.close()
+
+Handles are opened on demand, up to max_handles.  Threads asking for a
+handle when all of them are in use wait until one is released, so the
+pool bounds the number of handles, cursors and lockers used by the
+database.
+
+Cursors not bound to a transaction are kept, up to max_idle_cursors per
+handle, and the same cursor objects are handed out again, saving their
+creation and close.  Berkeley DB can't reset a cursor, so a reused
+cursor keeps the position it was left at: start with an absolute move
+(first(), last(), set(), set_range()...), not with next() or prev().
+A positioned cursor holds a lock on its page, and with DB_INIT_CDB on
+the whole database, so cursors are only kept in environments without
+locking (see reuse_cursors); otherwise they are closed when released.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from . import db
+
+
+class DBPoolError(db.DBError): pass
+
+
+class DBPool:
+    def __init__(self, env, filename, dbname=None, dbtype=db.DB_UNKNOWN,
+                 flags=0, mode=0o660, max_handles=8, max_idle_cursors=4,
+                 setup=None):
+        """'setup', if given, is called with every new DB object before
+        opening it, to configure it (set_flags(), set_pagesize()...).
+        """
+        if max_handles < 1:
+            raise ValueError("max_handles must be >= 1")
+        self.env = env
+        self.filename = filename
+        self.dbname = dbname
+        self.dbtype = dbtype
+        self.flags = flags
+        self.mode = mode
+        self.max_handles = max_handles
+        self.max_idle_cursors = max_idle_cursors
+        self.setup = setup
+        self.reuse_cursors = not (env.get_open_flags() &
+                                  (db.DB_INIT_LOCK | db.DB_INIT_CDB))
+        self._cond = threading.Condition()
+        self._idle = []        # DB handles ready to be used
+        self._handles = 0      # DB handles opened, in use or not
+        self._cursors = {}     # id(DB handle) -> idle cursors
+        self._closed = False
+
+    def __len__(self):
+        """Number of opened handles."""
+        return self._handles
+
+    def _open_handle(self):
+        d = db.DB(self.env)
+        try:
+            if self.setup is not None:
+                self.setup(d)
+            d.open(self.filename, self.dbname, self.dbtype, self.flags,
+                   self.mode)
+        except:
+            d.close()
+            raise
+        return d
+
+    def acquire(self, timeout=None):
+        """Returns a DB handle for the exclusive use of the caller, who
+        must give it back with release().  If all the handles are in use,
+        wait for one, up to timeout seconds if it is not None.
+        """
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise DBPoolError("The pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._handles < self.max_handles:
+                    self._handles += 1
+                    break
+                if not self._cond.wait(timeout):
+                    raise DBPoolError("Timeout waiting for a DB handle")
+
+        try:
+            return self._open_handle()
+        except:
+            with self._cond:
+                self._handles -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, d):
+        """Gives back a handle obtained with acquire()."""
+        with self._cond:
+            if not self._closed:
+                self._idle.append(d)
+                self._cond.notify()
+                return
+            self._handles -= 1
+        self._close_handle(d)
+
+    @contextmanager
+    def handle(self, timeout=None):
+        """Context manager version of acquire()/release()."""
+        d = self.acquire(timeout)
+        try:
+            yield d
+        finally:
+            self.release(d)
+
+    @contextmanager
+    def cursor(self, txn=None, flags=0, timeout=None):
+        """Context manager providing a cursor of a pooled handle.  Don't
+        close the cursor, the pool does it, or keeps it for later use.
+        A kept cursor is handed out again as it was left, positioned.
+        """
+        d = self.acquire(timeout)
+        try:
+            reusable = self.reuse_cursors and (txn is None) and (flags == 0)
+            idle = self._cursors.get(id(d))
+            if reusable and idle:
+                c = idle.pop()
+            else:
+                c = d.cursor(txn, flags)
+            try:
+                yield c
+            except:
+                reusable = False
+                raise
+            finally:
+                idle = self._cursors.setdefault(id(d), [])
+                if reusable and (len(idle) < self.max_idle_cursors):
+                    idle.append(c)
+                else:
+                    c.close()
+        finally:
+            self.release(d)
+
+    def _close_handle(self, d):
+        for c in self._cursors.pop(id(d), ()):
+            c.close()
+        d.close()
+
+    def close(self):
+        """Closes the idle handles, and the others when released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._handles -= len(idle)
+            self._cond.notify_all()
+        for d in idle:
+            self._close_handle(d)
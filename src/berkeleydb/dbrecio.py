@@ -2,189 +2,161 @@
 """
 File-like objects that read from or write to a berkeleydb record.
 
-This implements (nearly) all stdio methods.
-
-f = DBRecIO(db, key, txn=None)
-f.close()           # explicitly release resources held
-flag = f.isatty()   # always false
-pos = f.tell()      # get current position
-f.seek(pos)         # set current position
-f.seek(pos, mode)   # mode 0: absolute; 1: relative; 2: relative to EOF
-buf = f.read()      # read until EOF
-buf = f.read(n)     # read up to n bytes
-f.truncate([size])  # truncate file at to at most size (default: current pos)
-f.write(buf)        # write at current position
-f.writelines(list)  # for line in list: f.write(line)
+    f = DBRecIO(db, key, txn=None)  # An io.RawIOBase
+    n = f.readinto(buf) # read into a writable buffer, at the position
+    buf = f.read(n)     # read up to n bytes
+    buf = f.read()      # read until EOF
+    n = f.write(buf)    # write at current position
+    pos = f.tell()      # get current position
+    f.seek(pos, whence) # like io.IOBase.seek()
+    f.truncate([size])  # truncate the record (default: current pos)
+    f.close()           # explicitly release resources held
+
+    f = open(db, key, 'rb')         # Buffered, with readahead
+    shutil.copyfileobj(f, out)
+
+Only the bytes asked for are read or written, with partial gets and
+puts (dlen and doff), so a large record is streamed with bounded memory.
+readinto() reads straight into the buffer given, with DB.get_into().
+The record size is discovered with DB.get_size(); a missing record
+reads as empty, and is created by the first write.
 
 Notes:
 - fileno() is left unimplemented so that code which uses it triggers
   an exception early.
-- There's a simple test set (see end of this file) - not yet updated
-  for DBRecIO.
-- readline() is not implemented yet.
 
 
 From:
     Itamar Shtull-Trauring <itamar@maxnm.com>
 """
 
-import errno
-import string
+import io
 
-class DBRecIO:
+from . import db as _db
+
+
+DEFAULT_READAHEAD = 64 * 1024
+
+
+class DBRecIO(io.RawIOBase):
     def __init__(self, db, key, txn=None):
+        super().__init__()
         self.db = db
         self.key = key
         self.txn = txn
-        self.len = None
         self.pos = 0
-        self.closed = 0
-        self.softspace = 0
 
     def close(self):
         if not self.closed:
-            self.closed = 1
+            super().close()
             del self.db, self.txn
 
-    def isatty(self):
-        if self.closed:
-            raise ValueError("I/O operation on closed file")
-        return 0
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def _size(self):
+        try:
+            return self.db.get_size(self.key, txn=self.txn)
+        except (_db.DBNotFoundError, _db.DBKeyEmptyError):
+            return 0
 
-    def seek(self, pos, mode = 0):
-        if self.closed:
-            raise ValueError("I/O operation on closed file")
-        if mode == 1:
+    def seek(self, pos, whence=io.SEEK_SET):
+        self._checkClosed()
+        if whence == io.SEEK_CUR:
             pos = pos + self.pos
-        elif mode == 2:
-            pos = pos + self.len
-        self.pos = max(0, pos)
+        elif whence == io.SEEK_END:
+            pos = pos + self._size()
+        elif whence != io.SEEK_SET:
+            raise ValueError("invalid whence (%r)" % (whence, ))
+        if pos < 0:
+            raise ValueError("negative seek position %r" % (pos, ))
+        self.pos = pos
+        return pos
 
     def tell(self):
-        if self.closed:
-            raise ValueError("I/O operation on closed file")
+        self._checkClosed()
         return self.pos
 
-    def read(self, n = -1):
-        if self.closed:
-            raise ValueError("I/O operation on closed file")
-        if n < 0:
-            newpos = self.len
-        else:
-            newpos = min(self.pos+n, self.len)
-
-        dlen = newpos - self.pos
-
-        r = self.db.get(self.key, txn=self.txn, dlen=dlen, doff=self.pos)
-        self.pos = newpos
-        return r
-
-    __fixme = """
-    def readline(self, length=None):
-        if self.closed:
-            raise ValueError, "I/O operation on closed file"
-        if self.buflist:
-            self.buf = self.buf + string.joinfields(self.buflist, '')
-            self.buflist = []
-        i = string.find(self.buf, '\n', self.pos)
-        if i < 0:
-            newpos = self.len
-        else:
-            newpos = i+1
-        if length is not None:
-            if self.pos + length < newpos:
-                newpos = self.pos + length
-        r = self.buf[self.pos:newpos]
-        self.pos = newpos
-        return r
-
-    def readlines(self, sizehint = 0):
-        total = 0
-        lines = []
-        line = self.readline()
-        while line:
-            lines.append(line)
-            total += len(line)
-            if 0 < sizehint <= total:
-                break
-            line = self.readline()
-        return lines
-    """
+    def readinto(self, b):
+        self._checkClosed()
+        with memoryview(b) as view:
+            if not len(view):
+                return 0
+            n = self.db.get_into(self.key, view.cast('B'), doff=self.pos,
+                                 txn=self.txn)
+        if n is None:
+            return 0
+        self.pos += n
+        return n
+
+    def readall(self):
+        # A single partial get, instead of io.RawIOBase chunks
+        self._checkClosed()
+        size = self._size() - self.pos
+        if size <= 0:
+            return b''
+        data = self.db.get(self.key, txn=self.txn, dlen=size, doff=self.pos)
+        if data is None:
+            return b''
+        self.pos += len(data)
+        return data
 
     def truncate(self, size=None):
-        if self.closed:
-            raise ValueError("I/O operation on closed file")
+        self._checkClosed()
         if size is None:
             size = self.pos
         elif size < 0:
-            raise IOError(errno.EINVAL,
-                                      "Negative size not allowed")
-        elif size < self.pos:
-            self.pos = size
-        self.db.put(self.key, "", txn=self.txn, dlen=self.len-size, doff=size)
-
-    def write(self, s):
-        if self.closed:
-            raise ValueError("I/O operation on closed file")
-        if not s: return
-        if self.pos > self.len:
-            self.buflist.append('\0'*(self.pos - self.len))
-            self.len = self.pos
-        newpos = self.pos + len(s)
-        self.db.put(self.key, s, txn=self.txn, dlen=len(s), doff=self.pos)
-        self.pos = newpos
-
-    def writelines(self, list):
-        self.write(string.joinfields(list, ''))
-
-    def flush(self):
-        if self.closed:
-            raise ValueError("I/O operation on closed file")
-
-
-"""
-# A little test suite
-
-def _test():
-    import sys
-    if sys.argv[1:]:
-        file = sys.argv[1]
-    else:
-        file = '/etc/passwd'
-    lines = open(file, 'r').readlines()
-    text = open(file, 'r').read()
-    f = StringIO()
-    for line in lines[:-2]:
-        f.write(line)
-    f.writelines(lines[-2:])
-    if f.getvalue() != text:
-        raise RuntimeError, 'write failed'
-    length = f.tell()
-    print 'File length =', length
-    f.seek(len(lines[0]))
-    f.write(lines[1])
-    f.seek(0)
-    print 'First line =', repr(f.readline())
-    here = f.tell()
-    line = f.readline()
-    print 'Second line =', repr(line)
-    f.seek(-len(line), 1)
-    line2 = f.read(len(line))
-    if line != line2:
-        raise RuntimeError, 'bad result after seek back'
-    f.seek(len(line2), 1)
-    list = f.readlines()
-    line = list[-1]
-    f.seek(f.tell() - len(line))
-    line2 = f.read()
-    if line != line2:
-        raise RuntimeError, 'bad result after seek back from EOF'
-    print 'Read', len(list), 'more lines'
-    print 'File length =', f.tell()
-    if f.tell() != length:
-        raise RuntimeError, 'bad length'
-    f.close()
-
-if __name__ == '__main__':
-    _test()
-"""
+            raise ValueError("negative size value %r" % (size, ))
+        current = self._size()
+        if size < current:
+            self.db.put(self.key, b'', txn=self.txn, dlen=current - size,
+                        doff=size)
+        elif size > current:
+            self.db.put(self.key, b'\0' * (size - current), txn=self.txn,
+                        dlen=0, doff=current)
+        return size
+
+    def write(self, b):
+        self._checkClosed()
+        data = bytes(b)
+        if not data:
+            return 0
+        # Berkeley DB pads with nul bytes when writing past the end
+        self.db.put(self.key, data, txn=self.txn, dlen=len(data),
+                    doff=self.pos)
+        self.pos += len(data)
+        return len(data)
+
+
+def open(db, key, mode='rb', txn=None, buffering=-1):
+    """Opens the record 'key' of 'db' like a binary file.  'mode' is 'rb',
+    'wb' (the record is truncated, or created), 'ab' (writes go to the
+    end) or 'r+b', and 'buffering' the size of the buffer, and so of the
+    readahead (DEFAULT_READAHEAD by default).  With buffering=0, the
+    DBRecIO is returned, unbuffered.  Wrap the result in io.TextIOWrapper
+    to read or write text.
+    """
+    modes = {'rb': 'r', 'wb': 'w', 'ab': 'a', 'r+b': '+', 'rb+': '+'}
+    if mode not in modes:
+        raise ValueError("invalid mode: %r" % (mode, ))
+    kind = modes[mode]
+    raw = DBRecIO(db, key, txn=txn)
+    if kind == 'w':
+        db.put(key, b'', txn=txn)
+    elif kind == 'a':
+        raw.seek(0, io.SEEK_END)
+    if buffering == 0:
+        return raw
+    if buffering < 0:
+        buffering = DEFAULT_READAHEAD
+    if kind == 'r':
+        return io.BufferedReader(raw, buffering)
+    if kind == '+':
+        return io.BufferedRandom(raw, buffering)
+    return io.BufferedWriter(raw, buffering)
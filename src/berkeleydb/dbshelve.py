@@ -29,22 +29,264 @@ storage.
 
 #------------------------------------------------------------------------
 
+import io
 import sys
+import struct
+import operator
+import threading
+import weakref
 from collections.abc import MutableMapping
 import pickle
 from . import db
 
 
 HIGHEST_PROTOCOL = pickle.HIGHEST_PROTOCOL
-def _dumps(object, protocol):
-    return pickle.dumps(object, protocol=protocol)
+
+# Records carrying pickle protocol 5 out-of-band buffers start with this
+# magic.  It can not be mistaken for a pickle, because 0xFF is not a
+# pickle opcode.  The header is followed by the length of each buffer,
+# the pickle itself and then the raw buffers.
+_OOB_MAGIC = b'\xffPB5'
+_OOB_HEADER = struct.Struct('<4sIQ')  # magic, buffer count, pickle length
+_OOB_LENGTH = struct.Struct('<Q')
+
+
+def _dumps(object, protocol, oob_threshold=None, schemas=None):
+    buffers = []
+    buffer_callback = None
+    if (oob_threshold is not None) and (protocol >= 5):
+        def buffer_callback(buf):
+            try:
+                raw = buf.raw()
+            except BufferError:  # Not contiguous, keep it in-band
+                return True
+            if raw.nbytes < oob_threshold:
+                return True
+            buffers.append(raw)
+            return False
+
+    data = None
+    if schemas is not None:
+        try:
+            data = schemas.dumps(object, protocol, buffer_callback)
+        except _SharedReference:
+            del buffers[:]
+    if data is None:
+        data = pickle.dumps(object, protocol=protocol,
+                            buffer_callback=buffer_callback)
+    if not buffers:
+        return data
+
+    chunks = [_OOB_HEADER.pack(_OOB_MAGIC, len(buffers), len(data))]
+    chunks.extend(_OOB_LENGTH.pack(raw.nbytes) for raw in buffers)
+    chunks.append(data)
+    chunks.extend(buffers)
+    return b''.join(chunks)
+
+
+def _loads(data, schemas=None):
+    if data[:4] != _OOB_MAGIC:
+        if schemas is None:
+            return pickle.loads(data)
+        return schemas.loads(data)
+
+    # The buffers are copied at once into a bytearray, and handed to
+    # pickle as slices of it, so objects supporting it (NumPy arrays,
+    # for instance) are rebuilt on them, writable as the ones pickled
+    # in-band, without another copy of their payload.
+    total = len(data)
+    if total < _OOB_HEADER.size:
+        raise DBShelveError("Truncated out-of-band record")
+    _, count, length = _OOB_HEADER.unpack_from(data)
+    offset = _OOB_HEADER.size
+    if total < offset + count * _OOB_LENGTH.size:
+        raise DBShelveError("Truncated out-of-band record")
+    lengths = []
+    for i in range(count):
+        lengths.append(_OOB_LENGTH.unpack_from(data, offset)[0])
+        offset += _OOB_LENGTH.size
+    if total != offset + length + sum(lengths):
+        raise DBShelveError("Invalid out-of-band record length")
+    view = memoryview(data)
+    pickled = view[offset:offset+length]
+    offset += length
+    payload = memoryview(bytearray(view[offset:]))
+    offset = 0
+    buffers = []
+    for size in lengths:
+        buffers.append(payload[offset:offset+size])
+        offset += size
+    if schemas is None:
+        return pickle.loads(pickled, buffers=buffers)
+    return schemas.loads(pickled, buffers)
+
+
+#------------------------------------------------------------------------
+# Compact pickling.  Instances of plain classes are pickled as a
+# persistent id holding a schema number and the attribute values.  The
+# schema (class and attribute names) is stored once, in a Recno
+# database next to the shelf, instead of in every record.
+
+_PY_TPFLAGS_HEAPTYPE = 1 << 9
+_object_getstate = getattr(object, '__getstate__', None)
+_compactable_classes = weakref.WeakKeyDictionary()
+
+
+def _compactable(cls):
+    try:
+        return _compactable_classes[cls]
+    except KeyError:
+        pass
+    # Only classes defined in Python, pickled through their __dict__
+    # with the default machinery, can be rebuilt from their schema.
+    compactable = (
+        all((c is object) or (c.__flags__ & _PY_TPFLAGS_HEAPTYPE)
+            for c in cls.__mro__) and
+        (cls.__reduce_ex__ is object.__reduce_ex__) and
+        (cls.__reduce__ is object.__reduce__) and
+        (getattr(cls, '__getstate__', None) is _object_getstate) and
+        (getattr(cls, '__setstate__', None) is None) and
+        (getattr(cls, '__getnewargs_ex__', None) is None) and
+        (getattr(cls, '__getnewargs__', None) is None) and
+        not hasattr(cls, '__slots__'))
+    _compactable_classes[cls] = compactable
+    return compactable
+
+
+class _SharedReference(Exception):
+    """An object is referenced twice in the record.  Persistent ids are
+    not memoized, so such records are pickled the regular way."""
+
+
+class _CompactPickler(pickle.Pickler):
+    def __init__(self, file, protocol, schemas, buffer_callback=None):
+        pickle.Pickler.__init__(self, file, protocol,
+                                buffer_callback=buffer_callback)
+        self._schemas = schemas
+        self._seen = set()
+
+    def persistent_id(self, obj):
+        cls = type(obj)
+        if not _compactable(cls):
+            return None
+        state = obj.__dict__
+        fields = tuple(state)
+        for field in fields:
+            if type(field) is not str:
+                return None
+        if id(obj) in self._seen:
+            raise _SharedReference
+        self._seen.add(id(obj))
+        return (self._schemas.schema_id(cls, fields), ) + \
+                tuple(state.values())
+
+
+class _CompactUnpickler(pickle.Unpickler):
+    def __init__(self, file, schemas, buffers=None):
+        pickle.Unpickler.__init__(self, file, buffers=buffers)
+        self._schemas = schemas
+
+    def persistent_load(self, pid):
+        cls, fields = self._schemas.schema(pid[0])
+        obj = cls.__new__(cls)
+        obj.__dict__.update(zip(fields, pid[1:]))
+        return obj
+
+
+class _SchemaTable:
+    """Class and attribute names shared by the records of a compact shelf.
+    """
+    def __init__(self, schemas_db, protocol):
+        self.db = schemas_db
+        self.protocol = protocol
+        self._ids = {}
+        self._by_id = {}
+        self._lock = threading.Lock()
+        for schema_id, data in schemas_db.items():
+            try:
+                schema = pickle.loads(data)
+            except Exception:  # Let it fail later, if actually used
+                continue
+            self._by_id[schema_id] = schema
+            self._ids.setdefault(schema, schema_id)
+
+    def schema_id(self, cls, fields):
+        schema = (cls, fields)
+        try:
+            return self._ids[schema]
+        except KeyError:
+            pass
+        with self._lock:
+            if schema not in self._ids:
+                schema_id = self.db.append(pickle.dumps(schema,
+                                                        self.protocol))
+                self._by_id[schema_id] = schema
+                self._ids[schema] = schema_id
+            return self._ids[schema]
+
+    def schema(self, schema_id):
+        try:
+            return self._by_id[schema_id]
+        except KeyError:
+            pass
+        # Maybe added by another process
+        data = self.db.get(schema_id)
+        if data is None:
+            raise DBShelveError("Unknown schema %d in compact shelf"
+                                % schema_id)
+        schema = self._by_id[schema_id] = pickle.loads(data)
+        return schema
+
+    def dumps(self, object, protocol, buffer_callback=None):
+        f = io.BytesIO()
+        _CompactPickler(f, protocol, self, buffer_callback).dump(object)
+        return f.getvalue()
+
+    def loads(self, data, buffers=None):
+        return _CompactUnpickler(io.BytesIO(data), self, buffers).load()
+
+
+#------------------------------------------------------------------------
+
+
+def _index_scalar(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    raise TypeError("Index values must be bytes, str, None or "
+                    "a sequence of them, %s found" % type(value).__name__)
+
+
+def _index_key(value):
+    if value is None:
+        return db.DB_DONOTINDEX
+    if isinstance(value, (list, tuple, set, frozenset)):
+        keys = [_index_scalar(i) for i in value if i is not None]
+        return keys if keys else db.DB_DONOTINDEX
+    return _index_scalar(value)
+
+
+def _index_extractor(attr, key):
+    if (attr is None) == (key is None):
+        raise TypeError("Exactly one of 'attr' or 'key' must be given")
+    if key is not None:
+        return lambda value: _index_key(key(value))
+
+    getter = operator.attrgetter(attr)
+    def extract(value):
+        try:
+            return _index_key(getter(value))
+        except AttributeError:
+            return db.DB_DONOTINDEX
+    return extract
 
 
 #------------------------------------------------------------------------
 
 
 def open(filename, flags=db.DB_CREATE, mode=0o660, filetype=db.DB_HASH,
-         dbenv=None, dbname=None):
+         dbenv=None, dbname=None, oob_threshold=None, compact=False):
     """
     A simple factory function for compatibility with the standard
     shelve.py module.  It can be used like this, where key is a string
@@ -73,7 +315,7 @@ def open(filename, flags=db.DB_CREATE, mode=0o660, filetype=db.DB_HASH,
             raise db.DBError("flags should be one of 'r', 'w', 'c' or 'n' or "
                              "use the berkeleydb.db.DB_* flags")
 
-    d = DBShelf(dbenv)
+    d = DBShelf(dbenv, oob_threshold=oob_threshold, compact=compact)
     d.open(filename, dbname, filetype, flags, mode)
     return d
 
@@ -85,14 +327,33 @@ class DBShelveError(db.DBError): pass
 class DBShelf(MutableMapping):
     """A shelf to hold pickled objects, built upon a berkeleydb DB object.  It
     automatically pickles/unpickles data objects going to/from the DB.
+
+    If oob_threshold is given and the pickle protocol is 5 or higher,
+    buffers of at least that many bytes (bytearrays, NumPy arrays...) are
+    stored out-of-band, after the pickle.  They are read from the
+    fetched record with a single copy, into a writable buffer that the
+    objects supporting it are rebuilt on.
+
+    If compact is true, instances of plain Python classes are stored
+    without their class reference and attribute names, which are kept
+    once in a companion database instead.  A compact shelf must always be
+    opened as compact.
     """
-    def __init__(self, dbenv=None):
+    def __init__(self, dbenv=None, oob_threshold=None, compact=False):
         self.db = db.DB(dbenv)
+        self._dbenv = dbenv
+        self._indexes = {}
+        # While a write is in progress, maps its pickled data to the
+        # decoded objects, so the index callbacks don't unpickle again.
+        self._index_memo = threading.local()
         self._closed = True
         if HIGHEST_PROTOCOL:
             self.protocol = HIGHEST_PROTOCOL
         else:
             self.protocol = 1
+        self.oob_threshold = oob_threshold
+        self.compact = compact
+        self._schemas = None
 
 
     def __del__(self):
@@ -115,16 +376,17 @@ class DBShelf(MutableMapping):
 
     def __getitem__(self, key):
         data = self.db[key]
-        return pickle.loads(data)
+        return _loads(data, self._schemas)
 
 
     def __setitem__(self, key, value):
-        data = _dumps(value, self.protocol)
-        self.db[key] = data
+        data = _dumps(value, self.protocol, self.oob_threshold,
+                      self._schemas)
+        self._write(data, value, self.db.__setitem__, key, data)
 
 
     def __delitem__(self, key):
-        del self.db[key]
+        self._write(None, None, self.db.__delitem__, key)
 
 
     def keys(self, txn=None):
@@ -147,9 +409,29 @@ class DBShelf(MutableMapping):
     def open(self, *args, **kwargs):
         self.db.open(*args, **kwargs)
         self._closed = False
+        if self.compact:
+            flags = self.db.get_open_flags() & \
+                    (db.DB_CREATE | db.DB_RDONLY | db.DB_THREAD)
+            if self.db.get_transactional():
+                flags |= db.DB_AUTO_COMMIT
+            schemas_db = db.DB(self._dbenv)
+            try:
+                schemas_db.open(self._companion_filename('_schemas'), None,
+                                db.DB_RECNO, flags)
+                self._schemas = _SchemaTable(schemas_db, self.protocol)
+            except:
+                schemas_db.close()
+                self.close()
+                raise
 
 
     def close(self, *args, **kwargs):
+        for index in self._indexes.values():
+            index.close()
+        self._indexes.clear()
+        if self._schemas is not None:
+            self._schemas.db.close()
+            self._schemas = None
         self.db.close(*args, **kwargs)
         self._closed = True
 
@@ -169,7 +451,7 @@ class DBShelf(MutableMapping):
         newitems = []
 
         for k, v in items:
-            newitems.append( (k, pickle.loads(v)) )
+            newitems.append( (k, _loads(v, self._schemas)) )
         return newitems
 
     def values(self, txn=None):
@@ -178,14 +460,38 @@ class DBShelf(MutableMapping):
         else:
             values = list(self.db.values())
 
-        return list(map(pickle.loads, values))
+        return [_loads(v, self._schemas) for v in values]
 
     #-----------------------------------
     # Other methods
 
+    def _companion_filename(self, suffix):
+        filename = self.db.get_dbname()[0]
+        if filename is None:  # In memory
+            return None
+        return '%s.%s' % (filename, suffix)
+
+    def _index_location(self, name):
+        # The shelves stored as databases of a single file have their
+        # indexes in databases of the same name, in the index file
+        filename = self._companion_filename(name)
+        if filename is None:
+            return None, None
+        return filename, self.db.get_dbname()[1]
+
+    def _write(self, data, value, function, *args):
+        if not self._indexes:
+            return function(*args)
+        self._index_memo.memo = {} if data is None else {data: value}
+        try:
+            return function(*args)
+        finally:
+            self._index_memo.memo = None
+
     def __append(self, value, txn=None):
-        data = _dumps(value, self.protocol)
-        return self.db.append(data, txn)
+        data = _dumps(value, self.protocol, self.oob_threshold,
+                      self._schemas)
+        return self._write(data, value, self.db.append, data, txn)
 
     def append(self, value, txn=None):
         if self.get_type() == db.DB_RECNO:
@@ -196,14 +502,103 @@ class DBShelf(MutableMapping):
     def associate(self, secondaryDB, callback, flags=0):
         def _shelf_callback(priKey, priData, realCallback=callback):
             if isinstance(priData, bytes):
-                data = pickle.loads(priData)
+                data = _loads(priData, self._schemas)
             else:
-                data = pickle.loads(bytes(priData, "iso8859-1"))  # 8 bits
+                data = _loads(bytes(priData, "iso8859-1"),  # 8 bits
+                              self._schemas)
             return realCallback(priKey, data)
 
         return self.db.associate(secondaryDB, _shelf_callback, flags)
 
 
+    def create_index(self, name, attr=None, key=None, filename=None,
+                     dbname=None, txn=None, flags=db.DB_CREATE):
+        """Create (or open) a secondary index of the shelf, named name.
+
+        The index key is either the attr attribute (dotted names are
+        allowed) of the stored objects, or what the key callable returns
+        for them.  It must be bytes, str (stored as UTF-8), None to skip
+        the record, or a sequence of those.  The shelf must be open.
+
+        Unless a filename is given, the index is stored in a file named
+        after the shelf file, in a database named as the shelf database
+        if it has a name, or in memory if the shelf is in memory.
+        Every index is fed from the same decoded object on writes done
+        through the shelf, so objects are not unpickled once per index.
+        """
+        if name in self._indexes:
+            raise DBShelveError("Index %r already exists" % name)
+        extract = _index_extractor(attr, key)
+
+        if filename is None:
+            filename, dbname = self._index_location(name)
+
+        def _index_callback(priKey, priData):
+            if not isinstance(priData, bytes):
+                priData = bytes(priData, "iso8859-1")  # 8 bits
+            memo = getattr(self._index_memo, 'memo', None)
+            if memo is None:
+                return extract(_loads(priData, self._schemas))
+            try:
+                value = memo[priData]
+            except KeyError:
+                value = memo[priData] = _loads(priData, self._schemas)
+            return extract(value)
+
+        index = db.DB(self._dbenv)
+        try:
+            index.set_flags(db.DB_DUP | db.DB_DUPSORT)
+            index.open(filename, dbname, db.DB_BTREE, flags, txn=txn)
+            self.db.associate(index, _index_callback, db.DB_CREATE, txn=txn)
+        except:
+            index.close()
+            raise
+        self._indexes[name] = index
+        return index
+
+    def get_index(self, name):
+        """Returns the secondary DB object of the index called name."""
+        try:
+            return self._indexes[name]
+        except KeyError:
+            raise DBShelveError("Unknown index %r" % name) from None
+
+    def find(self, txn=None, **criteria):
+        """Yields the (key, object) tuples whose indexes match all the
+        criteria, given as index_name=value.  A single criterion is a
+        secondary lookup; several of them are combined with a join.
+        """
+        if not criteria:
+            raise TypeError("At least one index criterion is needed")
+        cursors = []
+        try:
+            for name, value in criteria.items():
+                value = _index_scalar(value)
+                c = self.get_index(name).cursor(txn)
+                cursors.append(c)
+                if c.set(value) is None:
+                    return
+
+            if len(cursors) == 1:
+                c = cursors[0]
+                rec = c.pget(db.DB_CURRENT)
+                while rec is not None:
+                    yield rec[1], _loads(rec[2], self._schemas)
+                    rec = c.pget(db.DB_NEXT_DUP)
+            else:
+                c = self.join(cursors)
+                try:
+                    rec = c.get(0)
+                    while rec is not None:
+                        yield rec
+                        rec = c.get(0)
+                finally:
+                    c.close()
+        finally:
+            for c in cursors:
+                c.close()
+
+
     #def get(self, key, default=None, txn=None, flags=0):
     def get(self, *args, **kw):
         # We do it with *args and **kw so if the default value wasn't
@@ -212,47 +607,92 @@ class DBShelf(MutableMapping):
         # off.
         data = self.db.get(*args, **kw)
         try:
-            return pickle.loads(data)
+            return _loads(data, self._schemas)
         except (EOFError, TypeError, pickle.UnpicklingError):
             return data  # we may be getting the default value, or None,
                          # so it doesn't need unpickled.
 
     def get_both(self, key, value, txn=None, flags=0):
-        data = _dumps(value, self.protocol)
+        data = _dumps(value, self.protocol, self.oob_threshold,
+                      self._schemas)
         data = self.db.get(key, data, txn, flags)
-        return pickle.loads(data)
+        return _loads(data, self._schemas)
 
 
-    def cursor(self, txn=None, flags=0):
-        c = DBShelfCursor(self.db.cursor(txn, flags))
+    def cursor(self, txn=None, flags=0, lazy=False):
+        c = DBShelfCursor(self.db.cursor(txn, flags), lazy)
         c.protocol = self.protocol
+        c.oob_threshold = self.oob_threshold
+        c._schemas = self._schemas
+        c._write = self._write
         return c
 
 
     def put(self, key, value, txn=None, flags=0):
-        data = _dumps(value, self.protocol)
-        return self.db.put(key, data, txn, flags)
+        data = _dumps(value, self.protocol, self.oob_threshold,
+                      self._schemas)
+        return self._write(data, value, self.db.put, key, data, txn, flags)
+
+
+    def delete(self, key, txn=None, flags=0):
+        return self._write(None, None, self.db.delete, key, txn, flags)
 
 
     def join(self, cursorList, flags=0):
-        raise NotImplementedError
+        """Join cursors over secondary indexes of this shelf, as DB.join()
+        does.  Returns a DBShelfCursor; call its get(0) method to fetch the
+        matching records, or join_item() for their keys only.
+        """
+        cursors = [getattr(c, 'dbc', c) for c in cursorList]
+        c = DBShelfCursor(self.db.join(cursors, flags))
+        c.protocol = self.protocol
+        c.oob_threshold = self.oob_threshold
+        c._schemas = self._schemas
+        return c
 
 
     #----------------------------------------------
     # Methods allowed to pass-through to self.db
     #
-    #    close,  delete, fd, get_byteswapped, get_type, has_key,
+    #    close, fd, get_byteswapped, get_type, has_key,
     #    key_range, open, remove, rename, stat, sync,
     #    upgrade, verify, and all set_* methods.
 
 
 #---------------------------------------------------------------------------
 
+class DBShelfValue:
+    """A record value, still pickled, as returned by lazy cursors.  Nothing
+    is unpickled until decode() is called, so scans filtering on the keys
+    only pay for the records they actually use.
+    """
+    __slots__ = ('raw', '_schemas', '_value', '_decoded')
+
+    def __init__(self, raw, schemas=None):
+        self.raw = raw
+        self._schemas = schemas
+        self._decoded = False
+
+    def decode(self):
+        if not self._decoded:
+            self._value = _loads(self.raw, self._schemas)
+            self._decoded = True
+        return self._value
+
+    def __repr__(self):
+        return '<DBShelfValue, %d bytes>' % len(self.raw)
+
+
 class DBShelfCursor:
     """
+    If lazy is true, the cursor methods return (key, DBShelfValue) tuples
+    instead of unpickling the data of every record visited.
     """
-    def __init__(self, cursor):
+    def __init__(self, cursor, lazy=False):
         self.dbc = cursor
+        self.lazy = lazy
+        self._schemas = None
+        self._write = None   # DBShelf._write() of the shelf, for its indexes
 
     def __del__(self):
         self.close()
@@ -266,20 +706,31 @@ class DBShelfCursor:
     #----------------------------------------------
 
     def dup(self, flags=0):
-        c = DBShelfCursor(self.dbc.dup(flags))
+        c = DBShelfCursor(self.dbc.dup(flags), self.lazy)
         c.protocol = self.protocol
+        c.oob_threshold = self.oob_threshold
+        c._schemas = self._schemas
+        c._write = self._write
         return c
 
 
     def put(self, key, value, flags=0):
-        data = _dumps(value, self.protocol)
-        return self.dbc.put(key, data, flags)
+        data = _dumps(value, self.protocol, self.oob_threshold,
+                      self._schemas)
+        if self._write is None:
+            return self.dbc.put(key, data, flags)
+        return self._write(data, value, self.dbc.put, key, data, flags)
+
+    def delete(self, flags=0):
+        if self._write is None:
+            return self.dbc.delete(flags)
+        return self._write(None, None, self.dbc.delete, flags)
 
 
     def get(self, *args):
         count = len(args)  # a method overloading hack
         method = getattr(self, 'get_%d' % count)
-        method(*args)
+        return method(*args)
 
     def get_1(self, flags):
         rec = self.dbc.get(flags)
@@ -290,7 +741,8 @@ class DBShelfCursor:
         return self._extract(rec)
 
     def get_3(self, key, value, flags):
-        data = _dumps(value, self.protocol)
+        data = _dumps(value, self.protocol, self.oob_threshold,
+                      self._schemas)
         rec = self.dbc.get(key, flags)
         return self._extract(rec)
 
@@ -307,7 +759,8 @@ class DBShelfCursor:
 
 
     def get_both(self, key, value, flags=0):
-        data = _dumps(value, self.protocol)
+        data = _dumps(value, self.protocol, self.oob_threshold,
+                      self._schemas)
         rec = self.dbc.get_both(key, flags)
         return self._extract(rec)
 
@@ -331,10 +784,11 @@ class DBShelfCursor:
             return None
         else:
             key, data = rec
-            if isinstance(data, bytes):
-                return key, pickle.loads(data)
-            else:
-                return key, pickle.loads(bytes(data, "iso8859-1"))  # 8 bits
+            if not isinstance(data, bytes):
+                data = bytes(data, "iso8859-1")  # 8 bits
+            if self.lazy:
+                return key, DBShelfValue(data, self._schemas)
+            return key, _loads(data, self._schemas)
 
     #----------------------------------------------
     # Methods allowed to pass-through to self.dbc
@@ -25,6 +25,12 @@
 # "from berkeleydb.dbutils import *"
 #
 from time import sleep as _sleep
+from time import monotonic as _monotonic
+import functools as _functools
+import queue as _queue
+import random as _random
+import threading as _threading
+import weakref as _weakref
 
 import sys
 from . import db
@@ -39,6 +45,214 @@ _deadlock_MaxSleepTime = 3.14159
 _deadlock_VerboseFile = None
 
 
+class RetryStats:
+    """Counters shared by the calls done through a RetryPolicy.
+
+    calls:      number of calls done.
+    retries:    number of retries, over all the calls.
+    giveups:    calls that raised the error after exhausting the policy.
+    time_lost:  seconds spent sleeping between retries.
+    histogram:  dictionary mapping "retries done by a call" to the number
+                of calls needing them.
+    """
+    def __init__(self):
+        self._lock = _threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.retries = 0
+            self.giveups = 0
+            self.time_lost = 0.0
+            self.histogram = {}
+
+    def _record(self, retries, time_lost, giveup):
+        with self._lock:
+            self.calls += 1
+            self.retries += retries
+            self.time_lost += time_lost
+            if giveup:
+                self.giveups += 1
+            self.histogram[retries] = self.histogram.get(retries, 0) + 1
+
+    def snapshot(self):
+        """Returns the current counters as a dictionary."""
+        with self._lock:
+            return {'calls': self.calls, 'retries': self.retries,
+                    'giveups': self.giveups, 'time_lost': self.time_lost,
+                    'histogram': dict(self.histogram)}
+
+
+class _Attempt:
+    # Context manager used by RetryPolicy.attempts()
+    def __init__(self, run):
+        self._run = run
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._run.done = True
+            return False
+        sleeptime = self._run.backoff(exc)
+        if sleeptime is None:
+            return False
+        self._run.policy.sleep(sleeptime)
+        return True
+
+
+class _Run:
+    # State of a call being retried
+    def __init__(self, policy):
+        self.policy = policy
+        self.start = _monotonic()
+        self.retries = 0
+        self.time_lost = 0.0
+        self.sleeptime = None
+        self.done = False
+
+    def backoff(self, exc):
+        """Returns the time to sleep before retrying, or None if the
+        exception must be propagated."""
+        policy = self.policy
+        if not isinstance(exc, policy.exceptions):
+            return None
+        if (policy.max_retries >= 0) and (self.retries >= policy.max_retries):
+            self.finish(giveup=True)
+            return None
+        sleeptime = policy._next_sleep(self.sleeptime)
+        if policy.max_elapsed is not None:
+            if _monotonic() - self.start + sleeptime > policy.max_elapsed:
+                self.finish(giveup=True)
+                return None
+        self.sleeptime = sleeptime
+        verbose_file = policy.verbose_file
+        if verbose_file is None:
+            verbose_file = _deadlock_VerboseFile
+        if verbose_file:
+            verbose_file.write(
+                'dbutils.DeadlockWrap: sleeping %1.3f\n' % sleeptime)
+        self.retries += 1
+        self.time_lost += sleeptime
+        return sleeptime
+
+    def finish(self, giveup=False):
+        if self.policy.stats is not None:
+            self.policy.stats._record(self.retries, self.time_lost, giveup)
+
+
+class RetryPolicy:
+    """How to retry database operations failing with a deadlock.
+
+    min_sleep, max_sleep: bounds, in seconds, of the sleep between
+                    retries.  They default to the module settings.
+    max_retries:    retries before giving up.  -1 retries forever.
+    max_elapsed:    seconds, since the first try, after which no more
+                    retries are done.  None means no limit.
+    jitter:         if true (the default), use "decorrelated jitter"
+                    backoff, so threads deadlocking together don't retry
+                    in lockstep.  If false, sleeps double on every retry.
+    exceptions:     exception classes to retry on.
+    sleep:          function used to sleep.
+    stats:          a RetryStats instance to update.  A new one is created
+                    by default.  Pass None to disable the accounting.
+
+    A policy can be used in several ways:
+
+        policy = RetryPolicy(max_retries=10)
+        policy.call(d.put, b'foo', b'bar')
+
+        @policy
+        def update(...):
+            ...
+
+        for attempt in policy.attempts():
+            with attempt:
+                d.put(b'foo', b'bar')
+    """
+    _new_stats = object()
+
+    def __init__(self, min_sleep=None, max_sleep=None, max_retries=-1,
+                 max_elapsed=None, jitter=True,
+                 exceptions=(db.DBLockDeadlockError, ), sleep=_sleep,
+                 stats=_new_stats, verbose_file=None):
+        self.min_sleep = min_sleep
+        self.max_sleep = max_sleep
+        self.max_retries = max_retries
+        self.max_elapsed = max_elapsed
+        self.jitter = jitter
+        self.exceptions = tuple(exceptions)
+        self.sleep = sleep
+        if stats is self._new_stats:
+            stats = RetryStats()
+        self.stats = stats
+        self.verbose_file = verbose_file
+
+    def replace(self, **overrides):
+        """Returns a copy of the policy with some settings changed.  The
+        copy shares the stats of the original, unless overridden."""
+        settings = dict(min_sleep=self.min_sleep, max_sleep=self.max_sleep,
+                        max_retries=self.max_retries,
+                        max_elapsed=self.max_elapsed, jitter=self.jitter,
+                        exceptions=self.exceptions, sleep=self.sleep,
+                        stats=self.stats, verbose_file=self.verbose_file)
+        settings.update(overrides)
+        return RetryPolicy(**settings)
+
+    def _next_sleep(self, sleeptime):
+        min_sleep = self.min_sleep
+        if min_sleep is None:
+            min_sleep = _deadlock_MinSleepTime
+        max_sleep = self.max_sleep
+        if max_sleep is None:
+            max_sleep = _deadlock_MaxSleepTime
+        if sleeptime is None:
+            sleeptime = min_sleep
+        elif self.jitter:
+            sleeptime = _random.uniform(min_sleep, sleeptime * 3)
+        else:
+            sleeptime *= 2
+        return min(sleeptime, max_sleep)
+
+    def call(self, function, *_args, **_kwargs):
+        """Calls function(*_args, **_kwargs), retrying it as needed."""
+        run = _Run(self)
+        while True:
+            try:
+                result = function(*_args, **_kwargs)
+            except Exception as exc:
+                sleeptime = run.backoff(exc)
+                if sleeptime is None:
+                    raise
+                self.sleep(sleeptime)
+            else:
+                run.finish()
+                return result
+
+    def __call__(self, function):
+        """Decorator form of call()."""
+        @_functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return self.call(function, *args, **kwargs)
+        return wrapper
+
+    def attempts(self):
+        """Yields context managers.  Run the operation inside them; an
+        error covered by the policy is swallowed and the next attempt is
+        yielded after sleeping.  The loop ends after the first success.
+        """
+        run = _Run(self)
+        while not run.done:
+            yield _Attempt(run)
+        run.finish()
+
+
+# Policy used by DeadlockWrap() when no other is given
+default_policy = RetryPolicy()
+
+
 def DeadlockWrap(function, *_args, **_kwargs):
     """DeadlockWrap(function, *_args, **_kwargs) - automatically retries
     function in case of a database deadlock.
@@ -49,30 +263,264 @@ def DeadlockWrap(function, *_args, **_kwargs):
 
     A 'max_retries' parameter may optionally be passed to prevent it
     from retrying forever (in which case the exception will be reraised).
+    A 'policy' parameter selects the RetryPolicy to use instead of
+    'default_policy'.
 
         d = DB(...)
         d.open(...)
         DeadlockWrap(d.put, b'foo', data=b'bar')  # set key b'foo' to b'bar'
     """
-    sleeptime = _deadlock_MinSleepTime
-    max_retries = _kwargs.get('max_retries', -1)
+    policy = _kwargs.pop('policy', None)
+    if policy is None:
+        policy = default_policy
     if 'max_retries' in _kwargs:
-        del _kwargs['max_retries']
-    while True:
-        try:
-            return function(*_args, **_kwargs)
-        except db.DBLockDeadlockError:
-            if _deadlock_VerboseFile:
-                _deadlock_VerboseFile.write(
-                    'dbutils.DeadlockWrap: sleeping %1.3f\n' % sleeptime)
-            _sleep(sleeptime)
-            # exponential backoff in the sleep time
-            sleeptime *= 2
-            if sleeptime > _deadlock_MaxSleepTime:
-                sleeptime = _deadlock_MaxSleepTime
-            max_retries -= 1
-            if max_retries == -1:
-                raise
+        policy = policy.replace(max_retries=_kwargs.pop('max_retries'))
+    return policy.call(function, *_args, **_kwargs)
+
+
+# Policy used by run_in_txn() when no other is given.  Its stats record
+# how many attempts the transactions needed.
+txn_policy = RetryPolicy(exceptions=(db.DBLockDeadlockError,
+                                     db.DBLockNotGrantedError))
+
+
+def _txn_run(policy, retries):
+    if policy is None:
+        policy = txn_policy
+    if retries is not None:
+        policy = policy.replace(max_retries=retries)
+    return _Run(policy)
+
+
+def run_in_txn(env, function, retries=None, flags=0, parent=None,
+               commit_flags=0, policy=None, group_commit=None,
+               on_attempts=None):
+    """run_in_txn(env, function, retries=None, flags=0, parent=None,
+    commit_flags=0, policy=None, group_commit=None, on_attempts=None) -
+    runs function(txn) in a transaction.
+
+    The transaction is created with env.txn_begin(parent, flags) and it is
+    committed with commit_flags when the function returns, returning its
+    result.  If the function, or the commit, fails with a deadlock or a
+    lock not granted error, the transaction is aborted and the whole
+    function is run again in a new transaction, after backing off as the
+    policy (by default, 'txn_policy') says.  'retries' overrides the
+    maximum number of retries of the policy.  Other exceptions abort the
+    transaction and are propagated.  If a GroupCommit is given, the
+    transaction is committed through it.  If 'on_attempts' is given, it
+    is called with the number of transactions run, once the last one is
+    committed or its exception is propagated.
+
+    It is available as the dbobj.DBEnv.run_in_txn() method too.
+
+        def transfer(txn):
+            balance = int(d.get(b'balance', txn=txn, flags=DB_RMW))
+            d.put(b'balance', b'%d' % (balance - 10), txn=txn)
+
+        run_in_txn(env, transfer, retries=10)
+    """
+    run = _txn_run(policy, retries)
+    try:
+        while True:
+            txn = env.txn_begin(parent, flags)
+            try:
+                try:
+                    result = function(txn)
+                except BaseException:
+                    txn.abort()
+                    raise
+                if group_commit is not None:
+                    group_commit.commit(txn, commit_flags)
+                else:
+                    txn.commit(commit_flags)
+            except Exception as exc:
+                sleeptime = run.backoff(exc)
+                if sleeptime is None:
+                    raise
+                run.policy.sleep(sleeptime)
+            else:
+                run.finish()
+                return result
+    finally:
+        if on_attempts is not None:
+            on_attempts(run.retries + 1)
+
+
+async def run_in_txn_async(env, function, retries=None, flags=0,
+                           parent=None, commit_flags=0, policy=None,
+                           executor=None, on_attempts=None):
+    """Coroutine version of run_in_txn().  'function' is a coroutine
+    function receiving the transaction.  Beginning, committing and
+    aborting the transaction run in 'executor' (the default executor of
+    the event loop if None), and the backoff sleeps don't block the loop.
+
+    It is available as the dbobj.DBEnv.run_in_txn_async() method too.
+    """
+    import asyncio
+    loop = asyncio.get_running_loop()
+    run = _txn_run(policy, retries)
+    try:
+        while True:
+            txn = await loop.run_in_executor(executor, env.txn_begin,
+                                             parent, flags)
+            try:
+                try:
+                    result = await function(txn)
+                except BaseException:
+                    await loop.run_in_executor(executor, txn.abort)
+                    raise
+                await loop.run_in_executor(executor, txn.commit,
+                                           commit_flags)
+            except Exception as exc:
+                sleeptime = run.backoff(exc)
+                if sleeptime is None:
+                    raise
+                await asyncio.sleep(sleeptime)
+            else:
+                run.finish()
+                return result
+    finally:
+        if on_attempts is not None:
+            on_attempts(run.retries + 1)
+
+
+class GroupCommit:
+    """Group commit coordinator for durable transactions of an environment.
+
+    Instead of committing with a synchronous log flush each, threads call
+    commit(txn).  Transactions are committed with DB_TXN_NOSYNC and the
+    caller waits until a single env.log_flush(), issued by one of the
+    waiting threads (the leader) on behalf of the whole group, makes its
+    commit durable.  The leader waits up to max_wait seconds for other
+    commits to join the group, or until max_batch commits are pending.
+
+        group = GroupCommit(env, max_wait=0.002, max_batch=64)
+        ...
+        group.commit(txn)   # durable when it returns
+
+    Counters of commits and flushes done are kept in 'commits' and
+    'flushes'.
+    """
+    def __init__(self, env, max_wait=0.001, max_batch=64):
+        self.env = env
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.commits = 0
+        self.flushes = 0
+        self._cond = _threading.Condition()
+        self._next_ticket = 0   # Commits registered
+        self._flushed = 0       # Commits made durable
+        self._leader = False
+
+    def commit(self, txn, flags=0):
+        """Commits txn and waits until its commit is in stable storage."""
+        txn.commit(flags | db.DB_TXN_NOSYNC)
+        # Our commit record is in the log buffer already, so any flush
+        # started after this point covers it.
+        with self._cond:
+            self._next_ticket += 1
+            ticket = self._next_ticket
+            self.commits += 1
+            if ticket - self._flushed >= self.max_batch:
+                self._cond.notify_all()
+            while self._flushed < ticket:
+                if self._leader:
+                    self._cond.wait()
+                    continue
+                self._leader = True
+                try:
+                    deadline = _monotonic() + self.max_wait
+                    while self._next_ticket - self._flushed < self.max_batch:
+                        remaining = deadline - _monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    upto = self._next_ticket
+                    self._cond.release()
+                    try:
+                        self.env.log_flush()
+                    finally:
+                        self._cond.acquire()
+                    self._flushed = max(self._flushed, upto)
+                    self.flushes += 1
+                finally:
+                    self._leader = False
+                    self._cond.notify_all()
+
+    def stats(self):
+        """Returns the number of commits, flushes and the average group
+        size as a dictionary."""
+        with self._cond:
+            return {'commits': self.commits, 'flushes': self.flushes,
+                    'group_size': (self.commits / self.flushes
+                                   if self.flushes else 0.0)}
+
+
+class SlowOpDispatcher:
+    """Calls a slow operation hook from a daemon thread.
+
+    DBEnv.set_slow_op_hook() creates one for its callback and 'env', and
+    queues the slow operations with put(), which never blocks, so the
+    threads doing them don't wait for the callback.  The lock_stat()
+    counters of 'env' are read here too, when an event is delivered.
+    stop() ends the thread once the events already queued are delivered.
+    """
+    LOCK_COUNTERS = ('lock_wait', 'ndeadlocks', 'nlocktimeouts',
+                     'ntxntimeouts')
+
+    def __init__(self, callback, env):
+        self.callback = callback
+        # A weak reference, so the thread doesn't keep the DBEnv alive
+        self._env = _weakref.ref(env)
+        self._env_lock = _threading.Lock()
+        self._last = None
+        self._queue = _queue.SimpleQueue()
+        self.put = self._queue.put
+        self._thread = _threading.Thread(target=self._run, daemon=True,
+                                         name='berkeleydb-slow-ops')
+        self._thread.start()
+
+    def _lock_counters(self):
+        # Under the lock, so stop() (called by DBEnv.close()) waits for
+        # a lock_stat() in progress
+        with self._env_lock:
+            env = self._env() if self._env is not None else None
+            if env is None or not (env.get_open_flags() &
+                                   (db.DB_INIT_LOCK | db.DB_INIT_CDB)):
+                return None
+            try:
+                stat = env.lock_stat()
+            except db.DBError:
+                return None
+        return [stat[name] for name in self.LOCK_COUNTERS]
+
+    def _lock_waits(self):
+        # The counters are global to the environment: the changes since
+        # the previous event (or since the hook was set)
+        counters = self._lock_counters()
+        if counters is None:
+            return None
+        last, self._last = self._last, counters
+        if last is None:
+            last = counters
+        return {name: new - old for name, new, old
+                in zip(self.LOCK_COUNTERS, counters, last)}
+
+    def _run(self):
+        self._last = self._lock_counters()
+        while True:
+            event = self._queue.get()
+            if event is None:
+                return
+            try:
+                self.callback(*event, self._lock_waits())
+            except Exception:
+                sys.excepthook(*sys.exc_info())
+
+    def stop(self):
+        with self._env_lock:
+            self._env = None
+        self._queue.put(None)
 
 
 #------------------------------------------------------------------------
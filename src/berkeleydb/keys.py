@@ -0,0 +1,31 @@
+#-------------------------------------------------------------------------
+#  Order preserving encoding of tuples as Btree keys.
+#-------------------------------------------------------------------------
+
+"""Tuples packed into keys which sort like the tuples.
+
+    key = keys.pack((user_id, b'orders', 2024, -3.5, None))
+    d.put(key, data)
+    user_id, kind, year, score, nothing = keys.unpack(key)
+
+    c = d.cursor()
+    start, end = keys.range((user_id,))   # Every key starting with user_id
+    rec = c.set_range(start)
+
+The encoding, implemented in the extension, is the one of the
+FoundationDB tuple layer: the packed keys compare with memcmp(), the
+default Btree comparison, like the tuples compare in Python, so there is
+no need for a set_bt_compare() callback.  None, bool, int (of any size),
+float, bytes, str and nested tuples are supported.  Between types, None
+sorts first, then bytes, str, tuples, ints and floats, and bools.
+"""
+
+from ._berkeleydb import _keys_pack as pack, _keys_unpack as unpack
+
+
+def range(prefix):
+    """Returns (start, end), the range of the keys packed from tuples
+    starting with the tuple 'prefix', for cursor.set_range(start) and
+    keys lower than end."""
+    key = pack(prefix)
+    return key + b'\x00', key + b'\xff'
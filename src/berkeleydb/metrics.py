@@ -0,0 +1,236 @@
+#-------------------------------------------------------------------------
+#  Periodic sampling of environment and database statistics, exported
+#  in the Prometheus text exposition format.
+#-------------------------------------------------------------------------
+
+"""Statistics collector for a DBEnv and its databases.
+
+    collector = StatsCollector(env, dbs={'users': users_db}, interval=10)
+    collector.start()
+    ...
+    text = collector.exposition()      # Serve it as /metrics
+    elapsed, changes = collector.deltas()
+    collector.stop()
+
+Samples are taken with the stat methods called with snapshot=True, so
+they are struct sequences (like os.stat_result) instead of dictionaries:
+fields are read as attributes (snap.cache_hit) and delta() subtracts two
+snapshots of the same kind.
+"""
+
+import os
+import threading
+from time import monotonic as _monotonic
+
+from . import db
+
+
+# Fields that only grow, exported as Prometheus counters.  The others
+# (sizes, configuration, current and maximum values) are gauges.
+COUNTERS = frozenset([
+    # memp_stat() and its per file statistics
+    'cache_hit', 'cache_miss', 'page_create', 'page_in', 'page_out',
+    'ro_evict', 'rw_evict', 'page_trickle', 'hash_searches',
+    'hash_examined', 'hash_nowait', 'hash_wait', 'mvcc_frozen',
+    'mvcc_thawed', 'mvcc_freed', 'alloc', 'alloc_buckets', 'alloc_pages',
+    'io_wait', 'sync_interrupted', 'map',
+    # lock_stat()
+    'nrequests', 'nreleases', 'nupgrade', 'ndowngrade', 'lock_nowait',
+    'lock_wait', 'ndeadlocks', 'nlocktimeouts', 'ntxntimeouts',
+    'objs_wait', 'objs_nowait', 'lockers_wait', 'lockers_nowait',
+    # log_stat()
+    'record', 'w_mbytes', 'w_bytes', 'wc_mbytes', 'wc_bytes', 'wcount',
+    'wcount_fill', 'rcount', 'scount',
+    # txn_stat()
+    'nbegins', 'naborts', 'ncommits', 'nrestores',
+    # every subsystem
+    'region_wait', 'region_nowait',
+])
+
+
+def delta(current, previous):
+    """Returns the change between two snapshots (or two stat dictionaries)
+    of the same kind: integer fields are subtracted, the others (LSNs, for
+    instance) are taken from 'current'.
+    """
+    if isinstance(current, dict):
+        return {k: _sub(v, previous.get(k)) for k, v in current.items()}
+    return type(current)([_sub(v, p) for v, p in zip(current, previous)])
+
+
+def _sub(value, previous):
+    if isinstance(value, int) and isinstance(previous, int):
+        return value - previous
+    return value
+
+
+def partition_files(d):
+    """Returns the names of the files holding the partitions of a database
+    partitioned with DB.set_partition(), in partition order, or an empty
+    list if the database is not partitioned.
+    """
+    parts = d.get_partition()[0]
+    if not parts:
+        return []
+    name = os.path.basename(d.get_dbname()[0])
+    return ['__dbp.%s.%03d' % (name, i) for i in range(parts)]
+
+
+def partition_stats(env, d, snapshot=False):
+    """Returns the memory pool statistics of every partition of a database,
+    as a list in partition order, so hot partitions can be spotted.  A
+    partition not in the cache yet has None.
+    """
+    files = env.memp_stat(snapshot=snapshot)[1]
+    by_name = {os.path.basename(name): stats for name, stats in files.items()}
+    return [by_name.get(name) for name in partition_files(d)]
+
+
+def _escape(value):
+    return (value.replace('\\', '\\\\').replace('\n', '\\n')
+            .replace('"', '\\"'))
+
+
+class StatsCollector:
+    def __init__(self, env, dbs=None, interval=10.0, prefix='berkeleydb',
+                 db_stat_flags=db.DB_FAST_STAT):
+        """'dbs' maps a label to each DB object whose statistics are
+        collected.  By default, DB.stat() is called with DB_FAST_STAT, so
+        it doesn't traverse the databases.
+        """
+        self.env = env
+        self.dbs = dict(dbs or {})
+        self.interval = interval
+        self.prefix = prefix
+        self.db_stat_flags = db_stat_flags
+        self.current = None     # (monotonic time, sample)
+        self.previous = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """Takes a new sample, and returns it.  A sample is a dictionary
+        mapping the subsystem ('memp', 'lock', 'log', 'txn', 'mutex') to
+        its snapshot.  'memp_files' maps file names to their memory pool
+        snapshots, and 'db' the labels given in 'dbs' to DB snapshots.
+        Subsystems not initialized in the environment are skipped.
+        """
+        env = self.env
+        flags = env.get_open_flags()
+        sample = {}
+        if flags & db.DB_INIT_MPOOL:
+            sample['memp'], sample['memp_files'] = \
+                    env.memp_stat(snapshot=True)
+        if flags & (db.DB_INIT_LOCK | db.DB_INIT_CDB):
+            sample['lock'] = env.lock_stat(snapshot=True)
+        if flags & db.DB_INIT_LOG:
+            sample['log'] = env.log_stat(snapshot=True)
+        if flags & db.DB_INIT_TXN:
+            sample['txn'] = env.txn_stat(snapshot=True)
+        sample['mutex'] = env.mutex_stat(snapshot=True)
+        sample['db'] = {label: d.stat(flags=self.db_stat_flags, snapshot=True)
+                        for label, d in self.dbs.items()}
+        with self._lock:
+            self.previous = self.current
+            self.current = (_monotonic(), sample)
+        return sample
+
+    def deltas(self):
+        """Returns (seconds, changes) between the two last samples, where
+        'changes' has the structure of a sample, with delta() snapshots.
+        Returns None if there are not two samples yet.
+        """
+        with self._lock:
+            previous, current = self.previous, self.current
+        if previous is None:
+            return None
+        t0, old = previous
+        t1, new = current
+        changes = {}
+        for key, value in new.items():
+            if key not in old:
+                continue
+            if isinstance(value, dict):
+                changes[key] = {k: delta(v, old[key][k])
+                                for k, v in value.items() if k in old[key]}
+            else:
+                changes[key] = delta(value, old[key])
+        return (t1 - t0, changes)
+
+    def rate(self, subsystem, field, label=None):
+        """Per second change of a field between the two last samples, for
+        instance rate('lock', 'ndeadlocks') or rate('db', 'nkeys', 'users').
+        """
+        d = self.deltas()
+        if d is None:
+            return None
+        seconds, changes = d
+        snap = changes[subsystem]
+        if label is not None:
+            snap = snap[label]
+        if seconds <= 0:
+            return 0.0
+        return getattr(snap, field) / seconds
+
+    def exposition(self):
+        """Returns the last sample (taking one if there is none) in the
+        Prometheus text exposition format.
+        """
+        with self._lock:
+            current = self.current
+        if current is None:
+            sample = self.sample()
+        else:
+            sample = current[1]
+
+        metrics = {}
+
+        def add(name, snap, labels=''):
+            for field, value in zip(type(snap)._fields, snap):
+                if not isinstance(value, int):
+                    continue
+                metric = '%s_%s_%s' % (self.prefix, name, field)
+                kind = 'counter' if field in COUNTERS else 'gauge'
+                metrics.setdefault(metric, (kind, []))[1].append(
+                        (labels, value))
+
+        for name in ('memp', 'lock', 'log', 'txn', 'mutex'):
+            if name in sample:
+                add(name, sample[name])
+        for filename, snap in sample.get('memp_files', {}).items():
+            add('memp_file', snap, '{file="%s"}' % _escape(filename))
+        for label, snap in sample['db'].items():
+            add('db', snap, '{db="%s"}' % _escape(label))
+
+        lines = []
+        for metric, (kind, values) in metrics.items():
+            lines.append('# TYPE %s %s' % (metric, kind))
+            for labels, value in values:
+                lines.append('%s%s %d' % (metric, labels, value))
+        return '\n'.join(lines) + '\n'
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except db.DBError as e:
+                self.last_error = e
+
+    def start(self):
+        """Samples every 'interval' seconds in a daemon thread."""
+        if self._thread is not None:
+            return
+        self.sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='berkeleydb-metrics')
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
@@ -0,0 +1,150 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+"""TestCases for the asyncio front-end, berkeleydb.aio.
+"""
+
+import asyncio
+import unittest
+
+from .test_all import db, rmtree, get_new_environment_path
+
+from berkeleydb import aio
+
+#----------------------------------------------------------------------
+
+class AsyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+
+    def tearDown(self):
+        rmtree(self.homeDir)
+
+    async def _open(self):
+        env = aio.AsyncEnv(db.DBEnv())
+        await env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                       db.DB_INIT_LOCK | db.DB_INIT_LOG | db.DB_INIT_TXN |
+                       db.DB_THREAD)
+        d = aio.AsyncDB(db.DB(env.cobj))
+        await d.open('test', dbtype=db.DB_BTREE,
+                     flags=db.DB_CREATE | db.DB_AUTO_COMMIT | db.DB_THREAD)
+        return env, d
+
+    def test01_basics(self):
+        async def run():
+            env, d = await self._open()
+            try:
+                async with await env.txn_begin() as txn:
+                    self.assertIsInstance(txn, aio.AsyncTxn)
+                    for i in range(250):
+                        await d.put(b'%03d' % i, b'data %d' % i, txn=txn)
+                self.assertEqual(await d.get(b'007'), b'data 7')
+                self.assertTrue(await d.exists(b'249'))
+
+                txn = await env.txn_begin()
+                await d.delete(b'007', txn=txn)
+                await txn.abort()
+                self.assertEqual(await d.get(b'007'), b'data 7')
+
+                try:
+                    async with await env.txn_begin() as txn:
+                        await d.delete(b'007', txn)
+                        raise ValueError
+                except ValueError:
+                    pass
+                self.assertEqual(await d.get(b'007'), b'data 7')
+
+                await env.txn_checkpoint()
+                self.assertEqual(d.get_type(), db.DB_BTREE)
+            finally:
+                await d.close()
+                await env.close()
+
+        asyncio.run(run())
+
+    def test02_cursor(self):
+        async def run():
+            env, d = await self._open()
+            try:
+                for i in range(250):
+                    await d.put(b'%03d' % i, b'data %d' % i)
+                # Calls can overlap
+                values = await asyncio.gather(*[d.get(b'%03d' % i)
+                                                for i in range(250)])
+                self.assertEqual(values,
+                                 [b'data %d' % i for i in range(250)])
+
+                async with d.cursor() as c:
+                    keys = [key async for key, data in c]
+                self.assertEqual(keys, [b'%03d' % i for i in range(250)])
+
+                async with d.cursor() as c:
+                    sizes = [len(batch) async for batch in c.batches(100)]
+                self.assertEqual(sizes, [100, 100, 50])
+
+                c = d.cursor()
+                self.assertEqual(await c.set(b'100'), (b'100', b'data 100'))
+                self.assertEqual(await c.next(), (b'101', b'data 101'))
+                c2 = await c.dup(db.DB_POSITION)
+                self.assertIsInstance(c2, aio.AsyncCursor)
+                self.assertEqual(await c2.current(), (b'101', b'data 101'))
+                await c2.close()
+                # Iterating goes on from the current position
+                self.assertEqual(await c.set_range(b'2405'),
+                                 (b'241', b'data 241'))
+                keys = [key async for key, data in c]
+                self.assertEqual(keys, [b'%03d' % i for i in range(242, 250)])
+                await c.close()
+            finally:
+                await d.close()
+                await env.close()
+
+        asyncio.run(run())
+
+
+#----------------------------------------------------------------------
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (AsyncTestCase,):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -151,31 +151,47 @@ class PrintInfoFakeTest(unittest.TestCase):
 
 def suite(module_prefix='', timing_check=None):
     test_modules = [
+        'test_aio',
         'test_associate',
         'test_basics',
+        'test_bench',
+        'test_blobstore',
+        'test_bloom',
         'test_dbenv',
         'test_db',
         'test_compare',
         'test_compat',
+        'test_compression',
         'test_cursor_pget_bug',
         'test_dbobj',
+        'test_dbpool',
+        'test_dbrecio',
         'test_dbshelve',
+        'test_dbutils',
         'test_dbtables',
         'test_distributed_transactions',
         'test_early_close',
+        'test_ext_file',
         'test_concurrent_data_store',
         'test_fileid',
         'test_get_none',
+        'test_hash',
         'test_heap',
         'test_join',
+        'test_key_type',
+        'test_keys',
+        'test_latency',
         'test_lock',
+        'test_metrics',
         'test_misc',
+        'test_partition',
         'test_pickle',
         'test_queue',
         'test_recno',
         'test_replication',
         'test_sequence',
         'test_thread',
+        'test_writebatch',
         ]
 
     alltests = unittest.TestSuite()
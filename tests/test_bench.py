@@ -0,0 +1,191 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+"""TestCases for berkeleydb.bench and berkeleydb.bench.ycsb.
+"""
+
+import contextlib
+import io
+import json
+import os
+import random
+import unittest
+from collections import Counter
+
+from .test_all import db, rmtree, get_new_environment_path
+
+from berkeleydb import bench
+from berkeleydb.bench import ycsb
+from berkeleydb.bench.__main__ import main
+
+
+class BenchTestCase(unittest.TestCase):
+    def test01_run(self):
+        results = bench.run(benchmarks=['get', 'put', 'append'],
+                            methods=['btree', 'recno'], envs=['plain', 'txn'],
+                            threads=[1, 2], records=100)
+        names = set((r['benchmark'], r['method'], r['env'], r['threads'])
+                    for r in results)
+        self.assertIn(('get', 'btree', 'plain', 2), names)
+        self.assertIn(('put', 'recno', 'txn', 2), names)
+        self.assertIn(('append', 'recno', 'txn', 1), names)
+        # No append to Btree, and no concurrent writes without locking
+        self.assertNotIn(('append', 'btree', 'txn', 1), names)
+        self.assertNotIn(('put', 'btree', 'plain', 2), names)
+        for r in results:
+            self.assertEqual(100, r['ops'])
+            self.assertGreater(r['ops_per_sec'], 0)
+
+    def test02_all_benchmarks(self):
+        for name in sorted(bench.BENCHMARKS):
+            results = bench.run(benchmarks=[name], envs=['txn'], records=50)
+            self.assertTrue(results, name)
+
+    def test03_compare(self):
+        old = bench.run(benchmarks=['get'], methods=['hash'],
+                        envs=['plain'], records=50)
+        new = [dict(r, ops_per_sec=r['ops_per_sec'] / 2) for r in old]
+        [(key, before, after, ratio, regression)] = bench.compare(old, new)
+        self.assertEqual(('get', 'hash', 'plain'), key[:3])
+        self.assertAlmostEqual(0.5, ratio)
+        self.assertTrue(regression)
+        [(key, before, after, ratio, regression)] = bench.compare(old, old)
+        self.assertFalse(regression)
+
+    def test04_main(self):
+        homeDir = get_new_environment_path()
+        self.addCleanup(rmtree, homeDir)
+        output = os.path.join(homeDir, 'results.json')
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertEqual(0, main(['-b', 'get', '-m', 'btree',
+                                      '-e', 'plain', '-n', '50',
+                                      '-o', output]))
+            self.assertEqual(0, main(['--compare', output, output]))
+        with open(output) as f:
+            data = json.load(f)
+        self.assertEqual(db.__version__, data['system']['berkeleydb'])
+        self.assertEqual(1, len(data['results']))
+        self.assertEqual(2, len(out.getvalue().splitlines()))
+
+    @unittest.skipIf(db.version() < (5, 3),
+                     "Heap databases need Berkeley DB 5.3 or up")
+    def test05_heap(self):
+        results = bench.run(benchmarks=['append'], methods=['heap'],
+                            envs=['plain'], records=50)
+        self.assertEqual([('append', 'heap')],
+                         [(r['benchmark'], r['method']) for r in results])
+
+    def test06_pool_cursor(self):
+        results = bench.run(benchmarks=['pool_cursor', 'pool_new_cursor'],
+                            methods=['btree'], envs=['plain'], threads=[2],
+                            records=100)
+        self.assertEqual(['pool_cursor', 'pool_new_cursor'],
+                         sorted(r['benchmark'] for r in results))
+        for r in results:
+            self.assertEqual(100, r['ops'])
+
+
+class YCSBTestCase(unittest.TestCase):
+    def test01_distributions(self):
+        rng = random.Random(0)
+        z = ycsb.ScrambledZipfianGenerator(1000, rng)
+        counts = Counter(z.next() for i in range(10000))
+        self.assertTrue(all(0 <= i < 1000 for i in counts))
+        # Skewed: the most popular item is far above the mean
+        self.assertGreater(counts.most_common(1)[0][1], 100)
+
+        latest = ycsb.LatestGenerator(1000, rng)
+        counts = Counter(latest.next(2000) for i in range(10000))
+        self.assertTrue(all(0 <= i < 2000 for i in counts))
+        self.assertEqual(1999, counts.most_common(1)[0][0])
+
+        u = ycsb.UniformGenerator(10, rng)
+        self.assertEqual(set(range(10)), set(u.next() for i in range(1000)))
+
+    def test02_percentile(self):
+        h = Counter()
+        for ns in [1000] * 90 + [100000] * 10:
+            h[ycsb._bucket(ns)] += 1
+        self.assertAlmostEqual(1.0, ycsb.percentile(h, 0.5), delta=0.05)
+        self.assertAlmostEqual(100.0, ycsb.percentile(h, 0.99), delta=5)
+
+    def test03_workloads(self):
+        for workload in sorted(ycsb.WORKLOADS):
+            config = ycsb.Config(workload=workload, records=200,
+                                 operations=500, threads=2, seed=1)
+            result = ycsb.run(config)
+            self.assertEqual(500, result['operations'])
+            self.assertEqual(500, sum(s['count'] for s in
+                                      result['latency'].values()))
+            for s in result['latency'].values():
+                self.assertLessEqual(s['p50_us'], s['p99_us'])
+                self.assertLessEqual(s['p99_us'], s['max_us'])
+
+    def test04_processes(self):
+        config = ycsb.Config(workload='A', records=200, operations=400,
+                             threads=2, processes=2, env='cdb')
+        result = ycsb.run(config)
+        self.assertEqual(400, result['operations'])
+        self.assertEqual(['read', 'update'], sorted(result['latency']))
+
+    def test05_config(self):
+        self.assertRaises(ValueError, ycsb.Config, workload='E',
+                          method='hash')
+        self.assertRaises(ValueError, ycsb.Config, env='plain', threads=2)
+        ycsb.Config(workload='C', env='plain', threads=2)
+
+    def test06_inserts(self):
+        inserts = ycsb._Inserts(10, 1, 3)
+        self.assertEqual(5, inserts.keynum(5))
+        first, second, third = [inserts.next() for i in range(3)]
+        self.assertEqual([11, 14, 17],
+                         [inserts.keynum(i) for i in (first, second, third)])
+        inserts.done(second)
+        inserts.done(third)
+        self.assertEqual(10, inserts.count())
+        inserts.done(first)
+        self.assertEqual(13, inserts.count())
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (BenchTestCase, YCSBTestCase):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,168 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+
+"""TestCases for berkeleydb.blobstore.
+"""
+
+import io
+import os
+import unittest
+
+from .test_all import db, rmtree, get_new_environment_path
+
+from berkeleydb import blobstore
+
+#----------------------------------------------------------------------
+
+class BlobStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_INIT_LOCK | db.DB_INIT_LOG | db.DB_INIT_TXN |
+                      db.DB_THREAD | db.DB_PRIVATE)
+        self.d = db.DB(self.env)
+        self.d.open('blobs.db', dbtype=db.DB_BTREE,
+                    flags=db.DB_CREATE | db.DB_THREAD | db.DB_AUTO_COMMIT)
+        self.store = blobstore.BlobStore(self.d, chunk_size=1000,
+                                         env=self.env, threads=4)
+        self.data = os.urandom(10500)
+
+    def tearDown(self):
+        self.store.close()
+        self.d.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def test01_put_get(self):
+        self.store.put(b'obj', self.data)
+        self.assertIn(b'obj', self.store)
+        self.assertEqual((10500, 1000), self.store.stat(b'obj'))
+        self.assertEqual(self.data, self.store.get(b'obj'))
+        self.assertEqual(self.data[999:2001],
+                         self.store.get(b'obj', 999, 1002))
+        self.assertEqual(self.data[10000:], self.store.get(b'obj', 10000))
+        self.assertEqual(b'', self.store.get(b'obj', 20000))
+        self.assertRaises(KeyError, self.store.get, b'missing')
+
+        # A smaller version drops the chunks no longer used
+        self.store.put(b'obj', b'small')
+        self.assertEqual(b'small', self.store.get(b'obj'))
+        self.assertEqual(2, len(self.d.keys()))
+
+        # Any bytes-like object
+        self.store.put(b'obj', bytearray(b'array'))
+        self.assertEqual(b'array', self.store.get(b'obj'))
+
+        self.store.put(b'empty', b'')
+        self.assertEqual(b'', self.store.get(b'empty'))
+        self.assertEqual([b'empty', b'obj'], self.store.oids())
+
+    def test02_txn(self):
+        txn = self.env.txn_begin()
+        self.store.put(b'obj', self.data, txn=txn)
+        self.assertEqual(self.data[5:50],
+                         self.store.get(b'obj', 5, 45, txn=txn))
+        txn.abort()
+        self.assertNotIn(b'obj', self.store)
+
+    def test03_upload_download(self):
+        size = self.store.upload(b'obj', io.BytesIO(self.data))
+        self.assertEqual(len(self.data), size)
+        out = io.BytesIO()
+        self.assertEqual(len(self.data), self.store.download(b'obj', out))
+        self.assertEqual(self.data, out.getvalue())
+        out = io.BytesIO()
+        self.store.download(b'obj', out, 1500, 3000)
+        self.assertEqual(self.data[1500:4500], out.getvalue())
+
+        class Failing(io.RawIOBase):
+            # Fails after 2 chunks
+            reads = 0
+
+            def readable(self):
+                return True
+
+            def readinto(self, b):
+                self.reads += 1
+                if self.reads > 2:
+                    raise OSError('broken')
+                b[:] = bytes(len(b))
+                return len(b)
+
+        keys = self.d.keys()
+        self.assertRaises(OSError, self.store.upload, b'obj', Failing())
+        # The upload ran in a transaction, so nothing changed
+        self.assertEqual(self.data, self.store.get(b'obj'))
+        self.assertEqual(keys, self.d.keys())
+
+    def test04_delete(self):
+        self.store.put(b'obj', self.data)
+        self.store.delete(b'obj')
+        self.assertNotIn(b'obj', self.store)
+        self.assertEqual([], self.d.keys())
+        self.assertRaises(KeyError, self.store.delete, b'obj')
+
+    def test05_interrupted_put(self):
+        self.store.put(b'obj', self.data)
+
+        def crash(*args):
+            raise OSError('crash')
+
+        # The chunks of the new version are written, not its manifest
+        self.store._finish = crash
+        self.assertRaises(OSError, self.store.put, b'obj',
+                          os.urandom(20500))
+        del self.store._finish
+        self.assertEqual(self.data, self.store.get(b'obj'))
+
+        # The next put drops the chunks left over
+        self.store.put(b'obj', b'small')
+        self.assertEqual(b'small', self.store.get(b'obj'))
+        self.assertEqual(2, len(self.d.keys()))
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (BlobStoreTestCase,):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,171 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+
+"""TestCases for berkeleydb.bloom.
+"""
+
+import os
+import unittest
+
+from .test_all import db, rmtree, get_new_environment_path
+from berkeleydb import bloom
+
+
+class BloomFilterTestCase(unittest.TestCase):
+    def test01_filter(self):
+        bf = bloom.BloomFilter(1000, 0.01)
+        keys = [b'key%d' % i for i in range(1000)]
+        for key in keys:
+            bf.add(key)
+        self.assertTrue(all(key in bf for key in keys))
+        misses = sum(b'miss%d' % i in bf for i in range(10000))
+        self.assertLess(misses, 300)
+        self.assertLess(bf.false_positive_rate(), 0.02)
+        self.assertTrue(bf.add(keys[0]))
+        bf.clear()
+        self.assertEqual(0, len(bf))
+        self.assertRaises(ValueError, bloom.BloomFilter, 0)
+        self.assertRaises(ValueError, bloom.BloomFilter, 10, 1.5)
+
+
+class BloomDBTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_PRIVATE)
+        self.d = db.DB(self.env)
+        self.d.open('test.db', dbtype=db.DB_BTREE, flags=db.DB_CREATE)
+        self.path = os.path.join(self.homeDir, 'test.bloom')
+        for i in range(100):
+            self.d.put(b'key%d' % i, b'data%d' % i)
+
+    def tearDown(self):
+        self.d.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def test01_lookups(self):
+        with bloom.BloomDB(self.d, self.path) as b:
+            self.assertTrue(os.path.exists(self.path))
+            self.assertEqual(b'data5', b.get(b'key5'))
+            self.assertEqual(b'data6', b[b'key6'])
+            self.assertTrue(b.exists(b'key7'))
+            self.assertIsNone(b.get(b'missing'))
+            self.assertEqual(b'dflt', b.get(b'missing', b'dflt'))
+            self.assertFalse(b'missing' in b)
+            self.assertRaises(KeyError, b.__getitem__, b'missing')
+            b.put(b'new', b'data')
+            self.assertTrue(b.exists(b'new'))
+            b.delete(b'new')
+            self.assertFalse(b.exists(b'new'))
+
+    def test02_persistence(self):
+        b = bloom.BloomDB(self.d, self.path)
+        b.put(b'new', b'data')
+        b.close()
+        b = bloom.BloomDB(self.d, self.path)
+        self.assertTrue(b.exists(b'new'))
+        b.put(b'newer', b'data')
+        # Not saved, as after a crash: the filter is rebuilt
+        self.d.put(b'behind', b'data')
+        b = bloom.BloomDB(self.d, self.path)
+        self.assertTrue(b.exists(b'behind'))
+        self.assertTrue(b.exists(b'newer'))
+        b.close()
+
+        b = bloom.BloomDB(self.d, self.path, error_rate=0.001)
+        self.assertEqual(0.001, b.filter.error_rate)
+        b.close()
+
+    def test03_rebuild(self):
+        b = bloom.BloomDB(self.d, self.path, capacity=10000)
+        for i in range(100):
+            b.delete(b'key%d' % i)
+        b.rebuild()
+        self.assertEqual(0, len(b.filter))
+        self.assertEqual(10000, b.filter.capacity)
+        b.close()
+
+    def test04_closed(self):
+        b = bloom.BloomDB(self.d, self.path)
+        b.close()
+        b.close()
+        self.assertRaises(db.DBError, b.put, b'new', b'data')
+        self.assertRaises(db.DBError, b.get, b'key1')
+        self.assertRaises(db.DBError, b.exists, b'key1')
+        self.assertRaises(db.DBError, b.__getitem__, b'key1')
+        self.assertRaises(db.DBError, b.rebuild)
+        self.assertRaises(db.DBError, b.save)
+        # Nothing was written
+        self.assertIsNone(self.d.get(b'new'))
+
+
+class RecnoBloomDBTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_PRIVATE)
+        self.d = db.DB(self.env)
+        self.d.open('test.db', dbtype=db.DB_RECNO, flags=db.DB_CREATE)
+        self.path = os.path.join(self.homeDir, 'test.bloom')
+
+    def tearDown(self):
+        self.d.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def test01_append(self):
+        with bloom.BloomDB(self.d, self.path) as b:
+            recno = b.put(0, b'data', flags=db.DB_APPEND)
+            self.assertTrue(b.exists(recno))
+            self.assertEqual(b'data', b.get(recno))
+            self.assertIsNone(b.get(recno + 1))
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (BloomFilterTestCase, BloomDBTestCase,
+                 RecnoBloomDBTestCase):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,168 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+
+"""TestCases for Btree compression and prefix functions.
+"""
+
+import struct
+import unittest
+
+from .test_all import db, rmtree, get_new_environment_path
+
+
+def delta_compress(prev_key, prev_data, key, data):
+    n = 0
+    while n < min(len(prev_key), len(key), 255) and prev_key[n] == key[n]:
+        n += 1
+    return struct.pack('>BHH', n, len(key) - n, len(data)) + key[n:] + data
+
+
+def delta_decompress(prev_key, prev_data, compressed):
+    n, size, data_size = struct.unpack_from('>BHH', compressed)
+    start = struct.calcsize('>BHH')
+    key = prev_key[:n] + compressed[start:start + size]
+    data = compressed[start + size:start + size + data_size]
+    return key, data, start + size + data_size
+
+
+class CompressionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_PRIVATE)
+        self.keys = [b'/usr/share/doc/berkeleydb/examples/%05d' % i
+                     for i in range(2000)]
+
+    def tearDown(self):
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def fill(self, setup, name):
+        d = db.DB(self.env)
+        setup(d)
+        d.open(name, dbtype=db.DB_BTREE, flags=db.DB_CREATE)
+        for key in self.keys:
+            d.put(key, b'x')
+        for key in self.keys:
+            self.assertEqual(b'x', d.get(key))
+        self.assertEqual(self.keys, d.keys())
+        c = d.cursor()
+        self.assertEqual((self.keys[1000], b'x'),
+                         c.set_range(self.keys[1000][:-1] + b'!'))
+        c.close()
+        pages = d.stat()['leaf_pg']
+        d.close()
+        return pages
+
+    def test01_native(self):
+        plain = self.fill(lambda d: None, 'plain.db')
+        compressed = self.fill(lambda d: d.set_bt_compress(), 'test.db')
+        self.assertLess(compressed, plain)
+
+    def test02_callbacks(self):
+        plain = self.fill(lambda d: None, 'plain.db')
+        compressed = self.fill(
+                lambda d: d.set_bt_compress(delta_compress, delta_decompress),
+                'test.db')
+        self.assertLess(compressed, plain)
+
+    def test03_errors(self):
+        d = db.DB(self.env)
+        self.assertRaises(TypeError, d.set_bt_compress, delta_compress)
+        self.assertRaises(TypeError, d.set_bt_compress, 1, 2)
+        d.set_bt_compress()
+        self.assertRaises(RuntimeError, d.set_bt_compress)
+        d.close()
+
+
+class PrefixTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_PRIVATE)
+
+    def tearDown(self):
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def check(self, prefix):
+        d = db.DB(self.env)
+        d.set_bt_compare(lambda a, b: (a > b) - (a < b))
+        d.set_bt_prefix(prefix)
+        self.assertRaises(RuntimeError, d.set_bt_prefix, 'lexical')
+        d.open('test.db', dbtype=db.DB_BTREE, flags=db.DB_CREATE)
+        keys = [b'/a/long/shared/prefix/%05d' % i for i in range(2000)]
+        for key in keys:
+            d.put(key, b'x' * 50)
+        self.assertEqual(keys, d.keys())
+        d.close()
+
+    def test01_lexical(self):
+        self.check('lexical')
+
+    def test02_callback(self):
+        calls = []
+
+        def prefix(left, right):
+            calls.append((left, right))
+            n = 0
+            while n < len(left) and left[n] == right[n]:
+                n += 1
+            return min(n + 1, len(right))
+
+        self.check(prefix)
+        self.assertTrue(calls)
+
+    def test03_errors(self):
+        d = db.DB(self.env)
+        self.assertRaises(ValueError, d.set_bt_prefix, 'spam')
+        self.assertRaises(TypeError, d.set_bt_prefix, 42)
+        d.close()
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (CompressionTestCase, PrefixTestCase):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
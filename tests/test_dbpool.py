@@ -0,0 +1,165 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+"""TestCases for berkeleydb.dbpool.
+"""
+
+import threading
+import unittest
+
+from .test_all import db, rmtree, get_new_environment_path
+
+from berkeleydb import dbpool
+
+#----------------------------------------------------------------------
+
+class DBPoolTestCase(unittest.TestCase):
+    envflags = db.DB_CREATE | db.DB_INIT_MPOOL | db.DB_THREAD
+
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, self.envflags)
+        self.pool = dbpool.DBPool(self.env, 'test.db', dbtype=db.DB_BTREE,
+                                  flags=db.DB_CREATE | db.DB_THREAD,
+                                  max_handles=2)
+
+    def tearDown(self):
+        self.pool.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def test01_handles(self):
+        with self.pool.handle() as d:
+            d.put(b'key', b'data')
+            with self.pool.handle() as d2:
+                self.assertIsNot(d, d2)
+                self.assertEqual(d2.get(b'key'), b'data')
+                self.assertRaises(dbpool.DBPoolError, self.pool.acquire,
+                                  timeout=0.01)
+        self.assertEqual(len(self.pool), 2)
+        with self.pool.handle() as d3:
+            self.assertIn(d3, (d, d2))
+
+    def test02_threads(self):
+        in_use = []
+        peak = []
+        lock = threading.Lock()
+
+        def worker(n):
+            for i in range(50):
+                with self.pool.handle() as d:
+                    with lock:
+                        in_use.append(d)
+                        peak.append(len(in_use))
+                    d.put(b'%d-%d' % (n, i), b'data')
+                    with lock:
+                        in_use.remove(d)
+
+        threads = [threading.Thread(target=worker, args=(n, ))
+                   for n in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertLessEqual(max(peak), 2)
+        with self.pool.handle() as d:
+            self.assertEqual(len(d), 300)
+
+    def test03_cursors(self):
+        with self.pool.handle() as d:
+            for i in range(10):
+                d.put(b'%d' % i, b'data')
+
+        with self.pool.cursor() as c1:
+            self.assertEqual(c1.first(), (b'0', b'data'))
+        with self.pool.cursor() as c2:
+            self.assertEqual(c2.set(b'5'), (b'5', b'data'))
+        if self.pool.reuse_cursors:
+            # The same cursor, left where it was
+            self.assertIs(c1, c2)
+            self.assertEqual(1, len(self.pool._cursors[id(d)]))
+            with self.pool.cursor() as c3:
+                self.assertIs(c1, c3)
+                self.assertEqual(c3.next(), (b'6', b'data'))
+        else:
+            self.assertEqual([], self.pool._cursors.get(id(d), []))
+            with self.pool.cursor() as c3:
+                self.assertEqual(c3.next(), (b'0', b'data'))
+
+        self.pool.close()
+        self.assertRaises(dbpool.DBPoolError, self.pool.acquire)
+
+    def test04_close(self):
+        d1 = self.pool.acquire()
+        d2 = self.pool.acquire()
+        self.pool.release(d1)
+        self.pool.close()
+        self.assertEqual(len(self.pool), 1)
+        self.pool.release(d2)
+        self.assertEqual(len(self.pool), 0)
+
+    def test05_reuse(self):
+        self.assertTrue(self.pool.reuse_cursors)
+
+
+class LockingDBPoolTestCase(DBPoolTestCase):
+    envflags = DBPoolTestCase.envflags | db.DB_INIT_LOCK
+
+    def test05_reuse(self):
+        self.assertFalse(self.pool.reuse_cursors)
+
+
+class CDBDBPoolTestCase(DBPoolTestCase):
+    envflags = DBPoolTestCase.envflags | db.DB_INIT_CDB
+
+    def test05_reuse(self):
+        self.assertFalse(self.pool.reuse_cursors)
+
+
+#----------------------------------------------------------------------
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (DBPoolTestCase, LockingDBPoolTestCase, CDBDBPoolTestCase):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,164 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+
+"""TestCases for berkeleydb.dbrecio, DB.get_into(), DB.put_stream() and
+DB.get_stream().
+"""
+
+import io
+import shutil
+import unittest
+
+from .test_all import db, rmtree, get_new_environment_path
+from berkeleydb import dbrecio
+
+
+class DBRecIOTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_PRIVATE)
+        self.d = db.DB(self.env)
+        self.d.open('test.db', dbtype=db.DB_BTREE, flags=db.DB_CREATE)
+        self.value = bytes(range(256)) * 1000
+        self.d.put(b'key', self.value)
+
+    def tearDown(self):
+        self.d.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def test01_get_into(self):
+        buf = bytearray(10)
+        self.assertEqual(10, self.d.get_into(b'key', buf, doff=5))
+        self.assertEqual(self.value[5:15], buf)
+        self.assertEqual(3, self.d.get_into(b'key', buf,
+                                            doff=len(self.value) - 3))
+        self.assertEqual(self.value[-3:], buf[:3])
+        self.assertIsNone(self.d.get_into(b'missing', buf))
+        self.assertRaises(TypeError, self.d.get_into, b'key', b'readonly')
+
+    def test02_raw(self):
+        f = dbrecio.DBRecIO(self.d, b'key')
+        self.assertTrue(f.readable() and f.writable() and f.seekable())
+        self.assertEqual(self.value[:100], f.read(100))
+        buf = bytearray(50)
+        self.assertEqual(50, f.readinto(buf))
+        self.assertEqual(self.value[100:150], buf)
+        self.assertEqual(150, f.tell())
+        self.assertEqual(self.value[150:], f.read())
+        self.assertEqual(b'', f.read(10))
+        self.assertEqual(len(self.value) - 10, f.seek(-10, io.SEEK_END))
+        self.assertRaises(ValueError, f.seek, -1)
+        f.close()
+        self.assertRaises(ValueError, f.read)
+
+    def test03_write(self):
+        f = dbrecio.DBRecIO(self.d, b'key')
+        f.seek(10)
+        self.assertEqual(5, f.write(b'hello'))
+        self.assertEqual(self.value[:10] + b'hello' + self.value[15:],
+                         self.d.get(b'key'))
+        self.assertEqual(20, f.truncate(20))
+        self.assertEqual(self.value[:10] + b'hello' + self.value[15:20],
+                         self.d.get(b'key'))
+        f.truncate(25)
+        self.assertEqual(25, len(self.d.get(b'key')))
+        f.close()
+
+        f = dbrecio.DBRecIO(self.d, b'new')
+        self.assertEqual(b'', f.read())
+        f.write(bytearray(b'created'))
+        self.assertEqual(b'created', self.d.get(b'new'))
+        f.close()
+
+    def test04_buffered(self):
+        with dbrecio.open(self.d, b'key', buffering=4096) as f:
+            out = io.BytesIO()
+            shutil.copyfileobj(f, out, 1000)
+            self.assertEqual(self.value, out.getvalue())
+
+        with dbrecio.open(self.d, b'lines', 'wb') as f:
+            f.writelines([b'one\n', b'two\n', b'three'])
+        with dbrecio.open(self.d, b'lines', 'ab') as f:
+            f.write(b'\nfour\n')
+        with dbrecio.open(self.d, b'lines') as f:
+            self.assertEqual([b'one\n', b'two\n', b'three\n', b'four\n'],
+                             f.readlines())
+        with dbrecio.open(self.d, b'lines', 'r+b') as f:
+            f.seek(4)
+            f.write(b'TWO')
+            f.seek(0)
+            self.assertEqual(b'one\nTWO\n', f.read(8))
+        self.assertRaises(ValueError, dbrecio.open, self.d, b'key', 'r')
+
+    def test05_streams(self):
+        src = io.BytesIO(self.value)
+        self.assertEqual(len(self.value),
+                         self.d.put_stream(b'stream', src, chunk_size=1000))
+        self.assertEqual(self.value, self.d.get(b'stream'))
+        # The record is replaced, not written over
+        self.d.put_stream(b'stream', io.BytesIO(b'short'))
+        self.assertEqual(b'short', self.d.get(b'stream'))
+        self.assertEqual(0, self.d.put_stream(b'empty', io.BytesIO()))
+        self.assertEqual(b'', self.d.get(b'empty'))
+
+        out = io.BytesIO()
+        self.assertEqual(len(self.value),
+                         self.d.get_stream(b'key', out, chunk_size=999))
+        self.assertEqual(self.value, out.getvalue())
+        out = io.BytesIO()
+        self.assertEqual(len(self.value),
+                         self.d.get_stream(b'key', out, chunk_size=1024))
+        self.assertEqual(self.value, out.getvalue())
+        self.assertEqual(0, self.d.get_stream(b'empty', io.BytesIO()))
+        self.assertIsNone(self.d.get_stream(b'missing', io.BytesIO()))
+        self.assertRaises(ValueError, self.d.put_stream, b'key', src,
+                          chunk_size=0)
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (DBRecIOTestCase,):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -37,9 +37,12 @@ are met:
 TestCases for checking dbShelve objects.
 """
 
+import gc
 import os, string, sys
+import pickle
 import random
 import unittest
+import weakref
 
 printable_bytes = string.printable.encode('iso-8859-1')  # Transparent_encoding
 
@@ -208,6 +211,25 @@ class DBShelveTestCase(unittest.TestCase):
         self.checkrec(key, value)
         del c
 
+        count = 0
+        c = d.cursor(lazy=True)
+        rec = c.first()
+        while rec is not None:
+            count = count + 1
+            key, value = rec
+            self.assertIsInstance(value, dbshelve.DBShelfValue)
+            self.checkrec(key, value.decode())
+            self.assertIs(value.decode(), value.decode())
+            rec = c.next()
+
+        self.assertEqual(count, len(d))
+
+        c2 = c.dup()
+        key, value = c2.set(self.mk(b'SS'))
+        self.assertIsInstance(value, dbshelve.DBShelfValue)
+        self.checkrec(key, value.decode())
+        del c, c2
+
 
     def test03_append(self):
         # NOTE: this is overridden in RECNO subclass, don't change its name.
@@ -288,6 +310,259 @@ class ThreadHashShelveTestCase(BasicShelveTestCase):
     dbflags = db.DB_CREATE | db.DB_THREAD
 
 
+class OutOfBandShelveTestCase(BasicShelveTestCase):
+    dbtype = db.DB_BTREE
+    dbflags = db.DB_CREATE
+
+    def do_open(self):
+        self.d = dbshelve.DBShelf(oob_threshold=1024)
+        self.d.open(self.filename, self.dbtype, self.dbflags)
+
+    def test05_out_of_band(self):
+        big = b'x' * 100000
+        self.d[b'big'] = {'big': pickle.PickleBuffer(big),
+                          'small': pickle.PickleBuffer(b'small')}
+        raw = self.d.db.get(b'big')
+        self.assertTrue(raw.startswith(dbshelve._OOB_MAGIC))
+        self.assertLess(len(raw), len(big) + 1024)
+
+        value = self.d[b'big']
+        self.assertEqual(bytes(value['big']), big)
+        self.assertEqual(value['small'], b'small')
+
+        key, value = self.d.cursor().first()
+        self.assertEqual(key, b'big')
+        self.assertEqual(bytes(value['big']), big)
+        # A read-only buffer stays read-only
+        self.assertTrue(memoryview(value['big']).readonly)
+
+        # Writable buffers are writable, in-band or out-of-band
+        for size in (10, 100000):
+            self.d[b'array'] = pickle.PickleBuffer(bytearray(size))
+            value = self.d[b'array']
+            self.assertFalse(memoryview(value).readonly)
+            value[0] = 1
+
+        # Damaged records
+        for size in (10, 30, len(raw) - 1):
+            self.d.db.put(b'bad', raw[:size])
+            self.assertRaises(dbshelve.DBShelveError, self.d.get, b'bad')
+            self.assertRaises(dbshelve.DBShelveError,
+                              self.d.__getitem__, b'bad')
+        self.d.db.delete(b'bad')
+
+        # Small buffers are kept in-band, as a plain pickle.
+        self.d[b'small'] = pickle.PickleBuffer(b'small')
+        self.assertFalse(self.d.db.get(b'small').startswith(
+                                                    dbshelve._OOB_MAGIC))
+        self.assertEqual(self.d[b'small'], b'small')
+
+
+class CompactShelveTestCase(BasicShelveTestCase):
+    dbtype = db.DB_BTREE
+    dbflags = db.DB_CREATE
+
+    def do_open(self):
+        self.d = dbshelve.DBShelf(compact=True)
+        self.d.open(self.filename, self.dbtype, self.dbflags)
+
+    def tearDown(self):
+        BasicShelveTestCase.tearDown(self)
+        unlink(self.filename + '._schemas')
+
+    def test05_compact(self):
+        objs = []
+        for i in range(10):
+            inst = DataClass()
+            inst.name = 'record %d' % i
+            objs.append(inst)
+            self.d[b'%d' % i] = inst
+        raw = self.d.db.get(b'0')
+        self.assertLess(len(raw), len(pickle.dumps(objs[0], self.d.protocol)))
+        self.assertNotIn(b'DataClass', raw)
+        self.assertEqual(len(self.d._schemas.db), 1)
+
+        # Shared and recursive references fall back to regular pickles
+        objs[0].me = objs[0]
+        self.d[b'shared'] = [objs[1], objs[1], objs[0]]
+        shared = self.d[b'shared']
+        self.assertIs(shared[0], shared[1])
+        self.assertIs(shared[2].me, shared[2])
+
+        self.do_close()
+        self.do_open()
+        for i in range(10):
+            value = self.d[b'%d' % i]
+            self.assertEqual(type(value), DataClass)
+            self.assertEqual(value.value, objs[i].value)
+            self.assertEqual(value.name, 'record %d' % i)
+        inst = DataClass()
+        inst.name = 'new record'
+        self.d[b'new'] = inst
+        self.assertEqual(len(self.d._schemas.db), 1)
+
+    def test06_class_cache(self):
+        # The classes checked aren't kept alive by the module
+        class Temp:
+            pass
+        self.assertTrue(dbshelve._compactable(Temp))
+        ref = weakref.ref(Temp)
+        del Temp
+        gc.collect()
+        self.assertIsNone(ref())
+
+
+class Person:
+    def __init__(self, name, email, city, tags=()):
+        self.name = name
+        self.email = email
+        self.city = city
+        self.tags = tags
+
+
+class Counted(Person):
+    # Counts how many times instances are unpickled
+    loads = 0
+
+    def __setstate__(self, state):
+        Counted.loads += 1
+        self.__dict__.update(state)
+
+
+class IndexedShelveTestCase(BasicShelveTestCase):
+    dbtype = db.DB_HASH
+    dbflags = db.DB_CREATE
+
+    def do_open(self):
+        BasicShelveTestCase.do_open(self)
+        self.by_email = self.d.create_index('by_email', attr='email')
+        self.by_city = self.d.create_index('by_city', attr='city')
+        self.by_tag = self.d.create_index('by_tag', key=lambda p: getattr(p, 'tags', None))
+
+    def tearDown(self):
+        BasicShelveTestCase.tearDown(self)
+        for name in ('by_email', 'by_city', 'by_tag'):
+            unlink('%s.%s' % (self.filename, name))
+
+    def populateIndexes(self):
+        self.d[b'1'] = Person('Ann', 'ann@example.com', 'Madrid', ['a', 'b'])
+        self.d[b'2'] = Person('Bob', 'bob@example.com', 'Madrid', ['b'])
+        self.d.put(b'3', Person('Cid', 'cid@example.com', 'Paris'))
+        self.d[b'4'] = Person('Dan', None, 'Paris', ['a'])
+
+    def test05_indexes(self):
+        self.populateIndexes()
+        self.assertIs(self.d.get_index('by_city'), self.by_city)
+        self.assertRaises(dbshelve.DBShelveError, self.d.get_index, 'nope')
+        self.assertRaises(dbshelve.DBShelveError,
+                          self.d.create_index, 'by_city', attr='city')
+        self.assertRaises(TypeError, self.d.create_index, 'bad')
+
+        self.assertEqual(len(self.by_email), 3)
+        self.assertEqual(len(self.by_tag), 4)
+
+        found = dict(self.d.find(by_email='bob@example.com'))
+        self.assertEqual(list(found), [b'2'])
+        self.assertEqual(found[b'2'].name, 'Bob')
+        self.assertEqual(sorted(k for k, v in self.d.find(by_city='Madrid')),
+                         [b'1', b'2'])
+        self.assertEqual(list(self.d.find(by_city='London')), [])
+
+        # Index entries follow updates and deletions
+        self.d[b'2'] = Person('Bob', 'bob@example.org', 'Paris', ['b'])
+        self.assertEqual(list(self.d.find(by_email='bob@example.com')), [])
+        self.assertEqual(sorted(k for k, v in self.d.find(by_city='Paris')),
+                         [b'2', b'3', b'4'])
+        del self.d[b'3']
+        self.d.delete(b'4')
+        self.assertEqual(sorted(k for k, v in self.d.find(by_city='Paris')),
+                         [b'2'])
+        self.assertEqual(len(self.by_tag), 3)
+
+    def test06_join(self):
+        self.populateIndexes()
+        found = [(k, v.name)
+                 for k, v in self.d.find(by_city='Madrid', by_tag='a')]
+        self.assertEqual(found, [(b'1', 'Ann')])
+        self.assertRaises(dbshelve.DBShelveError, list, self.d.find(nope=b'x'))
+
+        c1 = self.by_city.cursor()
+        c2 = self.by_tag.cursor()
+        c1.set(b'Madrid')
+        c2.set(b'b')
+        j = self.d.join([c1, c2])
+        keys = []
+        rec = j.get(0)
+        while rec is not None:
+            keys.append(rec[0])
+            self.assertEqual(rec[1].city, 'Madrid')
+            rec = j.get(0)
+        self.assertEqual(sorted(keys), [b'1', b'2'])
+        j.close()
+        c2.close()
+        c1.close()
+
+    def test07_single_unpickle(self):
+        # The indexes share the object written, instead of unpickling it
+        Counted.loads = 0
+        self.d[b'1'] = Counted('Ann', 'ann@example.com', 'Madrid', ['a'])
+        self.d.put(b'2', Counted('Bob', 'bob@example.com', 'Madrid'))
+        c = self.d.cursor()
+        c.put(b'3', Counted('Cid', 'cid@example.com', 'Paris'),
+              db.DB_KEYFIRST)
+        self.assertEqual(Counted.loads, 0)
+
+        # The replaced or deleted record is unpickled once for all the
+        # indexes
+        self.d[b'1'] = Counted('Ann', 'ann@example.org', 'Paris', ['b'])
+        self.assertEqual(Counted.loads, 1)
+        self.d.put(b'2', Counted('Bob', 'bob@example.org', 'Paris'))
+        self.assertEqual(Counted.loads, 2)
+        c.set(b'3')
+        self.assertEqual(Counted.loads, 3)
+        c.put(b'3', Counted('Cid', 'cid@example.org', 'Madrid'),
+              db.DB_CURRENT)
+        self.assertEqual(Counted.loads, 4)
+        c.delete()
+        self.assertEqual(Counted.loads, 5)
+        c.close()
+        self.assertEqual(sorted(k for k, v in self.d.find(by_city='Paris')),
+                         [b'1', b'2'])
+
+
+class IndexedSubdbShelveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_INIT_MPOOL | db.DB_CREATE)
+        self.shelves = []
+        for dbname in ('a', 'b'):
+            d = dbshelve.DBShelf(self.env)
+            d.open('shelves.db', dbname, db.DB_BTREE, db.DB_CREATE)
+            d.create_index('by_email', attr='email')
+            self.shelves.append(d)
+
+    def tearDown(self):
+        for d in self.shelves:
+            d.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def test01_separate_indexes(self):
+        a, b = self.shelves
+        a[b'1'] = Person('Ann', 'ann@example.com', 'Madrid')
+        b[b'2'] = Person('Ann', 'ann@example.com', 'Paris')
+        self.assertEqual([(k, v.city)
+                          for k, v in a.find(by_email='ann@example.com')],
+                         [(b'1', 'Madrid')])
+        self.assertEqual([(k, v.city)
+                          for k, v in b.find(by_email='ann@example.com')],
+                         [(b'2', 'Paris')])
+        self.assertEqual(a.get_index('by_email').get_dbname(),
+                         ('shelves.db.by_email', 'a'))
+        self.assertEqual(len(b.get_index('by_email')), 1)
+
+
 #----------------------------------------------------------------------
 
 class BasicEnvShelveTestCase(DBShelveTestCase):
@@ -388,6 +663,10 @@ def test_suite():
                     HashShelveTestCase,
                     ThreadBTreeShelveTestCase,
                     ThreadHashShelveTestCase,
+                    OutOfBandShelveTestCase,
+                    CompactShelveTestCase,
+                    IndexedShelveTestCase,
+                    IndexedSubdbShelveTestCase,
                     EnvBTreeShelveTestCase,
                     EnvHashShelveTestCase,
                     EnvThreadBTreeShelveTestCase,
@@ -0,0 +1,299 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+"""TestCases for the retry helpers in berkeleydb.dbutils.
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+
+from .test_all import db, dbobj, dbutils, rmtree, \
+        get_new_environment_path
+
+#----------------------------------------------------------------------
+
+class Flaky:
+    """Callable failing with a deadlock the given number of times."""
+    def __init__(self, failures, exception=db.DBLockDeadlockError):
+        self.failures = failures
+        self.exception = exception
+        self.calls = 0
+
+    def __call__(self, value=None):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.exception(db.DB_LOCK_DEADLOCK, 'deadlock')
+        return value
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sleeps = []
+        self.policy = dbutils.RetryPolicy(min_sleep=0.01, max_sleep=1,
+                                          sleep=self.sleeps.append)
+
+    def test01_call(self):
+        f = Flaky(3)
+        self.assertEqual(self.policy.call(f, 'ok'), 'ok')
+        self.assertEqual(f.calls, 4)
+        self.assertEqual(len(self.sleeps), 3)
+        self.assertEqual(self.sleeps[0], 0.01)
+        for sleeptime in self.sleeps:
+            self.assertGreaterEqual(sleeptime, 0.01)
+            self.assertLessEqual(sleeptime, 1)
+
+        stats = self.policy.stats.snapshot()
+        self.assertEqual(stats['calls'], 1)
+        self.assertEqual(stats['retries'], 3)
+        self.assertEqual(stats['giveups'], 0)
+        self.assertEqual(stats['histogram'], {3: 1})
+        self.assertAlmostEqual(stats['time_lost'], sum(self.sleeps))
+
+    def test02_no_jitter(self):
+        policy = self.policy.replace(jitter=False)
+        policy.call(Flaky(4))
+        self.assertEqual(self.sleeps, [0.01, 0.02, 0.04, 0.08])
+        # The copy shares the accounting
+        self.assertEqual(self.policy.stats.retries, 4)
+
+    def test03_giveup(self):
+        policy = self.policy.replace(max_retries=2)
+        f = Flaky(5)
+        self.assertRaises(db.DBLockDeadlockError, policy.call, f)
+        self.assertEqual(f.calls, 3)
+        self.assertEqual(self.policy.stats.giveups, 1)
+
+        policy = self.policy.replace(max_elapsed=0)
+        self.assertRaises(db.DBLockDeadlockError, policy.call, Flaky(1))
+
+        # Other errors are not retried
+        f = Flaky(1, db.DBNotFoundError)
+        self.assertRaises(db.DBNotFoundError, self.policy.call, f)
+        self.assertEqual(f.calls, 1)
+
+    def test04_decorator_and_attempts(self):
+        f = Flaky(2)
+
+        @self.policy
+        def wrapped(value):
+            return f(value)
+
+        self.assertEqual(wrapped(5), 5)
+        self.assertEqual(f.calls, 3)
+
+        f = Flaky(2)
+        tries = 0
+        for attempt in self.policy.attempts():
+            with attempt:
+                tries += 1
+                f()
+        self.assertEqual(tries, 3)
+        self.assertEqual(self.policy.stats.calls, 2)
+
+    def test05_deadlockwrap(self):
+        f = Flaky(2)
+        self.assertEqual(dbutils.DeadlockWrap(f, 7, policy=self.policy), 7)
+        self.assertEqual(len(self.sleeps), 2)
+        f = Flaky(5)
+        self.assertRaises(db.DBLockDeadlockError, dbutils.DeadlockWrap, f,
+                          max_retries=1, policy=self.policy)
+        self.assertEqual(f.calls, 2)
+
+
+class TxnTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_INIT_LOCK | db.DB_INIT_LOG | db.DB_INIT_TXN |
+                      db.DB_THREAD)
+        self.db = db.DB(self.env)
+        self.db.open('test', dbtype=db.DB_BTREE,
+                     flags=db.DB_CREATE | db.DB_AUTO_COMMIT | db.DB_THREAD)
+        self.sleeps = []
+        self.policy = dbutils.txn_policy.replace(sleep=self.sleeps.append,
+                                                 stats=dbutils.RetryStats())
+
+    def tearDown(self):
+        self.db.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+
+class RunInTxnTestCase(TxnTestCase):
+    def test01_retry(self):
+        attempts = []
+        def work(txn):
+            attempts.append(txn)
+            self.db.put(b'key%d' % len(attempts), b'data', txn=txn)
+            if len(attempts) < 3:
+                raise db.DBLockNotGrantedError(db.DB_LOCK_NOTGRANTED, 'no')
+            return len(attempts)
+
+        counts = []
+        self.assertEqual(dbutils.run_in_txn(self.env, work,
+                                            policy=self.policy,
+                                            on_attempts=counts.append), 3)
+        self.assertEqual(counts, [3])
+        # The failed attempts were aborted
+        self.assertEqual(self.db.keys(), [b'key3'])
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertEqual(self.policy.stats.histogram, {2: 1})
+
+    def test02_errors(self):
+        def work(txn):
+            self.db.put(b'key', b'data', txn=txn)
+            raise ValueError
+
+        self.assertRaises(ValueError, dbutils.run_in_txn, self.env, work,
+                          policy=self.policy)
+        self.assertEqual(self.db.keys(), [])
+
+        def deadlock(txn):
+            raise db.DBLockDeadlockError(db.DB_LOCK_DEADLOCK, 'deadlock')
+
+        counts = []
+        self.assertRaises(db.DBLockDeadlockError, dbutils.run_in_txn,
+                          self.env, deadlock, retries=2, policy=self.policy,
+                          on_attempts=counts.append)
+        self.assertEqual(counts, [3])
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertEqual(self.policy.stats.giveups, 1)
+
+    def test03_async(self):
+        attempts = []
+        async def work(txn):
+            attempts.append(txn)
+            self.db.put(b'key', b'%d' % len(attempts), txn=txn)
+            if len(attempts) < 2:
+                raise db.DBLockDeadlockError(db.DB_LOCK_DEADLOCK, 'deadlock')
+            return 'done'
+
+        policy = self.policy.replace(min_sleep=0.001)
+        counts = []
+        result = asyncio.run(dbutils.run_in_txn_async(
+            self.env, work, policy=policy, on_attempts=counts.append))
+        self.assertEqual(result, 'done')
+        self.assertEqual(self.db.get(b'key'), b'2')
+        self.assertEqual(counts, [2])
+
+    def test04_dbobj(self):
+        # dbobj.DBEnv has them as methods
+        env = dbobj.DBEnv()
+        env.open(self.homeDir, db.DB_INIT_MPOOL | db.DB_INIT_LOCK |
+                 db.DB_INIT_LOG | db.DB_INIT_TXN | db.DB_THREAD)
+        try:
+            d = dbobj.DB(env)
+            d.open('test', dbtype=db.DB_BTREE,
+                   flags=db.DB_AUTO_COMMIT | db.DB_THREAD)
+            def work(txn):
+                d.put(b'key', b'dbobj', txn=txn)
+                return 'done'
+
+            self.assertEqual(env.run_in_txn(work, policy=self.policy),
+                             'done')
+            async def awork(txn):
+                return work(txn)
+
+            self.assertEqual(asyncio.run(env.run_in_txn_async(
+                awork, policy=self.policy)), 'done')
+            self.assertEqual(self.db.get(b'key'), b'dbobj')
+            d.close()
+        finally:
+            env.close()
+
+
+class GroupCommitTestCase(TxnTestCase):
+    def test05_group_commit(self):
+        group = dbutils.GroupCommit(self.env, max_wait=0.01, max_batch=8)
+
+        def worker(n):
+            for i in range(20):
+                def work(txn):
+                    self.db.put(b'%d-%d' % (n, i), b'data', txn=txn)
+                dbutils.run_in_txn(self.env, work, group_commit=group)
+
+        threads = [threading.Thread(target=worker, args=(n, ))
+                   for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(self.db), 160)
+        stats = group.stats()
+        self.assertEqual(stats['commits'], 160)
+        self.assertLessEqual(stats['flushes'], 160)
+
+    def test06_batching(self):
+        class Env:
+            flushes = 0
+            def log_flush(self):
+                self.flushes += 1
+                time.sleep(0.01)
+
+        class Txn:
+            def commit(self, flags):
+                self.flags = flags
+
+        env = Env()
+        group = dbutils.GroupCommit(env, max_wait=1, max_batch=4)
+        txns = [Txn() for i in range(8)]
+        threads = [threading.Thread(target=group.commit, args=(txn, ))
+                   for txn in txns]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertIn(env.flushes, (1, 2))
+        for txn in txns:
+            self.assertTrue(txn.flags & db.DB_TXN_NOSYNC)
+
+
+#----------------------------------------------------------------------
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (RetryPolicyTestCase, RunInTxnTestCase, GroupCommitTestCase):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,139 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+
+"""TestCases for records stored as external files, and DBStream.
+"""
+
+import os
+import unittest
+
+from .test_all import db, rmtree, get_new_environment_path
+
+
+@unittest.skipIf(db.version() < (6, 2),
+                 'External files need Berkeley DB 6.2 or up')
+class ExtFileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.set_ext_file_threshold(1000)
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_PRIVATE)
+        self.d = db.DB(self.env)
+        self.d.open('test.db', dbtype=db.DB_BTREE, flags=db.DB_CREATE)
+        self.value = bytes(range(256)) * 100
+        self.d.put(b'big', self.value)
+        self.d.put(b'small', b'small')
+
+    def tearDown(self):
+        self.d.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def stream(self, key, flags=None):
+        c = self.d.cursor()
+        c.set(key)
+        if flags is None:
+            flags = db.DB_STREAM_READ
+        return c, c.db_stream(flags)
+
+    def test01_threshold(self):
+        self.assertEqual(1000, self.env.get_ext_file_threshold())
+        self.assertEqual(1000, self.d.get_ext_file_threshold())
+        self.assertEqual(1, self.d.stat()['ext_files'])
+        self.assertEqual(self.value, self.d.get(b'big'))
+        d = db.DB(self.env)
+        d.set_ext_file_threshold(5000)
+        self.assertEqual(5000, d.get_ext_file_threshold())
+        d.close()
+
+    def test02_read(self):
+        c, s = self.stream(b'big')
+        self.assertEqual(len(self.value), s.size())
+        chunks = []
+        while True:
+            chunk = s.read(4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        self.assertEqual(self.value, b''.join(chunks))
+        self.assertEqual(len(self.value), s.tell())
+        self.assertEqual(100, s.seek(100))
+        self.assertEqual(self.value[100:110], s.read(10))
+        self.assertEqual(120, s.seek(10, os.SEEK_CUR))
+        self.assertEqual(len(self.value) - 5, s.seek(-5, os.SEEK_END))
+        self.assertEqual(self.value[-5:], s.read())
+        self.assertRaises(ValueError, s.seek, -1)
+        s.close()
+        s.close()
+        self.assertRaises(db.DBError, s.read)
+        c.close()
+
+    def test03_write(self):
+        c, s = self.stream(b'big', db.DB_STREAM_WRITE)
+        s.seek(0, os.SEEK_END)
+        self.assertEqual(4, s.write(b'tail'))
+        s.seek(0)
+        s.write(memoryview(b'head'))
+        self.assertEqual(len(self.value) + 4, s.size())
+        s.close()
+        c.close()
+        self.assertEqual(b'head' + self.value[4:] + b'tail',
+                         self.d.get(b'big'))
+
+    def test04_cursor_close(self):
+        c, s = self.stream(b'big')
+        c.close()
+        self.assertRaises(db.DBError, s.read)
+
+    def test05_not_external(self):
+        c = self.d.cursor()
+        c.set(b'small')
+        self.assertRaises(db.DBError, c.db_stream)
+        c.close()
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (ExtFileTestCase,):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,105 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+
+"""TestCases for the hash functions of Hash databases.
+"""
+
+import unittest
+
+from .test_all import db, rmtree, get_new_environment_path
+
+
+class HashFunctionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_PRIVATE)
+
+    def tearDown(self):
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def check(self, hash):
+        d = db.DB(self.env)
+        d.set_h_hash(hash)
+        self.assertIs(hash, d.get_h_hash())
+        self.assertRaises(RuntimeError, d.set_h_hash, 'fnv1a')
+        d.open('test.db', dbtype=db.DB_HASH, flags=db.DB_CREATE)
+        keys = [b'/a/long/shared/prefix/%d' % i for i in range(1000)]
+        for key in keys:
+            d.put(key, key[::-1])
+        for key in keys:
+            self.assertEqual(key[::-1], d.get(key))
+        self.assertEqual(sorted(keys), sorted(d.keys()))
+        d.close()
+
+        # The database can be reopened with the same hash function only
+        d = db.DB(self.env)
+        d.set_h_hash(hash)
+        d.open('test.db', dbtype=db.DB_HASH)
+        self.assertEqual(keys[0][::-1], d.get(keys[0]))
+        d.close()
+
+    def test01_native(self):
+        for name in ('fnv1a', 'murmur3', 'xxhash32'):
+            self.check(name)
+            self.env.dbremove('test.db')
+
+    def test02_callback(self):
+        def hash(key):
+            return sum(key) * 2654435761
+        self.check(hash)
+
+    def test03_errors(self):
+        d = db.DB(self.env)
+        self.assertRaises(ValueError, d.set_h_hash, 'md5')
+        self.assertRaises(TypeError, d.set_h_hash, 42)
+        self.assertIsNone(d.get_h_hash())
+        d.close()
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (HashFunctionTestCase,):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
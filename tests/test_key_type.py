@@ -0,0 +1,150 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+
+"""TestCases for DB.set_key_type(), integer keys of Btree and Hash
+databases.
+"""
+
+import struct
+import unittest
+
+from .test_all import db, rmtree, get_new_environment_path
+
+
+class KeyTypeBase(unittest.TestCase):
+    dbtype = db.DB_BTREE
+
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_PRIVATE)
+        self.d = db.DB(self.env)
+
+    def tearDown(self):
+        self.d.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def _open(self, key_type):
+        self.d.set_key_type(key_type)
+        self.d.open('test.db', dbtype=self.dbtype, flags=db.DB_CREATE)
+
+
+class KeyTypeTestCase(KeyTypeBase):
+    def test01_set_get(self):
+        self.assertIsNone(self.d.get_key_type())
+        self.assertRaises(ValueError, self.d.set_key_type, 'int128')
+        self.assertRaises(TypeError, self.d.set_key_type, 4)
+        self._open('uint64_be')
+        self.assertEqual('uint64_be', self.d.get_key_type())
+
+    def test02_uint32_be(self):
+        self._open('uint32_be')
+        for i in (0, 1, 256, 2**32 - 1):
+            self.d.put(i, b'%d' % i)
+        self.assertEqual(b'256', self.d.get(256))
+        self.assertEqual(b'256', self.d[256])
+        self.assertTrue(self.d.exists(2**32 - 1))
+        self.assertEqual(b'1', self.d.get(struct.pack('>I', 1)))
+        self.assertRaises(OverflowError, self.d.put, 2**32, b'')
+        self.assertRaises(OverflowError, self.d.put, -1, b'')
+        self.d.delete(0)
+        self.assertIsNone(self.d.get(0))
+
+    def test03_uint64_be(self):
+        self._open('uint64_be')
+        values = [2**64 - 1, 0, 255, 2**32, 1]
+        for i in values:
+            self.d.put(i, b'')
+        self.assertEqual(b'', self.d.get(struct.pack('>Q', 255)))
+        keys = self.d.keys()
+        self.assertEqual(sorted(values), sorted(keys))
+        if self.dbtype == db.DB_BTREE:
+            self.assertEqual(sorted(values), keys)
+
+    def test04_int64_ordered(self):
+        self._open('int64_ordered')
+        values = [-2**63, -1, 0, 1, 2**63 - 1, -1000, 1000]
+        for i in values:
+            self.d.put(i, b'%d' % i)
+        self.assertEqual(sorted(values), sorted(self.d.keys()))
+        self.assertEqual(sorted((i, b'%d' % i) for i in values),
+                         sorted(self.d.items()))
+        self.assertRaises(OverflowError, self.d.put, 2**63, b'')
+
+        c = self.d.cursor()
+        self.assertEqual((-1, b'-1'), c.set(-1))
+        if self.dbtype == db.DB_BTREE:
+            self.assertEqual((-2**63, b'%d' % -2**63), c.first())
+            self.assertEqual((1, b'1'), c.set_range(1))
+            self.assertEqual((1000, b'1000'), c.next())
+            self.assertEqual((2**63 - 1, b'%d' % (2**63 - 1)), c.last())
+        c.close()
+
+    def test05_other_keys(self):
+        # Keys of another size are returned as bytes
+        self._open('uint32_be')
+        self.d.put(b'longer key', b'')
+        self.d.put(7, b'')
+        self.assertEqual(sorted([7, b'longer key'], key=repr),
+                         sorted(self.d.keys(), key=repr))
+
+
+class HashKeyTypeTestCase(KeyTypeTestCase):
+    dbtype = db.DB_HASH
+
+
+class RecnoKeyTypeTestCase(KeyTypeBase):
+    dbtype = db.DB_RECNO
+
+    def test01_not_allowed(self):
+        self.d.open('test.db', dbtype=self.dbtype, flags=db.DB_CREATE)
+        self.assertRaises(TypeError, self.d.set_key_type, 'uint32_be')
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (KeyTypeTestCase, HashKeyTypeTestCase,
+                 RecnoKeyTypeTestCase):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,138 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+
+"""TestCases for berkeleydb.keys.
+"""
+
+import random
+import unittest
+
+from .test_all import db, rmtree, get_new_environment_path
+from berkeleydb import keys
+
+
+class PackTestCase(unittest.TestCase):
+    values = [None, False, True, 0, 1, -1, 255, 256, -256, 2**56, -2**56,
+              2**62 + 1, 2**63 - 1, -2**63, 2**63, -2**63 - 1,
+              2**64, -2**64, 10**40, -10**40, 0.0, 1.5, -1.5, float('inf'),
+              b'', b'\x00', b'a\x00b', b'\xff', '', 'a\x00', '\xe9',
+              (), (None,), (1, (b'x', None))]
+
+    def test01_roundtrip(self):
+        for value in self.values:
+            packed = keys.pack((value,))
+            self.assertIsInstance(packed, bytes)
+            unpacked = keys.unpack(packed)
+            self.assertEqual((value,), unpacked)
+            self.assertIs(type(value), type(unpacked[0]))
+        self.assertEqual(tuple(self.values),
+                         keys.unpack(keys.pack(tuple(self.values))))
+        self.assertEqual((), keys.unpack(b''))
+
+    def test02_layout(self):
+        # The FoundationDB tuple layer
+        self.assertEqual(b'\x15\x01\x02a\x00\x01\x00\xff\x00\x00',
+                         keys.pack((1, 'a', b'\x00', None)))
+        self.assertEqual(b'\x13\xfe', keys.pack((-1,)))
+        self.assertEqual(b'\x05\x00\xff\x00', keys.pack(((None,),)))
+
+    def test03_order(self):
+        rnd = random.Random(42)
+        for make in (lambda: rnd.randint(-2**70, 2**70),
+                     lambda: rnd.randint(-300, 300),
+                     # 8 bytes, up to the limits of a C long long
+                     lambda: rnd.choice((1, -1)) * rnd.randint(2**56,
+                                                               2**63 - 1),
+                     lambda: rnd.uniform(-1e6, 1e6),
+                     lambda: bytes(rnd.choice(b'\x00\x01a\xff')
+                                   for i in range(rnd.randint(0, 4))),
+                     lambda: (rnd.randint(0, 3),) * rnd.randint(0, 3)):
+            tuples = [(make(), rnd.randint(0, 2)) for i in range(500)]
+            self.assertEqual(sorted(tuples),
+                             [keys.unpack(k) for k in
+                              sorted(keys.pack(t) for t in tuples)])
+
+    def test04_errors(self):
+        self.assertRaises(TypeError, keys.pack, [1])
+        self.assertRaises(TypeError, keys.pack, (1j,))
+        self.assertRaises(TypeError, keys.pack, ([],))
+        for invalid in (b'\x01abc', b'\x15', b'\x99', b'\x05\x14'):
+            self.assertRaises(ValueError, keys.unpack, invalid)
+
+
+class BtreeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_PRIVATE)
+        self.d = db.DB(self.env)
+        self.d.open('test.db', dbtype=db.DB_BTREE, flags=db.DB_CREATE)
+
+    def tearDown(self):
+        self.d.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def test01_range(self):
+        tuples = [(user, kind, n) for user in (-1, 0, 7, 300)
+                  for kind in ('a', 'b') for n in (-2.5, 0.0, 1.0)]
+        for t in tuples:
+            self.d.put(keys.pack(t), b'')
+        c = self.d.cursor()
+        self.assertEqual(sorted(tuples),
+                         [keys.unpack(k) for k, v in iter(c.next, None)])
+        start, end = keys.range((7,))
+        rec = c.set_range(start)
+        found = []
+        while rec is not None and rec[0] < end:
+            found.append(keys.unpack(rec[0]))
+            rec = c.next()
+        c.close()
+        self.assertEqual([t for t in sorted(tuples) if t[0] == 7], found)
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (PackTestCase, BtreeTestCase):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,208 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+"""TestCases for the latency statistics of DB and DBEnv objects, and for
+the slow operation hook.
+"""
+
+import threading
+import unittest
+
+from .test_all import db, rmtree, get_new_environment_path
+
+
+class LatencyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_INIT_LOCK | db.DB_INIT_LOG | db.DB_INIT_TXN |
+                      db.DB_PRIVATE)
+        self.d = db.DB(self.env)
+        self.d.open('test.db', dbtype=db.DB_BTREE,
+                    flags=db.DB_CREATE | db.DB_AUTO_COMMIT)
+
+    def tearDown(self):
+        self.d.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def test01_disabled(self):
+        self.assertIsNone(self.d.get_latency_stats())
+        self.assertIsNone(self.env.get_latency_stats())
+        self.d.put(b'key', b'data')
+        self.assertIsNone(self.d.get_latency_stats())
+
+    def test02_db(self):
+        self.d.set_latency_stats(True)
+        for i in range(10):
+            self.d.put(b'%d' % i, b'data')
+        self.d.get(b'1')
+        self.d.get(b'missing')
+        self.d.exists(b'2')
+        self.d.delete(b'3')
+        c = self.d.cursor()
+        c.first()
+        c.next()
+        c.set(b'5')
+        c.close()
+
+        stats = self.d.get_latency_stats()
+        self.assertEqual(['cursor', 'delete', 'get', 'put'], sorted(stats))
+        self.assertEqual(10, stats['put']['count'])
+        self.assertEqual(3, stats['get']['count'])
+        self.assertEqual(1, stats['delete']['count'])
+        self.assertEqual(3, stats['cursor']['count'])
+        for op in stats.values():
+            self.assertEqual(32, len(op['buckets']))
+            self.assertEqual(op['count'], sum(op['buckets']))
+            self.assertGreaterEqual(op['total_ns'], 0)
+            self.assertGreaterEqual(op['gil_wait_ns'], 0)
+
+        # Disabling keeps the values, but stops recording
+        self.d.set_latency_stats(False)
+        self.d.put(b'key', b'data')
+        self.assertEqual(stats, self.d.get_latency_stats(reset=True))
+        self.assertEqual(0, self.d.get_latency_stats()['put']['count'])
+
+    def test03_commit(self):
+        self.env.set_latency_stats(True)
+        txn = self.env.txn_begin()
+        self.d.put(b'key', b'data', txn=txn)
+        child = self.env.txn_begin(parent=txn)
+        child.commit()
+        txn.commit()
+        txn = self.env.txn_begin()
+        txn.abort()
+
+        stats = self.env.get_latency_stats()
+        self.assertEqual(['commit'], list(stats))
+        self.assertEqual(2, stats['commit']['count'])
+
+
+class SlowOpHookTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_INIT_LOCK | db.DB_INIT_LOG | db.DB_INIT_TXN |
+                      db.DB_PRIVATE)
+        self.d = db.DB(self.env)
+        self.d.open('test.db', dbtype=db.DB_BTREE,
+                    flags=db.DB_CREATE | db.DB_AUTO_COMMIT)
+        self.events = []
+        self.cond = threading.Condition()
+
+    def tearDown(self):
+        self.env.set_slow_op_hook(0, None)
+        self.d.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def hook(self, *event):
+        with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+
+    def wait_events(self, n):
+        with self.cond:
+            self.cond.wait_for(lambda: len(self.events) >= n, timeout=10)
+            return list(self.events)
+
+    def test01_hook(self):
+        self.env.set_slow_op_hook(0, self.hook)
+        self.d.put(b'key', b'data')
+        self.d.get(b'key')
+        c = self.d.cursor()
+        c.set(b'key')
+        c.close()
+        txn = self.env.txn_begin()
+        txn.commit()
+
+        events = self.wait_events(4)
+        self.assertEqual(['put', 'get', 'cursor.set', 'commit'],
+                         [e[0] for e in events])
+        op, dbname, key_size, elapsed_us, lock_waits = events[0]
+        self.assertEqual(('test.db', None), dbname)
+        self.assertEqual(3, key_size)
+        self.assertGreaterEqual(elapsed_us, 0)
+        self.assertEqual(['lock_wait', 'ndeadlocks', 'nlocktimeouts',
+                          'ntxntimeouts'], sorted(lock_waits))
+        self.assertEqual((None, None), events[3][1:3])
+
+    def test02_threshold(self):
+        self.env.set_slow_op_hook(60 * 1000000, self.hook)
+        self.d.put(b'key', b'data')
+        self.env.set_slow_op_hook(0, self.hook)
+        self.d.delete(b'key')
+        events = self.wait_events(1)
+        self.assertEqual(['delete'], [e[0] for e in events])
+
+        self.env.set_slow_op_hook(0, None)
+        self.d.put(b'key', b'data')
+        self.assertEqual(1, len(self.events))
+        self.assertRaises(TypeError, self.env.set_slow_op_hook, 0, 1)
+        self.assertRaises(ValueError, self.env.set_slow_op_hook, -1,
+                          self.hook)
+
+    def slow_op_threads(self):
+        return [t for t in threading.enumerate()
+                if t.name == 'berkeleydb-slow-ops']
+
+    def test03_close(self):
+        before = self.slow_op_threads()
+        self.env.set_slow_op_hook(0, self.hook)
+        self.d.put(b'key', b'data')
+        threads = [t for t in self.slow_op_threads() if t not in before]
+        self.assertEqual(1, len(threads))
+        self.d.close()
+        self.env.close()
+        threads[0].join(10)
+        self.assertFalse(threads[0].is_alive())
+        # The event queued before the close is still delivered
+        self.assertEqual(['put'], [e[0] for e in self.wait_events(1)])
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (LatencyTestCase, SlowOpHookTestCase):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
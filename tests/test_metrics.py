@@ -0,0 +1,133 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+"""TestCases for stat snapshots and berkeleydb.metrics.
+"""
+
+import unittest
+
+from .test_all import db, rmtree, get_new_environment_path
+
+from berkeleydb import metrics
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_INIT_LOCK | db.DB_INIT_LOG | db.DB_INIT_TXN |
+                      db.DB_PRIVATE)
+        self.d = db.DB(self.env)
+        self.d.open('test.db', dbtype=db.DB_BTREE,
+                    flags=db.DB_CREATE | db.DB_AUTO_COMMIT)
+
+    def tearDown(self):
+        self.d.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def test01_snapshots(self):
+        for method in (self.env.lock_stat, self.env.txn_stat,
+                       self.env.log_stat, self.env.mutex_stat):
+            d = method()
+            snap = method(snapshot=True)
+            # The type is built on the first call, check the second one too
+            snap = method(snapshot=True)
+            self.assertEqual(tuple(d), type(snap)._fields)
+            self.assertEqual(len(d), len(snap))
+            self.assertEqual(d['region_wait'] <= snap.region_wait, True)
+
+        gsp, fsp = self.env.memp_stat(snapshot=True)
+        gsp, fsp = self.env.memp_stat(snapshot=True)
+        self.assertIn('cache_hit', type(gsp)._fields)
+        self.assertIn('test.db', fsp)
+        self.assertIn('page_in', type(fsp['test.db'])._fields)
+
+        for i in range(10):
+            self.d.put(b'%d' % i, b'data')
+        snap = self.d.stat(snapshot=True)
+        self.assertEqual(10, snap.nkeys)
+        self.assertEqual(self.d.stat(), dict(zip(type(snap)._fields, snap)))
+
+    def test02_delta(self):
+        prev = self.env.lock_stat(snapshot=True)
+        for i in range(10):
+            self.d.put(b'%d' % i, b'data')
+        cur = self.env.lock_stat(snapshot=True)
+        change = metrics.delta(cur, prev)
+        self.assertIs(type(cur), type(change))
+        self.assertEqual(cur.nrequests - prev.nrequests, change.nrequests)
+        self.assertTrue(change.nrequests > 0)
+        self.assertEqual({'a': 3, 'b': (1, 2)},
+                         metrics.delta({'a': 5, 'b': (1, 2)},
+                                       {'a': 2, 'b': (1, 1)}))
+
+    def test03_collector(self):
+        collector = metrics.StatsCollector(self.env, dbs={'test': self.d})
+        self.assertEqual(None, collector.deltas())
+        collector.sample()
+        for i in range(10):
+            self.d.put(b'%d' % i, b'data')
+        collector.sample()
+        seconds, changes = collector.deltas()
+        self.assertTrue(seconds >= 0)
+        self.assertEqual(10, changes['db']['test'].nkeys)
+        self.assertTrue(changes['txn'].nbegins >= 10)
+        self.assertTrue(collector.rate('lock', 'nrequests') >= 0)
+
+        text = collector.exposition()
+        self.assertIn('# TYPE berkeleydb_lock_nrequests counter\n', text)
+        self.assertIn('# TYPE berkeleydb_db_nkeys gauge\n', text)
+        self.assertIn('berkeleydb_db_nkeys{db="test"} 10\n', text)
+        self.assertIn('berkeleydb_memp_file_page_in{file="test.db"} ', text)
+
+        collector.interval = 0.01
+        collector.start()
+        collector.stop()
+        self.assertEqual(None, collector.last_error)
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (MetricsTestCase,):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
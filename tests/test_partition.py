@@ -0,0 +1,140 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+
+"""TestCases for partitioned databases.
+"""
+
+import os
+import unittest
+
+from .test_all import db, rmtree, get_new_environment_path
+from berkeleydb import metrics
+
+
+class PartitionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_PRIVATE)
+        self.d = db.DB(self.env)
+
+    def tearDown(self):
+        self.d.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def fill(self):
+        for i in range(300):
+            self.d.put(b'%03d' % i, b'data %d' % i)
+        for i in range(300):
+            self.assertEqual(b'data %d' % i, self.d.get(b'%03d' % i))
+
+    def test01_keys(self):
+        self.d.set_partition([b'100', b'200'])
+        self.assertRaises(RuntimeError, self.d.set_partition, 2)
+        self.d.open('test.db', dbtype=db.DB_BTREE, flags=db.DB_CREATE)
+        self.assertEqual((3, [b'100', b'200']), self.d.get_partition())
+        self.fill()
+        files = metrics.partition_files(self.d)
+        self.assertEqual(['__dbp.test.db.000', '__dbp.test.db.001',
+                          '__dbp.test.db.002'], files)
+        for name in files:
+            self.assertTrue(os.path.exists(os.path.join(self.homeDir, name)))
+        stats = metrics.partition_stats(self.env, self.d)
+        self.assertEqual(3, len(stats))
+        for s in stats:
+            self.assertIsNotNone(s)
+
+    def test02_hash(self):
+        self.d.set_partition(4)
+        self.d.open('test.db', dbtype=db.DB_HASH, flags=db.DB_CREATE)
+        self.assertEqual((4, None), self.d.get_partition())
+        self.fill()
+        self.assertEqual(300, len(self.d.keys()))
+
+    def test03_callback(self):
+        seen = []
+
+        def partition(key):
+            seen.append(key)
+            return int(key)
+
+        self.d.set_partition(3, partition)
+        self.d.open('test.db', dbtype=db.DB_BTREE, flags=db.DB_CREATE)
+        self.fill()
+        self.assertIn(b'299', seen)
+        self.assertEqual(300, len(self.d.keys()))
+
+    def test04_errors(self):
+        self.assertRaises(ValueError, self.d.set_partition, 1)
+        self.assertRaises(ValueError, self.d.set_partition, [])
+        self.assertRaises(TypeError, self.d.set_partition, ['a'])
+        self.assertRaises(TypeError, self.d.set_partition, 2, 'spam')
+        self.assertRaises(TypeError, self.d.set_partition, [b'a'], len)
+        self.assertEqual((0, None), self.d.get_partition())
+
+    def test05_dirs(self):
+        self.d.close()
+        self.env.close()
+        for name in ('part1', 'part2'):
+            os.mkdir(os.path.join(self.homeDir, name))
+        self.env = db.DBEnv()
+        self.env.set_data_dir('part1')
+        self.env.set_data_dir('part2')
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_PRIVATE)
+        self.d = db.DB(self.env)
+        self.d.set_partition([b'150'])
+        self.d.set_partition_dirs(['part1', 'part2'])
+        self.assertEqual(('part1', 'part2'), self.d.get_partition_dirs())
+        self.d.open('test.db', dbtype=db.DB_BTREE, flags=db.DB_CREATE)
+        self.fill()
+        self.assertTrue(os.path.exists(os.path.join(self.homeDir, 'part2',
+                                                    '__dbp.test.db.001')))
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (PartitionTestCase,):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
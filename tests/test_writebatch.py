@@ -0,0 +1,154 @@
+"""
+Copyright (c) 2008-2022, Jesus Cea Avion <jcea@jcea.es>
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+
+    1. Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+    2. Redistributions in binary form must reproduce the above
+    copyright notice, this list of conditions and the following
+    disclaimer in the documentation and/or other materials provided
+    with the distribution.
+
+    3. Neither the name of Jesus Cea Avion nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+    CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS
+    BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+    EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+            TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+            DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+    ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR
+    TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
+    THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+    SUCH DAMAGE.
+    """
+
+"""TestCases for db.WriteBatch.
+"""
+
+import unittest
+
+from .test_all import db, rmtree, get_new_environment_path
+
+
+class WriteBatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.homeDir = get_new_environment_path()
+        self.env = db.DBEnv()
+        self.env.open(self.homeDir, db.DB_CREATE | db.DB_INIT_MPOOL |
+                      db.DB_INIT_LOCK | db.DB_INIT_LOG | db.DB_INIT_TXN |
+                      db.DB_PRIVATE)
+        self.d = db.DB(self.env)
+        self.d.open('btree.db', dbtype=db.DB_BTREE,
+                    flags=db.DB_CREATE | db.DB_AUTO_COMMIT)
+        self.h = db.DB(self.env)
+        self.h.open('hash.db', dbtype=db.DB_HASH,
+                    flags=db.DB_CREATE | db.DB_AUTO_COMMIT)
+        self.r = db.DB(self.env)
+        self.r.open('recno.db', dbtype=db.DB_RECNO,
+                    flags=db.DB_CREATE | db.DB_AUTO_COMMIT)
+
+    def tearDown(self):
+        self.r.close()
+        self.h.close()
+        self.d.close()
+        self.env.close()
+        rmtree(self.homeDir)
+
+    def test01_put_delete(self):
+        self.d.put(b'old', b'value')
+        batch = db.WriteBatch()
+        batch.put(self.d, b'a', b'1')
+        batch.put(self.h, b'b', b'2')
+        batch.delete(self.d, b'old')
+        batch.put(self.d, b'empty', b'')
+        self.assertEqual(4, len(batch))
+        txn = self.env.txn_begin()
+        self.assertEqual([0, 0, 0, 0], batch.apply(txn))
+        txn.commit()
+        self.assertEqual(b'1', self.d.get(b'a'))
+        self.assertEqual(b'2', self.h.get(b'b'))
+        self.assertEqual(b'', self.d.get(b'empty'))
+        self.assertEqual(None, self.d.get(b'old'))
+        # The batch is kept, and can be applied again
+        self.assertEqual(4, len(batch))
+        batch.clear()
+        self.assertEqual(0, len(batch))
+        self.assertEqual([], batch.apply())
+
+    def test02_append(self):
+        batch = db.WriteBatch()
+        batch.append(self.r, b'first')
+        batch.put(self.d, b'x', b'y')
+        batch.append(self.r, b'second')
+        self.assertEqual([1, 0, 2], batch.apply())
+        self.assertEqual(b'second', self.r.get(2))
+        self.assertRaises(ValueError, batch.put, self.r, 5, b'z',
+                          flags=db.DB_APPEND)
+
+    def test03_status(self):
+        self.d.put(b'exists', b'value')
+        batch = db.WriteBatch()
+        batch.delete(self.d, b'missing')
+        batch.put(self.d, b'exists', b'other', flags=db.DB_NOOVERWRITE)
+        batch.put(self.d, b'new', b'value')
+        self.assertEqual([db.DB_NOTFOUND, db.DB_KEYEXIST, 0], batch.apply())
+        self.assertEqual(b'value', self.d.get(b'exists'))
+        self.assertEqual(b'value', self.d.get(b'new'))
+
+    def test04_error(self):
+        batch = db.WriteBatch()
+        batch.put(self.d, b'key', b'value')
+        batch.append(self.d, b'not a recno database')
+        txn = self.env.txn_begin()
+        self.assertRaises(db.DBError, batch.apply, txn)
+        txn.abort()
+        self.assertEqual(None, self.d.get(b'key'))
+
+    def test05_sort(self):
+        batch = db.WriteBatch()
+        for i in (5, 3, 9, 1):
+            batch.put(self.d, b'%d' % i, b'old')
+        batch.put(self.d, b'3', b'new')
+        batch.delete(self.d, b'9')
+        batch.append(self.r, b'a')
+        batch.append(self.r, b'b')
+        self.assertEqual([0, 0, 0, 0, 0, 0, 1, 2], batch.apply(sort=True))
+        # Operations on the same key keep their order
+        self.assertEqual(b'new', self.d.get(b'3'))
+        self.assertEqual(None, self.d.get(b'9'))
+        self.assertEqual(b'b', self.r.get(2))
+
+    def test06_closed_db(self):
+        d = db.DB(self.env)
+        d.open('other.db', dbtype=db.DB_BTREE,
+               flags=db.DB_CREATE | db.DB_AUTO_COMMIT)
+        batch = db.WriteBatch()
+        batch.put(d, b'key', b'value')
+        d.close()
+        self.assertRaises(db.DBError, batch.apply)
+        self.assertRaises(db.DBError, batch.put, d, b'key', b'value')
+        self.assertRaises(TypeError, batch.put, None, b'key', b'value')
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for test in (WriteBatchTestCase,):
+        test = unittest.defaultTestLoader.loadTestsFromTestCase(test)
+        suite.addTest(test)
+
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')